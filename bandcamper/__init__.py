@@ -6,4 +6,5 @@ from bandcamper.__version__ import __license__
 from bandcamper.__version__ import __title__
 from bandcamper.__version__ import __url__
 from bandcamper.__version__ import __version__
+from bandcamper.async_bandcamper import AsyncBandcamper
 from bandcamper.bandcamper import Bandcamper
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from pathlib import Path
 from sys import exit
@@ -6,7 +7,16 @@ import click
 from click_option_group import optgroup
 
 import bandcamper
+from bandcamper import AsyncBandcamper
 from bandcamper import Bandcamper
+from bandcamper.archive import DownloadArchive
+from bandcamper.art import ArtCache
+from bandcamper.domains import CustomDomainCache
+from bandcamper.mail.backends import IMAPBackend
+from bandcamper.mail.backends import MaildirBackend
+from bandcamper.requests.async_requester import AsyncRequester
+from bandcamper.requests.cache import ResponseCache
+from bandcamper.requests.cassette import Cassette
 from bandcamper.requests.requester import Requester
 from bandcamper.requests.utils import get_random_user_agent
 from bandcamper.screamo import Screamer
@@ -77,6 +87,101 @@ def configure(ctx, param, config_path=None):
     default="{artist}/{album}/{filename}",
     help="Output filename template for extra files. See the 'Extra Output Template' section of the README for all the info",
 )
+@optgroup.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    metavar="N",
+    help="Number of releases to download at the same time",
+)
+@optgroup.option(
+    "--download-jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    metavar="N",
+    help="Number of formats or tracks of the same release to download at the same time",
+)
+@optgroup.option(
+    "--segments",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    metavar="N",
+    help="Split large files in N parts downloaded over parallel connections, if the server supports it",
+)
+@optgroup.option(
+    "--segment-threshold",
+    type=click.IntRange(min=1),
+    default=64,
+    show_default=True,
+    metavar="MiB",
+    help="Minimum size of the files downloaded in segments",
+)
+@optgroup.option(
+    "--check-crc/--no-check-crc",
+    default=False,
+    show_default=True,
+    help="Check the CRC-32 of uncompressed files extracted from zips to detect corrupted downloads. This reads them instead of letting the kernel copy them, which is slower",
+)
+@optgroup.option(
+    "--download-archive",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="FILE",
+    help="Record downloaded releases in this file, and skip the ones already recorded in each format",
+)
+@optgroup.option(
+    "--incremental/--full-sync",
+    default=False,
+    show_default=True,
+    help="Only fetch the releases of artist pages added or changed since the previous run. Requires --download-archive",
+)
+@optgroup.option(
+    "--asyncio",
+    "use_asyncio",
+    is_flag=True,
+    help="Run downloads on asyncio instead of threads. Requires the 'async' extra (pip install bandcamper[async])",
+)
+@optgroup.option(
+    "--page-jobs",
+    type=click.IntRange(min=1),
+    show_default="8, or 100 with --asyncio",
+    metavar="N",
+    help="Number of artist pages to search for releases at the same time. With --asyncio, also the number of release pages fetched at the same time",
+)
+@optgroup.option(
+    "--tag",
+    is_flag=True,
+    help="Tag the title, number, album, artists and lyrics of every downloaded track from its release page",
+)
+@optgroup.option(
+    "--tag-jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    metavar="N",
+    help="Number of tracks of the same release to tag at the same time, with --tag",
+)
+@optgroup.option(
+    "--cover-art",
+    is_flag=True,
+    help="With --tag, also embed the cover art of the release into every track. It's downloaded once per release",
+)
+@optgroup.option(
+    "--art-size",
+    type=click.Choice(["original", "1200", "700", "350"]),
+    default="1200",
+    show_default=True,
+    help="Size of the embedded cover art, in pixels",
+)
+@optgroup.option(
+    "--art-max-size",
+    type=click.IntRange(min=1),
+    metavar="KiB",
+    help="Embed a smaller size of the cover art when it's over this many KiB",
+)
 @optgroup.group("Request Options")
 @optgroup.option(
     "--random-user-agent",
@@ -106,6 +211,185 @@ def configure(ctx, param, config_path=None):
     show_default=True,
     help="Rewrite every URL to use HTTPS",
 )
+@optgroup.option(
+    "--page-connections",
+    type=click.IntRange(min=1),
+    default=Requester.DEFAULT_HOST_LIMITS["bandcamp.com"],
+    show_default=True,
+    metavar="N",
+    help="Maximum number of simultaneous connections to bandcamp.com and to each custom domain",
+)
+@optgroup.option(
+    "--cdn-connections",
+    type=click.IntRange(min=1),
+    default=Requester.DEFAULT_HOST_LIMITS["bcbits.com"],
+    show_default=True,
+    metavar="N",
+    help="Maximum number of simultaneous connections to Bandcamp's download CDN (bcbits.com)",
+)
+@optgroup.option(
+    "--download-retries",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    metavar="N",
+    help="Number of times an interrupted download is resumed before giving up",
+)
+@optgroup.option(
+    "--connect-timeout",
+    type=click.FloatRange(min=0.1),
+    default=10,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time to wait for a connection to Bandcamp before retrying",
+)
+@optgroup.option(
+    "--read-timeout",
+    type=click.FloatRange(min=0.1),
+    default=60,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time to wait for any data from Bandcamp before retrying. A download that times out is resumed",
+)
+@optgroup.option(
+    "--min-speed",
+    type=click.FloatRange(min=0),
+    default=1,
+    show_default=True,
+    metavar="KiB/s",
+    help="Resume a download that stays slower than this for --stall-time seconds, as its connection most likely stalled. 0 disables the check",
+)
+@optgroup.option(
+    "--stall-time",
+    type=click.FloatRange(min=1),
+    default=30,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time a download can stay slower than --min-speed",
+)
+@optgroup.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    metavar="N",
+    help="Number of times a GET request that fails to connect, or that is answered with 500, 502 or 504, is retried",
+)
+@optgroup.option(
+    "--retry-backoff",
+    type=click.FloatRange(min=0),
+    default=0.5,
+    show_default=True,
+    metavar="SECONDS",
+    help="Longest wait before the first retry of a request. It doubles on every retry, and each wait is a random time up to it",
+)
+@optgroup.option(
+    "--pool-size",
+    type=click.IntRange(min=1),
+    metavar="N",
+    help="Maximum number of connections kept alive to each host. Defaults to the largest of --page-connections and --cdn-connections",
+)
+@optgroup.option(
+    "--max-rate",
+    type=click.FloatRange(min=0.1),
+    metavar="N",
+    help="Maximum number of requests per second to each host. Whether it's set or not, requests to a host slow down on their own when it answers 429 Too Many Requests or 503 Service Unavailable",
+)
+@optgroup.option(
+    "--throttle-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    metavar="N",
+    help="Number of times a request answered with 429 Too Many Requests or 503 Service Unavailable is retried, after its Retry-After",
+)
+@optgroup.option(
+    "--stream-pages/--full-pages",
+    default=True,
+    show_default=True,
+    help="Stop reading release and download pages as soon as the data bandcamper needs was read",
+)
+@optgroup.option(
+    "--record",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Record every response and DNS lookup to this cassette file, to replay the run later with --replay",
+)
+@optgroup.option(
+    "--record-max-body",
+    type=click.IntRange(min=0),
+    metavar="KiB",
+    help="Store at most this many KiB of each download body in the --record cassette. Pages and JSON are always stored whole",
+)
+@optgroup.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Replay the responses recorded in this cassette file instead of connecting to Bandcamp",
+)
+@optgroup.group("Email Options")
+@optgroup.option(
+    "--mail-backend",
+    type=click.Choice(["onesecmail", "imap", "maildir"]),
+    default="onesecmail",
+    show_default=True,
+    help="Where download emails are received: temporary 1secmail mailboxes, or addresses of your own catch-all --mail-domain, read over IMAP or from a maildir",
+)
+@optgroup.option(
+    "--mailboxes",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    metavar="N",
+    help="Maximum number of mailboxes shared by the download emails of email-gated releases",
+)
+@optgroup.option(
+    "--mail-domain",
+    metavar="DOMAIN",
+    help="Catch-all domain of the imap and maildir backends. A random address of it is used for each mailbox",
+)
+@optgroup.option(
+    "--maildir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Maildir receiving the mail of --mail-domain, for the maildir backend",
+)
+@optgroup.option(
+    "--imap-server",
+    metavar="HOST[:PORT]",
+    help="IMAP server receiving the mail of --mail-domain, for the imap backend. Connects over TLS, on port 993 by default",
+)
+@optgroup.option("--imap-user", help="IMAP account of the imap backend")
+@optgroup.option(
+    "--imap-password",
+    envvar="BANDCAMPER_IMAP_PASSWORD",
+    help="Password of the IMAP account. Also read from the BANDCAMPER_IMAP_PASSWORD environment variable",
+)
+@optgroup.option(
+    "--imap-folder",
+    default="INBOX",
+    show_default=True,
+    help="IMAP folder receiving the mail of --mail-domain",
+)
+@optgroup.group("Cache Options")
+@optgroup.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    help="Cache artist and release pages, custom domain checks and cover art in this directory",
+)
+@optgroup.option(
+    "--cache-ttl",
+    type=click.IntRange(min=0),
+    default=3600,
+    show_default=True,
+    metavar="SECONDS",
+    help="Time during which cached pages are used without contacting Bandcamp",
+)
+@optgroup.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=512,
+    show_default=True,
+    metavar="MiB",
+    help="Maximum size of the cache. The least recently used pages are removed when it's exceeded",
+)
 @optgroup.group("Output Options")
 @optgroup.option(
     "-v",
@@ -138,11 +422,52 @@ def main(
     destination,
     output,
     output_extra,
+    jobs,
+    download_jobs,
+    segments,
+    segment_threshold,
+    check_crc,
+    download_archive,
+    incremental,
+    use_asyncio,
+    page_jobs,
+    tag,
+    tag_jobs,
+    cover_art,
+    art_size,
+    art_max_size,
     random_user_agent,
     http_proxy,
     https_proxy,
     proxy,
     force_https,
+    page_connections,
+    cdn_connections,
+    download_retries,
+    connect_timeout,
+    read_timeout,
+    min_speed,
+    stall_time,
+    retries,
+    retry_backoff,
+    pool_size,
+    max_rate,
+    throttle_retries,
+    stream_pages,
+    record,
+    record_max_body,
+    replay,
+    mail_backend,
+    mailboxes,
+    mail_domain,
+    maildir,
+    imap_server,
+    imap_user,
+    imap_password,
+    imap_folder,
+    cache_dir,
+    cache_ttl,
+    cache_size,
     verbosity,
     colored,
     urls,
@@ -155,29 +480,210 @@ def main(
     http_proxy = http_proxy or proxy
     https_proxy = https_proxy or proxy
 
-    requester = Requester(user_agent, http_proxy, https_proxy)
+    cache = None
+    custom_domains = CustomDomainCache()
+    art_cache = ArtCache()
+    if cache_dir is not None:
+        cache = ResponseCache(cache_dir, cache_ttl, cache_size * 1024 * 1024)
+        custom_domains = CustomDomainCache(Path(cache_dir) / "custom_domains.json")
+        art_cache = ArtCache(Path(cache_dir) / "art")
+
+    requester_class = AsyncRequester if use_asyncio else Requester
+    requester_kwargs = {}
+    if not use_asyncio:
+        requester_kwargs["pool_size"] = pool_size
+    if record is not None or replay is not None:
+        if record is not None and replay is not None:
+            screamer.critical("--record and --replay can't be used together")
+        if use_asyncio:
+            screamer.critical("--record and --replay can't be used with --asyncio")
+        max_body = None if record_max_body is None else record_max_body * 1024
+        requester_kwargs["cassette"] = (
+            Cassette(record, "record", max_body)
+            if record is not None
+            else Cassette(replay, "replay")
+        )
+    try:
+        requester = requester_class(
+            user_agent,
+            http_proxy,
+            https_proxy,
+            host_limits={
+                "bandcamp.com": page_connections,
+                "bcbits.com": cdn_connections,
+            },
+            default_host_limit=page_connections,
+            cache=cache,
+            download_retries=download_retries,
+            segments=segments,
+            segment_threshold=segment_threshold * 1024 * 1024,
+            max_rate=max_rate,
+            throttle_retries=throttle_retries,
+            retries=retries,
+            retry_backoff=retry_backoff,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            min_speed=min_speed * 1024,
+            stall_time=stall_time,
+            **requester_kwargs,
+        )
+    except ImportError as err:
+        screamer.critical(str(err))
+
+    mail_backend = get_mail_backend(
+        screamer,
+        mail_backend,
+        mail_domain,
+        maildir,
+        imap_server,
+        imap_user,
+        imap_password,
+        imap_folder,
+    )
+
+    archive = None
+    if download_archive is not None:
+        archive = DownloadArchive(download_archive)
+    elif incremental:
+        screamer.critical("--incremental requires --download-archive")
 
     urls = list(urls)
     for file in input_files:
         urls.extend(file.read().strip().splitlines())
 
-    bandcamp_downloader = Bandcamper(
+    downloader_kwargs = dict(
         fallback=fallback,
         force_https=force_https,
         screamer=screamer,
         requester=requester,
+        jobs=jobs,
+        download_jobs=download_jobs,
+        custom_domains=custom_domains,
+        check_zip_crc=check_crc,
+        archive=archive,
+        incremental=incremental,
+        stream_pages=stream_pages,
+        mailboxes=mailboxes,
+        mail_backend=mail_backend,
+        tag=tag,
+        tag_jobs=tag_jobs,
+        cover_art=cover_art,
+        art_size=art_size,
+        art_max_size=None if art_max_size is None else art_max_size * 1024,
+        art_cache=art_cache,
     )
-    for url in urls:
+    # Each downloader has its own default, as coroutines are much cheaper than threads
+    if page_jobs is not None:
+        downloader_kwargs["page_jobs"] = page_jobs
+    if use_asyncio:
+        bandcamp_downloader = AsyncBandcamper(**downloader_kwargs)
         try:
-            bandcamp_downloader.add_url(url)
-        except ValueError as err:
-            screamer.error(str(err))
-    if not bandcamp_downloader.urls:
+            asyncio.run(
+                download_async(
+                    bandcamp_downloader,
+                    urls,
+                    destination,
+                    output,
+                    output_extra,
+                    *audio_formats,
+                )
+            )
+        finally:
+            bandcamp_downloader.mail_backend.close()
+            custom_domains.close()
+        return
+
+    bandcamp_downloader = Bandcamper(**downloader_kwargs)
+    try:
+        screamer.info(f"Searching releases from {len(urls)} URLs/artist subdomains")
+        errors = bandcamp_downloader.add_urls(urls, audio_formats)
+        check_urls(bandcamp_downloader, errors)
+
+        bandcamp_downloader.download_all(
+            destination, output, output_extra, *audio_formats
+        )
+    finally:
+        # Writes the end of a --record cassette
+        requester.close()
+        bandcamp_downloader.mail_backend.close()
+        custom_domains.close()
+    report_stats(bandcamp_downloader)
+
+
+def get_mail_backend(
+    screamer,
+    mail_backend,
+    mail_domain,
+    maildir,
+    imap_server,
+    imap_user,
+    imap_password,
+    imap_folder,
+):
+    if mail_backend == "onesecmail":
+        # Created by Bandcamper, with the proxies and headers of its requester
+        return None
+    if mail_domain is None:
+        screamer.critical(f"The {mail_backend} mail backend requires --mail-domain")
+    if mail_backend == "maildir":
+        if maildir is None:
+            screamer.critical("The maildir mail backend requires --maildir")
+        return MaildirBackend(maildir, mail_domain)
+    if imap_server is None or imap_user is None or imap_password is None:
         screamer.critical(
+            "The imap mail backend requires --imap-server, --imap-user and --imap-password"
+        )
+    host, _, port = imap_server.partition(":")
+    return IMAPBackend(
+        host,
+        mail_domain,
+        imap_user,
+        imap_password,
+        int(port) if port else 993,
+        imap_folder,
+    )
+
+
+def report_stats(bandcamp_downloader):
+    pool_stats = bandcamp_downloader.requester.get_pool_stats()
+    bandcamp_downloader.screamer.info(
+        f"Sent {pool_stats['requests']} requests on {pool_stats['connections']} new "
+        f"connections, reusing a connection for {pool_stats['reused']} of them",
+        True,
+    )
+    stats = bandcamp_downloader.requester.rate_limiter.get_stats()
+    for host, host_stats in stats.items():
+        if not host_stats["throttled"]:
+            continue
+        bandcamp_downloader.screamer.info(
+            f"{host} throttled {host_stats['throttled']} requests, slowed down "
+            f"{host_stats['backoffs']} times to {host_stats['rate']:.1f} requests/s",
+            True,
+        )
+
+
+def check_urls(bandcamp_downloader, errors):
+    for error in errors.values():
+        bandcamp_downloader.screamer.error(error)
+    if not bandcamp_downloader.urls:
+        bandcamp_downloader.screamer.critical(
             "You must provice bandcamper at least one valid URL/artist subdomain to download"
         )
 
-    bandcamp_downloader.download_all(destination, output, output_extra, *audio_formats)
+
+async def download_async(
+    bandcamp_downloader, urls, destination, output, output_extra, *audio_formats
+):
+    async with bandcamp_downloader:
+        bandcamp_downloader.screamer.info(
+            f"Searching releases from {len(urls)} URLs/artist subdomains"
+        )
+        errors = await bandcamp_downloader.add_urls(urls, audio_formats)
+        check_urls(bandcamp_downloader, errors)
+        await bandcamp_downloader.download_all(
+            destination, output, output_extra, *audio_formats
+        )
+    report_stats(bandcamp_downloader)
 
 
 if __name__ == "__main__":
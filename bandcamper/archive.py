@@ -0,0 +1,99 @@
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from time import time
+
+
+class DownloadArchive:
+    """Persistent record of the releases already downloaded, in each format.
+
+    Entries are stored in a SQLite database, keyed by the Bandcamp item type (`"album"` or
+    `"track"`), item ID and format, so lookups stay fast no matter how many entries there are.
+    The same database keeps a snapshot of the releases seen in each artist page, so later
+    runs can tell which ones are new. The archive can be shared by several threads.
+
+    Parameters
+    ----------
+    path : str or path-like object
+        SQLite database file. It's created if it doesn't exist.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "item_type TEXT NOT NULL, "
+                "item_id INTEGER NOT NULL, "
+                "format TEXT NOT NULL, "
+                "url TEXT, "
+                "downloaded_at REAL NOT NULL, "
+                "PRIMARY KEY (item_type, item_id, format)"
+                ") WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS artist_releases ("
+                "artist_url TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "signature TEXT NOT NULL, "
+                "PRIMARY KEY (artist_url, url)"
+                ") WITHOUT ROWID"
+            )
+
+    def get_formats(self, item_type, item_id):
+        """Formats in which the item was already downloaded.
+
+        Returns
+        -------
+        set of str
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT format FROM downloads WHERE item_type = ? AND item_id = ?",
+                (item_type, int(item_id)),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def has_all(self, item_type, item_id, formats):
+        """Whether the item was already downloaded in every one of `formats`."""
+        return set(formats) <= self.get_formats(item_type, item_id)
+
+    def add(self, item_type, item_id, formats, url=None):
+        """Record that the item was downloaded in `formats`, all of them or none."""
+        downloaded_at = time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                [(item_type, int(item_id), fmt, url, downloaded_at) for fmt in formats],
+            )
+
+    def get_artist_snapshot(self, artist_url):
+        """Releases seen in the artist page at `artist_url`, as handled in previous runs.
+
+        Returns
+        -------
+        dict
+            Mapping of each release URL to its signature.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT url, signature FROM artist_releases WHERE artist_url = ?",
+                (artist_url,),
+            ).fetchall()
+        return dict(rows)
+
+    def add_to_artist_snapshot(self, artist_url, url, signature):
+        """Record that the release at `url` was handled with its current `signature`."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO artist_releases VALUES (?, ?, ?)",
+                (artist_url, url, signature),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,157 @@
+"""Cover art of releases, downloaded once and shared by every track.
+
+Art is stored by the SHA-256 of its content, so a release and the tracks taken from it, which
+link the same image, share a single copy, in memory and on disk. The bytes of an image are read
+once and the same object is embedded into every track of its release.
+
+Bandcamp serves each image in several sizes, picked by the number at the end of its URL. Large
+originals can weigh several MB, which every track would carry, so `get_art_urls` also lists the
+smaller sizes, to fall back on when an image is over a size limit.
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from threading import get_ident
+from threading import Lock
+
+# Suffixes of the sizes of Bandcamp images, from the largest to the smallest
+ART_SIZES = OrderedDict(
+    [("original", "0"), ("1200", "10"), ("700", "16"), ("350", "2")]
+)
+ART_URL_REGEX = re.compile(r"_\d+(\.\w+)$")
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF8": "image/gif",
+}
+
+
+def get_art_urls(art_url, size="1200"):
+    """URLs of the image of `art_url` in `size` and the smaller sizes, largest first.
+
+    Examples
+    --------
+    >>> get_art_urls("https://f4.bcbits.com/img/a123_10.jpg", "700")
+    ['https://f4.bcbits.com/img/a123_16.jpg', 'https://f4.bcbits.com/img/a123_2.jpg']
+    """
+    if ART_URL_REGEX.search(art_url) is None:
+        return [art_url]
+    sizes = list(ART_SIZES.values())
+    start = sizes.index(ART_SIZES[size])
+    return [ART_URL_REGEX.sub(rf"_{suffix}\1", art_url) for suffix in sizes[start:]]
+
+
+def get_image_mime(data):
+    """MIME type of the image `data`, from its signature. None if it's not a known format."""
+    for signature, mime in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return mime
+    return None
+
+
+class ArtCache:
+    """Cover art by URL, fetched once no matter how many releases or threads ask for it.
+
+    Parameters
+    ----------
+    path : str or path-like object, optional
+        Directory where images are stored by content, with an ``index.json`` of their URLs,
+        to reuse them in later runs.
+    max_items : int
+        Images kept in memory. The least recently used one is dropped after that.
+    """
+
+    def __init__(self, path=None, max_items=16):
+        self.path = None if path is None else Path(path)
+        self.max_items = max_items
+        self._index = {}
+        self._images = OrderedDict()
+        self._lock = Lock()
+        self._url_locks = {}
+        if self.path is not None and (self.path / "index.json").is_file():
+            try:
+                with (self.path / "index.json").open(encoding="utf8") as index_file:
+                    self._index = json.load(index_file)
+            except (OSError, ValueError):
+                self._index = {}
+
+    def _get_image_path(self, digest):
+        return self.path / digest[:2] / digest
+
+    def lookup(self, url):
+        """The image of `url`, or None if it's not cached."""
+        with self._lock:
+            digest = self._index.get(url)
+            if digest is None:
+                return None
+            if digest in self._images:
+                self._images.move_to_end(digest)
+                return self._images[digest]
+        if self.path is None:
+            return None
+        try:
+            data = self._get_image_path(digest).read_bytes()
+        except OSError:
+            return None
+        return self._remember(digest, data)
+
+    def _remember(self, digest, data):
+        with self._lock:
+            # An image already in memory is shared instead of keeping a second copy
+            data = self._images.setdefault(digest, data)
+            self._images.move_to_end(digest)
+            while len(self._images) > self.max_items:
+                self._images.popitem(last=False)
+        return data
+
+    def store(self, url, data):
+        """Cache `data` as the image of `url`.
+
+        Returns
+        -------
+        bytes
+            The cached image, which is the same object for every URL of the same image.
+        """
+        digest = sha256(data).hexdigest()
+        if self.path is not None:
+            image_path = self._get_image_path(digest)
+            if not image_path.is_file():
+                image_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = image_path.with_name(
+                    f"{digest}.{os.getpid()}.{get_ident()}.tmp"
+                )
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, image_path)
+        with self._lock:
+            self._index[url] = digest
+            self._save()
+        return self._remember(digest, data)
+
+    def get_or_fetch(self, url, fetch):
+        """The image of `url`, calling `fetch(url)` to get its bytes if it's not cached.
+
+        Concurrent calls for the same URL wait for the first one instead of fetching it again.
+        """
+        data = self.lookup(url)
+        if data is not None:
+            return data
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, Lock())
+        with url_lock:
+            data = self.lookup(url)
+            if data is None:
+                data = self.store(url, fetch(url))
+        return data
+
+    def _save(self):
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        index_path = self.path / "index.json"
+        tmp_path = index_path.with_name(f"index.json.{os.getpid()}.tmp")
+        with tmp_path.open("w", encoding="utf8") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp_path, index_path)
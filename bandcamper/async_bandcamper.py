@@ -0,0 +1,441 @@
+import asyncio
+from contextvars import copy_context
+from functools import partial
+from pathlib import Path
+from urllib.parse import urlparse
+
+from requests import HTTPError
+from requests import RequestException
+
+from bandcamper.bandcamper import Bandcamper
+from bandcamper.mail.poller import EMAIL_TIMEOUT_MESSAGE
+from bandcamper.pages import extract_download_data
+from bandcamper.requests.async_requester import AsyncRequester
+from bandcamper.scheduler import run_ordered_async
+from bandcamper.utils import get_random_filename_template
+
+
+class AsyncBandcamper(Bandcamper):
+    """asyncio counterpart of `Bandcamper`.
+
+    Network operations are coroutines running on an `AsyncRequester`, while parsing, file naming
+    and moving are shared with `Bandcamper`. Blocking work, like extracting zip files, runs on the
+    default executor of the event loop.
+
+    Parameters
+    ----------
+    page_jobs : int
+        Maximum number of pages fetched at the same time by `add_urls` and `download_all`.
+        Thousands of pages can be in flight, as only `2 * page_jobs` releases are kept in memory.
+    jobs : int
+        Maximum number of releases being downloaded at the same time.
+    download_jobs : int
+        Maximum number of formats or tracks of the same release downloaded at the same time.
+    """
+
+    def __init__(
+        self,
+        *urls,
+        fallback=True,
+        force_https=True,
+        screamer=None,
+        requester=None,
+        jobs=1,
+        download_jobs=1,
+        page_jobs=100,
+        custom_domains=None,
+        check_zip_crc=False,
+        archive=None,
+        incremental=False,
+        stream_pages=True,
+        mailboxes=1,
+        mail_backend=None,
+        tag=False,
+        tag_jobs=4,
+        cover_art=False,
+        art_size="1200",
+        art_max_size=None,
+        art_cache=None,
+    ):
+        super().__init__(
+            fallback=fallback,
+            force_https=force_https,
+            screamer=screamer,
+            requester=requester or AsyncRequester(),
+            jobs=jobs,
+            download_jobs=download_jobs,
+            page_jobs=page_jobs,
+            custom_domains=custom_domains,
+            check_zip_crc=check_zip_crc,
+            archive=archive,
+            incremental=incremental,
+            stream_pages=stream_pages,
+            mailboxes=mailboxes,
+            mail_backend=mail_backend,
+            tag=tag,
+            tag_jobs=tag_jobs,
+            cover_art=cover_art,
+            art_size=art_size,
+            art_max_size=art_max_size,
+            art_cache=art_cache,
+        )
+        self._initial_urls = urls
+        self._download_semaphore = None
+        self._custom_domain_checks = {}
+        self._art_fetches = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.requester.close()
+
+    @staticmethod
+    async def _run_blocking(func, *args):
+        # The context is copied so that the Screamer output of func is captured as well
+        return await asyncio.get_event_loop().run_in_executor(
+            None, partial(copy_context().run, func, *args)
+        )
+
+    async def _check_custom_domain(self, url, hostname):
+        verdict = self.CUSTOM_DOMAIN_IP in await self.requester.get_ips_from_url(url)
+        self.custom_domains.set(hostname, verdict)
+        return verdict
+
+    async def _is_valid_custom_domain(self, url):
+        hostname = urlparse(url).hostname.lower()
+        verdict = self.custom_domains.get(hostname)
+        if verdict is not None:
+            return verdict
+        # Concurrent checks of the same hostname wait for a single lookup
+        check = self._custom_domain_checks.get(hostname)
+        if check is None:
+            check = asyncio.ensure_future(self._check_custom_domain(url, hostname))
+            check.add_done_callback(
+                lambda _: self._custom_domain_checks.pop(hostname, None)
+            )
+            self._custom_domain_checks[hostname] = check
+        return await asyncio.shield(check)
+
+    async def _get_urls_from_artist(self, source_url, download_formats=()):
+        response = await self.requester.get_cached_request_or_error(source_url)
+        releases = self._parse_artist_urls(response.content, source_url)
+        releases = self._skip_unchanged(releases, source_url, download_formats)
+        return self._skip_archived(releases, download_formats)
+
+    async def _get_urls(self, name, download_formats=()):
+        url, is_artist, check_domain = self._parse_name(name)
+        try:
+            is_valid = not check_domain or await self._is_valid_custom_domain(url)
+            if is_valid and is_artist:
+                return await self._get_urls_from_artist(url, download_formats)
+        except (RequestException, ValueError) as exc:
+            raise self._get_discovery_error(name, exc) from exc
+        if not is_valid:
+            raise ValueError(f"{name} is not a valid Bandcamp URL or subdomain")
+        return [url]
+
+    async def add_url(self, name, download_formats=()):
+        """Same as `Bandcamper.add_url`."""
+        self.urls.update(await self._get_urls(name, download_formats))
+
+    async def add_urls(self, names, download_formats=()):
+        """Same as `Bandcamper.add_urls`."""
+        names = list(dict.fromkeys(names))
+
+        async def get_urls_or_error(name):
+            try:
+                return await self._get_urls(name, download_formats), None
+            except ValueError as exc:
+                return [], str(exc)
+
+        results = [
+            result
+            async for result in run_ordered_async(
+                get_urls_or_error, names, self.page_jobs
+            )
+        ]
+        return self._add_discovered_urls(names, results)
+
+    async def add_initial_urls(self):
+        """Add the URLs given to the constructor, which can't be added from a synchronous `__init__`."""
+        urls, self._initial_urls = self._initial_urls, ()
+        for url in urls:
+            await self.add_url(url)
+
+    async def _get_music_data(self, url):
+        try:
+            response = await self.requester.get_cached_request_or_error(
+                url, until=self._music_data_until
+            )
+        except HTTPError as exc:
+            raise self._get_music_data_error(url, exc)
+        else:
+            return self._parse_music_data(response.text)
+
+    async def _get_music_data_or_none(self, url):
+        self.screamer.info(f"Searching available downloads for URL {url}")
+        try:
+            music_data = await self._get_music_data(url)
+        except (ValueError, HTTPError) as exc:
+            self._report_music_data_error(url, exc)
+            return None
+        return self._check_music_data(url, music_data)
+
+    async def _download_format(self, downloadable, fmt, destination, item_type):
+        fwd_url = self._get_format_stat_url(downloadable, fmt)
+        if fwd_url is None:
+            return None
+        response = await self.requester.get_request_or_error(
+            fwd_url, **self.STAT_DOWNLOAD_KWARGS
+        )
+        fwd_data = await response.json(content_type=None)
+        download = self._get_format_download(fmt, fwd_url, fwd_data, item_type)
+        if download is None:
+            return None
+        return await self.requester.download_to_file(
+            download[0],
+            destination,
+            get_random_filename_template(),
+            download[1],
+            progress=not self.screamer.capturing,
+        )
+
+    async def _get_download_page(self, url):
+        if self.stream_pages:
+            response = await self.requester.get_page_or_error(
+                url, extract_download_data
+            )
+            return response.content
+        response = await self.requester.get_request_or_error(url)
+        return await response.read()
+
+    async def _free_download(self, url, destination, item_type, *download_formats):
+        downloadable = self._parse_downloadable(await self._get_download_page(url))
+        downloaded_paths = [
+            path
+            async for path in run_ordered_async(
+                lambda fmt: self._download_format(
+                    downloadable, fmt, destination, item_type
+                ),
+                download_formats,
+                self.download_jobs,
+                self.screamer,
+            )
+        ]
+        return self._get_downloads(download_formats, downloaded_paths)
+
+    async def _request_download_email(
+        self,
+        url,
+        item_id,
+        item_type,
+        title=None,
+        country="US",
+        postcode="0",
+        encoding_name="none",
+        timeout=60,
+    ):
+        # Creating a mailbox is blocking
+        poller, request, download_url, form_data = await self._run_blocking(
+            self._expect_download_email,
+            url,
+            item_id,
+            item_type,
+            title,
+            country,
+            postcode,
+            encoding_name,
+            timeout,
+        )
+        try:
+            response = await self.requester.post_request_or_error(
+                download_url, data=form_data
+            )
+            self._check_email_download_response(
+                await response.json(content_type=None), await response.text()
+            )
+        except (RequestException, ValueError) as exc:
+            poller.cancel(request, exc)
+        return request
+
+    async def _get_download_url_from_email(self, url, item_id, item_type, **kwargs):
+        request = self._pop_email_request(url)
+        if request is None:
+            request = await self._request_download_email(
+                url, item_id, item_type, **kwargs
+            )
+        try:
+            # Shielded, as cancelling the wrapper would cancel the future of the poller
+            message = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(request.future)),
+                request.get_timeout(),
+            )
+        except asyncio.TimeoutError:
+            raise ValueError(EMAIL_TIMEOUT_MESSAGE)
+        return self._parse_email_download_url(message)
+
+    async def _download_art(self, url):
+        data = await self._run_blocking(self.art_cache.lookup, url)
+        if data is None:
+            response = await self.requester.get_request_or_error(url)
+            data = await self._run_blocking(
+                self.art_cache.store, url, await response.read()
+            )
+        return data
+
+    async def _get_art(self, url):
+        # Concurrent fetches of the same image wait for a single download
+        fetch = self._art_fetches.get(url)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._download_art(url))
+            fetch.add_done_callback(lambda _: self._art_fetches.pop(url, None))
+            self._art_fetches[url] = fetch
+        return await asyncio.shield(fetch)
+
+    async def _get_cover_art(self, music_data):
+        art = None
+        try:
+            for art_url in self._get_art_urls(music_data):
+                art = art_url, await self._get_art(art_url)
+                if self._fits_art_max_size(art[1]):
+                    break
+        except RequestException as exc:
+            self.screamer.warning(f"Failed to download cover art: {exc}")
+            return None
+        return self._get_cover_art_with_mime(art)
+
+    async def download_fallback_mp3(
+        self, track_info, artist, album, title, destination
+    ):
+        return [
+            file_path
+            async for file_path in run_ordered_async(
+                lambda download: self.requester.download_to_file(
+                    download[0],
+                    destination,
+                    download[1],
+                    download[2],
+                    progress=not self.screamer.capturing,
+                ),
+                self._get_fallback_downloads(track_info, artist, album, title),
+                self.download_jobs,
+                self.screamer,
+            )
+        ]
+
+    async def download_from_url(
+        self, url, destination, output, output_extra, *download_formats
+    ):
+        """Download the release from `url` and move its files into `destination`.
+
+        Returns
+        -------
+        list of pathlib.Path or None
+            The new paths of the downloaded files, or None if the release couldn't be downloaded.
+        """
+        music_data = await self._get_music_data_or_none(url)
+        if music_data is None:
+            return None
+        if self._needs_download_email(music_data, download_formats):
+            # Requested before waiting for a download slot, so that the emails of every
+            # release fetched ahead arrive together
+            try:
+                self._email_requests[url] = await self._request_download_email(
+                    url,
+                    music_data["id"],
+                    music_data["item_type"],
+                    music_data["current"].get("title"),
+                )
+            except (RequestException, ValueError):
+                # Failed requests are made again, and reported, when the release is downloaded
+                pass
+        if self._download_semaphore is None:
+            self._download_semaphore = asyncio.Semaphore(self.jobs)
+        async with self._download_semaphore:
+            new_paths = await self._download_release(
+                url, music_data, destination, output, output_extra, *download_formats
+            )
+        self._record_release(url, music_data, new_paths, download_formats)
+        return new_paths
+
+    async def _download_release(
+        self, url, music_data, destination, output, output_extra, *download_formats
+    ):
+        selection = self._select_downloads(music_data, download_formats)
+        if selection is None:
+            return None
+        source, download_formats, download_mp3 = selection
+        if not download_formats and not download_mp3:
+            return []
+        destination = Path(destination)
+        downloads = {}
+        if source == "free":
+            downloads = await self._free_download(
+                music_data["freeDownloadPage"],
+                destination,
+                music_data["item_type"],
+                *download_formats,
+            )
+        elif source == "email":
+            download_url = await self._get_download_url_from_email(
+                url,
+                music_data["id"],
+                music_data["item_type"],
+                title=music_data["current"].get("title"),
+            )
+            downloads = await self._free_download(
+                download_url,
+                destination,
+                music_data["item_type"],
+                *download_formats,
+            )
+        if download_mp3:
+            tracks, artist, album, title, year = self._get_release_info(music_data)
+            downloads["mp3-128"] = await self.download_fallback_mp3(
+                music_data["trackinfo"], artist, album, title, destination
+            )
+        cover_art = await self._get_cover_art(music_data) if self.tag else None
+        return await self._run_blocking(
+            self._move_and_tag,
+            url,
+            music_data,
+            downloads,
+            destination,
+            output,
+            output_extra,
+            cover_art,
+        )
+
+    async def download_all(self, destination, output, output_extra, *download_formats):
+        """Download every release in `urls`.
+
+        Release pages are fetched `page_jobs` at a time, and up to `jobs` releases are
+        downloaded at the same time. Output is printed in URL order.
+
+        Returns
+        -------
+        dict
+            Mapping of each URL to the result of `download_from_url`, or to the exception
+            that made its download fail. A failed release doesn't stop the others.
+        """
+        await self.add_initial_urls()
+        urls = sorted(self.urls)
+        results = {}
+
+        async def download(url):
+            try:
+                return await self.download_from_url(
+                    url, destination, output, output_extra, *download_formats
+                )
+            except self.RELEASE_ERRORS as exc:
+                return self._report_release_error(url, exc)
+
+        async for result in run_ordered_async(
+            download,
+            urls,
+            self.page_jobs,
+            self.screamer,
+        ):
+            results[urls[len(results)]] = result
+        return results
@@ -2,23 +2,38 @@ import json
 import re
 from pathlib import Path
 from platform import system as platform_system
-from time import sleep
+from threading import Lock
 from urllib.parse import urljoin
 from urllib.parse import urlparse
+from zipfile import BadZipFile
 from zipfile import ZipFile
 
 from bs4 import BeautifulSoup
-from onesecmail import OneSecMail
 from onesecmail.validators import FromAddressValidator
 from pathvalidate import sanitize_filepath
 from requests import HTTPError
+from requests import RequestException
 
+from bandcamper.art import ArtCache
+from bandcamper.art import get_art_urls
+from bandcamper.art import get_image_mime
+from bandcamper.domains import CustomDomainCache
+from bandcamper.extraction import extract_member
+from bandcamper.extraction import open_member
+from bandcamper.mail.backends import OneSecMailBackend
+from bandcamper.mail.poller import EmailPoller
+from bandcamper.metadata.tagging import tag_tracks
 from bandcamper.metadata.utils import get_track_output_context
 from bandcamper.metadata.utils import suffix_to_metadata
+from bandcamper.pages import extract_download_data
+from bandcamper.pages import extract_music_data
+from bandcamper.pages import music_data_until
 from bandcamper.requests.requester import Requester
+from bandcamper.scheduler import run_ordered
 from bandcamper.screamo import Screamer
 from bandcamper.utils import FilenameFormatter
 from bandcamper.utils import get_random_filename_template
+from bandcamper.utils import punch_hole
 
 
 class Bandcamper:
@@ -59,6 +74,13 @@ class Bandcamper:
     ]
 
     BANDCAMP_EMAIL_VALIDATOR = FromAddressValidator(r".+@email\.bandcamp\.com")
+    # Arguments of the requests for the file of each download format
+    STAT_DOWNLOAD_KWARGS = {
+        "params": {".vrs": 1},
+        "headers": {"Accept": "application/json"},
+    }
+    # Errors that fail the download of a single release in `download_all`
+    RELEASE_ERRORS = (RequestException, ValueError, OSError, BadZipFile)
 
     PLATFORMS = {
         "Darwin": "macOS",
@@ -71,26 +93,69 @@ class Bandcamper:
         force_https=True,
         screamer=None,
         requester=None,
+        jobs=1,
+        download_jobs=1,
+        page_jobs=8,
+        custom_domains=None,
+        check_zip_crc=False,
+        archive=None,
+        incremental=False,
+        stream_pages=True,
+        mailboxes=1,
+        mail_backend=None,
+        tag=False,
+        tag_jobs=4,
+        cover_art=False,
+        art_size="1200",
+        art_max_size=None,
+        art_cache=None,
     ):
         self.urls = set()
         self.fallback = fallback
         self.force_https = force_https
+        self.jobs = jobs
+        self.download_jobs = download_jobs
+        self.page_jobs = page_jobs
         self.formatter = FilenameFormatter()
         self.screamer = screamer or Screamer()
         self.requester = requester or Requester()
+        self.custom_domains = custom_domains or CustomDomainCache()
+        self.check_zip_crc = check_zip_crc
+        self.archive = archive
+        self.incremental = incremental and archive is not None
+        self.stream_pages = stream_pages
+        self.mailboxes = mailboxes
+        self.tag = tag
+        self.tag_jobs = tag_jobs
+        self.cover_art = cover_art
+        self.art_size = art_size
+        self.art_max_size = art_max_size
+        self.art_cache = art_cache or ArtCache()
+        self.mail_backend = mail_backend or OneSecMailBackend(
+            proxies=self.requester.proxies, headers=self.requester.headers
+        )
+        # Artist page and signature of the discovered releases, recorded once they're handled
+        self._snapshot_updates = {}
+        self._email_poller = None
+        self._email_poller_lock = Lock()
+        # Download emails requested ahead of the downloads of their releases
+        self._email_requests = {}
         for url in urls:
             self.add_url(url)
 
     def _is_valid_custom_domain(self, url):
-        return self.requester.get_ip_from_url(url) == self.CUSTOM_DOMAIN_IP
+        return self.custom_domains.get_or_check(
+            urlparse(url).hostname,
+            lambda: self.CUSTOM_DOMAIN_IP in self.requester.get_ips_from_url(url),
+        )
 
-    def _add_urls_from_artist(self, source_url):
-        response = self.requester.get_request_or_error(source_url)
+    def _parse_artist_urls(self, content, source_url):
         base_url = "https://" + urlparse(source_url).netloc.strip("/ ")
-        soup = BeautifulSoup(response.content, "lxml")
+        soup = BeautifulSoup(content, "lxml")
         music_grid = soup.find("ol", id="music-grid")
         if music_grid is None:
             raise ValueError
+        releases = []
         for a in music_grid.find_all("a"):
             parsed_url = urlparse(a.get("href"))
             if parsed_url.scheme:
@@ -100,161 +165,499 @@ class Bandcamper:
                 )
             else:
                 url = urljoin(base_url, parsed_url.path.strip("/ "))
-            self.urls.add(url)
+            grid_item = a.find_parent("li")
+            item = None if grid_item is None else grid_item.get("data-item-id")
+            # Changes when the release is replaced or retitled under the same URL
+            signature = " ".join([item or ""] + list(a.stripped_strings))
+            releases.append((url, item, signature))
+        return releases
+
+    def _skip_unchanged(self, releases, source_url, download_formats=()):
+        """The `(url, item, signature)` releases that changed since they were last handled.
 
-    def add_url(self, name):
+        Releases handled in other `download_formats` count as changed.
+        """
+        if not self.incremental:
+            return releases
+        snapshot = self.archive.get_artist_snapshot(source_url)
+        formats = ",".join(sorted(set(download_formats)))
+        changed = []
+        for url, item, signature in releases:
+            # Keyed by format, so that other formats don't count as handled
+            key = f"{signature} [{formats}]"
+            if snapshot.get(url) != key:
+                self._snapshot_updates[url] = (source_url, key)
+                changed.append((url, item, signature))
+        unchanged = len(releases) - len(changed)
+        if unchanged:
+            self.screamer.info(
+                f"Skipping {unchanged} releases unchanged since the previous run",
+                verbose=True,
+            )
+        return changed
+
+    def _skip_archived(self, releases, download_formats):
+        """URLs of the `(url, item, signature)` releases not yet downloaded in all `download_formats`.
+
+        `item` is the `data-item-id` of the release in the artist page, like `"album-123"`.
+        """
+        if self.archive is None or not download_formats:
+            return [url for url, _, _ in releases]
+        urls = []
+        for url, item, _ in releases:
+            item_type, _, item_id = (item or "").partition("-")
+            if not item_id.isdigit() or not self.archive.has_all(
+                item_type, item_id, download_formats
+            ):
+                urls.append(url)
+            else:
+                self._update_snapshot(url)
+        skipped = len(releases) - len(urls)
+        if skipped:
+            self.screamer.info(
+                f"Skipping {skipped} releases already in the download archive",
+                verbose=True,
+            )
+        return urls
+
+    def _get_urls_from_artist(self, source_url, download_formats=()):
+        response = self.requester.get_cached_request_or_error(source_url)
+        releases = self._parse_artist_urls(response.content, source_url)
+        releases = self._skip_unchanged(releases, source_url, download_formats)
+        return self._skip_archived(releases, download_formats)
+
+    def _parse_url(self, name):
+        parsed_url = urlparse(name)
+        if not parsed_url.scheme:
+            parsed_url = urlparse("https://" + name)
+        elif self.force_https:
+            parsed_url = parsed_url._replace(scheme="https")
+        return parsed_url
+
+    def _parse_name(self, name):
+        """Where to find the releases of `name`.
+
+        Returns
+        -------
+        tuple of (str, bool, bool)
+            The URL to get, if it's an artist page listing releases and if its domain must be
+            checked to be a Bandcamp custom domain.
+        """
         if self.BANDCAMP_SUBDOMAIN_REGEX.fullmatch(name):
-            url = f"https://{name.lower()}.bandcamp.com/music"
-            try:
-                self._add_urls_from_artist(url)
-            except HTTPError as exc:
-                if exc.response.status_code == 404:
-                    self.screamer.error(f"{name} not found")
-                else:
-                    self.screamer.error(f"Request error while getting URLs for {name}")
-            except ValueError:
-                self.screamer.error(f"No releases found for {name}")
+            return f"https://{name.lower()}.bandcamp.com/music", True, False
+        parsed_url = self._parse_url(name)
+        is_artist = parsed_url.path.strip("/ ") in ["music", ""]
+        if is_artist:
+            url = f"{parsed_url.scheme}://{parsed_url.netloc}/music"
         else:
-            parsed_url = urlparse(name)
-            if not parsed_url.scheme:
-                parsed_url = urlparse("https://" + name)
-            elif self.force_https:
-                parsed_url = parsed_url._replace(scheme="https")
             url = parsed_url.geturl()
-            if self.BANDCAMP_URL_REGEX.fullmatch(
-                parsed_url.netloc
-            ) or self._is_valid_custom_domain(url):
-                if parsed_url.path.strip("/ ") in ["music", ""]:
-                    url = f"{parsed_url.scheme}://{parsed_url.netloc}/music"
-                    self._add_urls_from_artist(url)
-                else:
-                    self.urls.add(url)
-            else:
-                raise ValueError(f"{name} is not a valid Bandcamp URL or subdomain")
+        return url, is_artist, not self.BANDCAMP_URL_REGEX.fullmatch(parsed_url.netloc)
+
+    @staticmethod
+    def _get_discovery_error(name, exc):
+        if isinstance(exc, HTTPError) and exc.response.status_code == 404:
+            return ValueError(f"{name} not found")
+        if isinstance(exc, RequestException):
+            return ValueError(f"Request error while getting URLs for {name}")
+        return ValueError(f"No releases found for {name}")
+
+    def _get_urls(self, name, download_formats=()):
+        url, is_artist, check_domain = self._parse_name(name)
+        try:
+            is_valid = not check_domain or self._is_valid_custom_domain(url)
+            if is_valid and is_artist:
+                return self._get_urls_from_artist(url, download_formats)
+        except (RequestException, ValueError) as exc:
+            raise self._get_discovery_error(name, exc) from exc
+        if not is_valid:
+            raise ValueError(f"{name} is not a valid Bandcamp URL or subdomain")
+        return [url]
+
+    def add_url(self, name, download_formats=()):
+        """Add the releases from an artist subdomain, artist page or release URL.
+
+        If there's a download `archive`, releases from artist pages already downloaded in
+        every one of `download_formats` are skipped. With `incremental`, so are releases
+        unchanged in the artist page since they were last downloaded.
+
+        Raises
+        ------
+        ValueError
+            If `name` is not valid or its releases couldn't be found.
+        """
+        self.urls.update(self._get_urls(name, download_formats))
+
+    def add_urls(self, names, download_formats=()):
+        """Add the releases of all `names`, discovering up to `page_jobs` of them at the same time.
+
+        Same as `add_url` for each name.
+
+        Returns
+        -------
+        dict
+            Mapping of each name that couldn't be added to its error message, in input order.
+        """
+        names = list(dict.fromkeys(names))
+
+        def get_urls_or_error(name):
+            try:
+                return self._get_urls(name, download_formats), None
+            except ValueError as exc:
+                return [], str(exc)
+
+        return self._add_discovered_urls(
+            names, run_ordered(get_urls_or_error, names, self.page_jobs)
+        )
+
+    def _add_discovered_urls(self, names, results):
+        """Add the URLs found for each name, returning the errors of the others."""
+        errors = {}
+        for name, (urls, error) in zip(names, results):
+            self.urls.update(urls)
+            if error is not None:
+                errors[name] = error
+        return errors
+
+    def _parse_music_data(self, text):
+        data = extract_music_data(text)
+        if data is None:
+            data = self._parse_music_data_with_soup(text)
+        return data
+
+    @staticmethod
+    def _parse_music_data_with_soup(text):
+        soup = BeautifulSoup(text, "lxml")
+        data = json.loads(soup.find("script", {"data-tralbum": True})["data-tralbum"])
+        data["art_url"] = soup.select_one("div#tralbumArt > a.popupImage")["href"]
+        from_album_span = soup.select_one("span.fromAlbum")
+        if from_album_span is not None:
+            data["album_title"] = from_album_span.text
+        return data
+
+    @property
+    def _music_data_until(self):
+        # Stateful, so a new one is made for each page
+        return music_data_until() if self.stream_pages else None
+
+    @staticmethod
+    def _get_music_data_error(url, exc):
+        if exc.response.status_code == 404:
+            return ValueError(f"{url} not found")
+        return exc
 
     def _get_music_data(self, url):
         try:
-            response = self.requester.get_request_or_error(url)
+            response = self.requester.get_cached_request_or_error(
+                url, until=self._music_data_until
+            )
         except HTTPError as exc:
-            if exc.response.status_code == 404:
-                raise ValueError(f"{url} not found")
-            raise exc
+            raise self._get_music_data_error(url, exc)
         else:
-            soup = BeautifulSoup(response.text, "lxml")
-            data = json.loads(
-                soup.find("script", {"data-tralbum": True})["data-tralbum"]
-            )
-            data["art_url"] = soup.select_one("div#tralbumArt > a.popupImage")["href"]
-            from_album_span = soup.select_one("span.fromAlbum")
-            if from_album_span is not None:
-                data["album_title"] = from_album_span.text
-            return data
+            return self._parse_music_data(response.text)
+
+    @staticmethod
+    def _parse_downloadable(content):
+        if isinstance(content, bytes):
+            content = content.decode("utf8", errors="replace")
+        download_data = extract_download_data(content)
+        if download_data is None:
+            soup = BeautifulSoup(content, "lxml")
+            download_data = json.loads(soup.find("div", id="pagedata")["data-blob"])
+        return download_data["download_items"][0]["downloads"]
+
+    @staticmethod
+    def _get_stat_download_url(download_url):
+        parsed_url = urlparse(download_url)
+        stat_path = parsed_url.path.replace("/download/", "/statdownload/")
+        return parsed_url._replace(path=stat_path).geturl()
+
+    @staticmethod
+    def _parse_stat_download(fwd_data):
+        if fwd_data["result"].lower() == "ok":
+            return fwd_data["download_url"]
+        elif fwd_data["result"].lower() == "err":
+            return fwd_data["retry_url"]
+        return None
+
+    def _get_format_stat_url(self, downloadable, fmt):
+        if fmt not in downloadable:
+            self.screamer.error(f"{fmt} download not found", short_symbol=True)
+            return None
+        return self._get_stat_download_url(downloadable[fmt]["url"])
+
+    def _get_format_download(self, fmt, fwd_url, fwd_data, item_type):
+        """URL and progress label of the file of `fmt`, or None if it's not available."""
+        download_url = self._parse_stat_download(fwd_data)
+        if download_url is None:
+            self.screamer.error(f"Error downloading {fmt} from {fwd_url}")
+            return None
+        return download_url, f"{fmt}.zip" if item_type == "album" else None
+
+    def _download_format(self, downloadable, fmt, destination, item_type):
+        fwd_url = self._get_format_stat_url(downloadable, fmt)
+        if fwd_url is None:
+            return None
+        fwd_data = self.requester.get_request_or_error(
+            fwd_url, **self.STAT_DOWNLOAD_KWARGS
+        ).json()
+        download = self._get_format_download(fmt, fwd_url, fwd_data, item_type)
+        if download is None:
+            return None
+        return self.requester.download_to_file(
+            download[0],
+            destination,
+            get_random_filename_template(),
+            download[1],
+            progress=not self.screamer.capturing,
+        )
+
+    def _get_download_page(self, url):
+        if self.stream_pages:
+            response = self.requester.get_page_or_error(url, extract_download_data)
+        else:
+            response = self.requester.get_request_or_error(url)
+        return response.content
 
     def _free_download(self, url, destination, item_type, *download_formats):
-        response = self.requester.get_request_or_error(url)
-        soup = BeautifulSoup(response.content, "lxml")
-        download_data = json.loads(soup.find("div", id="pagedata")["data-blob"])
-        downloadable = download_data["download_items"][0]["downloads"]
-        downloaded_paths = []
-        for fmt in download_formats:
-            if fmt in downloadable:
-                parsed_url = urlparse(downloadable[fmt]["url"])
-                stat_path = parsed_url.path.replace("/download/", "/statdownload/")
-                fwd_url = parsed_url._replace(path=stat_path).geturl()
-                fwd_data = self.requester.get_request_or_error(
-                    fwd_url,
-                    params={".vrs": 1},
-                    headers={"Accept": "application/json"},
-                ).json()
-                if fwd_data["result"].lower() == "ok":
-                    download_url = fwd_data["download_url"]
-                elif fwd_data["result"].lower() == "err":
-                    download_url = fwd_data["retry_url"]
-                else:
-                    self.screamer.error(f"Error downloading {fmt} from {fwd_url}")
-                    continue
-                label = f"{fmt}.zip" if item_type == "album" else None
-                file_path = self.requester.download_to_file(
-                    download_url,
-                    destination,
-                    get_random_filename_template(),
-                    label,
+        downloadable = self._parse_downloadable(self._get_download_page(url))
+        downloaded_paths = run_ordered(
+            lambda fmt: self._download_format(
+                downloadable, fmt, destination, item_type
+            ),
+            download_formats,
+            self.download_jobs,
+            self.screamer,
+        )
+        return self._get_downloads(download_formats, downloaded_paths)
+
+    @staticmethod
+    def _get_downloads(download_formats, downloaded_paths):
+        """Mapping of each format that was downloaded to its paths."""
+        return {
+            fmt: [path]
+            for fmt, path in zip(download_formats, downloaded_paths)
+            if path is not None
+        }
+
+    @staticmethod
+    def _get_email_download_request(
+        url, item_id, item_type, address, country, postcode, encoding_name
+    ):
+        parsed_url = urlparse(url)
+        download_url = f"{parsed_url.scheme}://{parsed_url.netloc}/email_download"
+        form_data = {
+            "encoding_name": encoding_name,
+            "item_id": item_id,
+            "item_type": item_type,
+            "address": address,
+            "country": country,
+            "postcode": postcode,
+        }
+        return download_url, form_data
+
+    @staticmethod
+    def _parse_email_download_url(msg):
+        soup = BeautifulSoup(msg.html_body, "lxml")
+        return soup.find("a")["href"]
+
+    def _get_email_poller(self):
+        with self._email_poller_lock:
+            if self._email_poller is None:
+                self._email_poller = EmailPoller(
+                    self.mail_backend,
+                    [self.BANDCAMP_EMAIL_VALIDATOR],
+                    self.mailboxes,
                 )
-                if file_path.suffix == ".zip":
-                    extract_to_path = file_path.parent / file_path.stem
-                    with ZipFile(file_path) as zip_file:
-                        zip_file.extractall(extract_to_path)
-                    file_path.unlink()
-                    downloaded_paths.append(extract_to_path)
-                else:
-                    downloaded_paths.append(file_path)
-            else:
-                self.screamer.error(f"{fmt} download not found", short_symbol=True)
-        return downloaded_paths
+            return self._email_poller
 
-    def _get_download_url_from_email(
+    def _needs_download_email(self, music_data, download_formats):
+        if music_data.get("freeDownloadPage") or not music_data["current"].get(
+            "require_email"
+        ):
+            return False
+        download_formats, download_mp3 = self._split_download_formats(download_formats)
+        archived = self._get_archived_formats(music_data)
+        return any(fmt not in archived for fmt in download_formats) or (
+            download_mp3 and "mp3-128" not in archived
+        )
+
+    def _request_download_email(
         self,
         url,
         item_id,
         item_type,
+        title=None,
         country="US",
         postcode="0",
         encoding_name="none",
         timeout=60,
     ):
-        artist_subdomain = urlparse(url).netloc
-        download_url = f"https://{artist_subdomain}/email_download"
-        mailbox = OneSecMail.generate_random_mailbox(
-            proxies=self.requester.session.proxies,
-            headers=self.requester.session.headers,
+        """Ask Bandcamp to send the download email of a release to a shared mailbox.
+
+        Returns
+        -------
+        bandcamper.mail.poller.EmailRequest
+            The request, whose future is resolved with the email once it's received.
+        """
+        poller, request, download_url, form_data = self._expect_download_email(
+            url, item_id, item_type, title, country, postcode, encoding_name, timeout
         )
-        form_data = {
-            "encoding_name": encoding_name,
-            "item_id": item_id,
-            "item_type": item_type,
-            "address": mailbox.address,
-            "country": country,
-            "postcode": postcode,
-        }
-        response = self.requester.post_request_or_error(download_url, data=form_data)
-        if not response.json()["ok"]:
-            raise ValueError(f"Email download request failed: {response.text}")
-        msgs = []
-        time_sleeping = 0
-        while not msgs:
-            if time_sleeping > timeout:
-                raise ValueError(
-                    "Bandcamp email not received. Try increasing the timeout."
-                )
-            sleep(1)
-            time_sleeping += 1
-            msgs = mailbox.get_messages(validators=[self.BANDCAMP_EMAIL_VALIDATOR])
-        soup = BeautifulSoup(msgs[0].html_body, "lxml")
-        return soup.find("a")["href"]
+        try:
+            response = self.requester.post_request_or_error(
+                download_url, data=form_data
+            )
+            self._check_email_download_response(response.json(), response.text)
+        except (RequestException, ValueError) as exc:
+            poller.cancel(request, exc)
+        return request
+
+    def _expect_download_email(
+        self, url, item_id, item_type, title, country, postcode, encoding_name, timeout
+    ):
+        """Wait for the download email of a release, which must then be requested.
+
+        Returns
+        -------
+        tuple
+            The poller, the `EmailRequest`, and the URL and form data of the request asking
+            Bandcamp for the email.
+        """
+        poller = self._get_email_poller()
+        request = poller.expect(item_id, title, timeout)
+        download_url, form_data = self._get_email_download_request(
+            url, item_id, item_type, request.address, country, postcode, encoding_name
+        )
+        return poller, request, download_url, form_data
+
+    @staticmethod
+    def _check_email_download_response(data, text):
+        if not data["ok"]:
+            raise ValueError(f"Email download request failed: {text}")
+
+    def _pop_email_request(self, url):
+        """Download email requested ahead for `url`, or None if there's none or it failed."""
+        request = self._email_requests.pop(url, None)
+        if request is not None and request.future.done():
+            if request.future.exception() is not None:
+                return None
+        return request
+
+    def _get_download_url_from_email(self, url, item_id, item_type, **kwargs):
+        request = self._pop_email_request(url)
+        if request is None:
+            request = self._request_download_email(url, item_id, item_type, **kwargs)
+        return self._parse_email_download_url(request.result())
 
     def _sanitize_file_path(self, file_path):
         platform = platform_system()
         platform = self.PLATFORMS.get(platform, platform)
         return sanitize_filepath(file_path, platform=platform)
 
-    def move_file(self, file_path, destination, output, output_extra, tracks, context):
+    def _get_output_path(
+        self,
+        file_path,
+        destination,
+        output,
+        output_extra,
+        tracks,
+        context,
+        fileobj=None,
+    ):
         if file_path.suffix in suffix_to_metadata:
-            context.update(get_track_output_context(file_path, tracks))
+            context.update(get_track_output_context(file_path, tracks, fileobj))
         else:
             output = output_extra
             context["filename"] = file_path.name
-        move_to = self._sanitize_file_path(
+        return self._sanitize_file_path(
             destination / self.formatter.format(output, **context)
         )
+
+    @staticmethod
+    def _add_track_number(track_numbers, path, context):
+        if track_numbers is not None and path.suffix in suffix_to_metadata:
+            track_numbers[path] = context["track_num"]
+
+    def move_file(
+        self,
+        file_path,
+        destination,
+        output,
+        output_extra,
+        tracks,
+        context,
+        track_numbers=None,
+    ):
+        move_to = self._get_output_path(
+            file_path, destination, output, output_extra, tracks, context
+        )
+        self._add_track_number(track_numbers, move_to, context)
         move_to.parent.mkdir(parents=True, exist_ok=True)
         file_path.replace(move_to)
         return move_to
 
-    def download_fallback_mp3(self, track_info, artist, album, title, destination):
-        file_paths = []
+    def extract_zip(
+        self,
+        zip_path,
+        destination,
+        output,
+        output_extra,
+        tracks,
+        context,
+        track_numbers=None,
+    ):
+        """Extract every file of `zip_path` straight to the path `move_file` would move it to.
+
+        The tags of each track are read from the zip itself, so files are written only once.
+        Members stored without compression are copied by the kernel, unless `check_zip_crc`
+        is True. The space used by each member in the zip is freed as soon as it's extracted,
+        where supported, and the zip is removed at the end, so the disk usage stays close to
+        the size of the release.
+
+        Returns
+        -------
+        list of pathlib.Path
+            The paths of the extracted files.
+        """
+        new_paths = []
+        with ZipFile(zip_path) as zip_file, zip_path.open("r+b") as raw_zip:
+            members = sorted(
+                (member for member in zip_file.infolist() if not member.is_dir()),
+                key=lambda member: member.header_offset,
+            )
+            for i, member in enumerate(members):
+                with open_member(zip_file, raw_zip, member) as member_file:
+                    extract_to = self._get_output_path(
+                        Path(member.filename),
+                        destination,
+                        output,
+                        output_extra,
+                        tracks,
+                        context,
+                        member_file,
+                    )
+                self._add_track_number(track_numbers, extract_to, context)
+                extract_to.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = extract_to.with_name(f".{extract_to.name}.part")
+                extract_member(zip_file, raw_zip, member, tmp_path, self.check_zip_crc)
+                tmp_path.replace(extract_to)
+                new_paths.append(extract_to)
+                if i + 1 < len(members):
+                    member_end = members[i + 1].header_offset
+                else:
+                    member_end = zip_file.start_dir
+                punch_hole(
+                    raw_zip.fileno(),
+                    member.header_offset,
+                    member_end - member.header_offset,
+                )
+        zip_path.unlink()
+        return new_paths
+
+    @staticmethod
+    def _get_fallback_downloads(track_info, artist, album, title):
+        downloads = []
         for track in track_info:
             if track.get("file"):
-                
                 if track["track_num"] is None:
                     track_num = 1
                 else:
@@ -262,42 +665,65 @@ class Bandcamper:
 
                 if title is None:
                     title = track["title"]
-                file_paths.append(
-                    self.requester.download_to_file(
+                downloads.append(
+                    (
                         track["file"]["mp3-128"],
-                        destination,
                         f"{artist} - {album} - {track_num} {title}{{ext}}",
                         f"{track_num}.mp3",
                     )
                 )
-        return file_paths
+        return downloads
 
-    def download_from_url(
-        self, url, destination, output, output_extra, *download_formats
-    ):
-        self.screamer.info(f"Searching available downloads for URL {url}")
-        destination = Path(destination)
-        download_formats = set(download_formats)
-        download_mp3 = False
-        if "mp3-128" in download_formats:
-            download_formats.remove("mp3-128")
-            download_mp3 = True
+    def download_fallback_mp3(self, track_info, artist, album, title, destination):
+        return list(
+            run_ordered(
+                lambda download: self.requester.download_to_file(
+                    download[0],
+                    destination,
+                    download[1],
+                    download[2],
+                    progress=not self.screamer.capturing,
+                ),
+                self._get_fallback_downloads(track_info, artist, album, title),
+                self.download_jobs,
+                self.screamer,
+            )
+        )
 
-        music_data = dict()
+    def _get_music_data_or_none(self, url):
+        self.screamer.info(f"Searching available downloads for URL {url}")
         try:
             music_data = self._get_music_data(url)
-        except ValueError as exc:
-            self.screamer.error(str(exc))
-            return
-        except HTTPError as exc:
+        except (ValueError, HTTPError) as exc:
+            self._report_music_data_error(url, exc)
+            return None
+        return self._check_music_data(url, music_data)
+
+    def _report_music_data_error(self, url, exc):
+        if isinstance(exc, HTTPError):
             self.screamer.error(
                 f"Request error ({exc.response.status_code}) when getting music data from {url}"
             )
-            return
+        else:
+            self.screamer.error(str(exc))
+
+    def _check_music_data(self, url, music_data):
         if not music_data:
             self.screamer.error(f"Failed to get music data from {url}")
-            return
+            return None
+        return music_data
+
+    @staticmethod
+    def _split_download_formats(download_formats):
+        download_formats = set(download_formats)
+        download_mp3 = False
+        if "mp3-128" in download_formats:
+            download_formats.remove("mp3-128")
+            download_mp3 = True
+        return sorted(download_formats), download_mp3
 
+    @staticmethod
+    def _get_release_info(music_data):
         tracks = {
             track["track_num"]: track["title"] for track in music_data["trackinfo"]
         }
@@ -308,75 +734,354 @@ class Bandcamper:
             or music_data["current"]["publish_date"]
         ).split()[2]
 
-        downloading_str = f"Downloading {artist} - {title}"
         if music_data["item_type"] == "album":
             album = title
             title = None
         else:
             album = music_data.get("album_title", "")
+        return tracks, artist, album, title, year
 
-        if music_data.get("freeDownloadPage"):
-            self.screamer.success(f"Free download found! {downloading_str}")
-            file_paths = self._free_download(
-                music_data["freeDownloadPage"],
-                destination,
-                music_data["item_type"],
-                *download_formats,
+    def _move_downloaded_files(
+        self,
+        file_paths,
+        destination,
+        output,
+        output_extra,
+        tracks,
+        context,
+        track_numbers=None,
+    ):
+        new_paths = []
+        for file_path in file_paths:
+            if file_path.suffix == ".zip":
+                extracted_paths = self.extract_zip(
+                    file_path,
+                    destination,
+                    output,
+                    output_extra,
+                    tracks,
+                    context,
+                    track_numbers,
+                )
+                for new_path in extracted_paths:
+                    self.screamer.success(
+                        f"New file: {new_path}", verbose=True, short_symbol=True
+                    )
+                if extracted_paths:
+                    self.screamer.success(
+                        f"New directory: {extracted_paths[-1].parent}",
+                        short_symbol=True,
+                    )
+                new_paths.extend(extracted_paths)
+            else:
+                new_path = self.move_file(
+                    file_path,
+                    destination,
+                    output,
+                    output_extra,
+                    tracks,
+                    context,
+                    track_numbers,
+                )
+                new_paths.append(new_path)
+                self.screamer.success(f"New file: {new_path}", short_symbol=True)
+        return new_paths
+
+    def _fetch_art(self, url):
+        return self.requester.get_request_or_error(url).content
+
+    def _get_cover_art(self, music_data):
+        """Cover art of a release, downloaded once for all its tracks.
+
+        The largest image no bigger than `art_max_size` is used, starting from `art_size`.
+
+        Returns
+        -------
+        tuple or None
+            The image and its MIME type, or None if `cover_art` is False or it couldn't be
+            downloaded.
+        """
+        art = None
+        try:
+            for art_url in self._get_art_urls(music_data):
+                art = art_url, self.art_cache.get_or_fetch(art_url, self._fetch_art)
+                if self._fits_art_max_size(art[1]):
+                    break
+        except RequestException as exc:
+            self.screamer.warning(f"Failed to download cover art: {exc}")
+            return None
+        return self._get_cover_art_with_mime(art)
+
+    def _get_art_urls(self, music_data):
+        """URLs of the cover art of a release to try, from `art_size` down to the smallest."""
+        if not self.cover_art or not music_data.get("art_url"):
+            return []
+        return get_art_urls(music_data["art_url"], self.art_size)
+
+    def _fits_art_max_size(self, data):
+        return self.art_max_size is None or len(data) <= self.art_max_size
+
+    def _get_cover_art_with_mime(self, art):
+        """The image of `art`, a tuple of its URL and image, and its MIME type."""
+        if art is None:
+            return None
+        art_url, data = art
+        mime = get_image_mime(data)
+        if mime is None:
+            self.screamer.warning(f"Unknown cover art format from {art_url}")
+            return None
+        return data, mime
+
+    def _tag_files(self, track_numbers, music_data, cover_art=None):
+        errors = tag_tracks(track_numbers, music_data, self.tag_jobs, cover_art)
+        for file_path, error in errors.items():
+            self.screamer.warning(f"Failed to tag {file_path}: {error}")
+        if len(errors) < len(track_numbers):
+            self.screamer.success(
+                f"Tagged {len(track_numbers) - len(errors)} tracks", verbose=True
             )
-        elif music_data["current"].get("require_email"):
-            self.screamer.success(f"Email download found! {downloading_str}")
-            download_url = self._get_download_url_from_email(
-                url, music_data["id"], music_data["item_type"]
+
+    def download_from_url(
+        self, url, destination, output, output_extra, *download_formats
+    ):
+        """Download the release from `url` and move its files into `destination`.
+
+        Returns
+        -------
+        list of pathlib.Path or None
+            The new paths of the downloaded files, or None if the release couldn't be downloaded.
+        """
+        music_data = self._get_music_data_or_none(url)
+        return self._download_music_data(
+            url, music_data, destination, output, output_extra, *download_formats
+        )
+
+    def _download_music_data(
+        self, url, music_data, destination, output, output_extra, *download_formats
+    ):
+        if music_data is None:
+            return None
+        new_paths = self._download_release(
+            url, music_data, destination, output, output_extra, *download_formats
+        )
+        self._record_release(url, music_data, new_paths, download_formats)
+        return new_paths
+
+    def _record_release(self, url, music_data, new_paths, download_formats):
+        """Record the release in the artist snapshot once it's fully downloaded."""
+        if new_paths is not None and self._is_fully_downloaded(
+            music_data, download_formats
+        ):
+            self._update_snapshot(url)
+
+    def _prepare_download(self, url, download_formats):
+        """Music data of `url`, requesting its download email right away if it needs one.
+
+        Returns
+        -------
+        tuple
+            `url`, its music data or None, and the messages screamed while getting it.
+        """
+        with self.screamer.capture() as messages:
+            music_data = self._get_music_data_or_none(url)
+            if music_data is not None and self._needs_download_email(
+                music_data, download_formats
+            ):
+                try:
+                    self._email_requests[url] = self._request_download_email(
+                        url,
+                        music_data["id"],
+                        music_data["item_type"],
+                        music_data["current"].get("title"),
+                    )
+                except (RequestException, ValueError):
+                    # Failed requests are made again, and reported, when the release is downloaded
+                    pass
+        return url, music_data, messages
+
+    def _download_prepared(
+        self, prepared, destination, output, output_extra, *download_formats
+    ):
+        url, music_data, messages = prepared
+        self.screamer.replay(messages)
+        try:
+            return self._download_music_data(
+                url, music_data, destination, output, output_extra, *download_formats
             )
-            file_paths = self._free_download(
-                download_url, destination, music_data["item_type"], *download_formats
+        except self.RELEASE_ERRORS as exc:
+            return self._report_release_error(url, exc)
+
+    def _report_release_error(self, url, exc):
+        """Report the failed download of `url` so that the other releases carry on.
+
+        Returns
+        -------
+        Exception
+            `exc`, which is kept as the result of the release.
+        """
+        self.screamer.error(f"Failed to download {url}: {exc}")
+        return exc
+
+    def _update_snapshot(self, url):
+        update = self._snapshot_updates.pop(url, None)
+        if update is not None:
+            self.archive.add_to_artist_snapshot(update[0], url, update[1])
+
+    def _get_archived_formats(self, music_data):
+        if self.archive is None:
+            return set()
+        return self.archive.get_formats(music_data["item_type"], music_data["id"])
+
+    def _is_fully_downloaded(self, music_data, download_formats):
+        """Whether the release is archived in every format of `download_formats` it has.
+
+        Releases without a free download only have the MP3-128 fallback.
+        """
+        if music_data.get("freeDownloadPage") or music_data["current"].get(
+            "require_email"
+        ):
+            formats = download_formats
+        else:
+            formats = ["mp3-128"]
+        return self._get_archived_formats(music_data).issuperset(formats)
+
+    def _add_to_archive(self, url, music_data, downloads):
+        if self.archive is not None and downloads:
+            self.archive.add(
+                music_data["item_type"], music_data["id"], list(downloads), url
             )
+
+    def _select_downloads(self, music_data, download_formats):
+        """Where to download a release from, skipping the formats already in the archive.
+
+        Returns
+        -------
+        tuple or None
+            The source of the download, ``"free"``, ``"email"`` or None for the MP3-128
+            fallback only, the formats to download from it and whether to download the
+            MP3-128 fallback, both empty if everything is in the archive already. None if the
+            release has no free download and `fallback` is False.
+        """
+        download_formats, download_mp3 = self._split_download_formats(download_formats)
+        archived = self._get_archived_formats(music_data)
+        download_formats = [fmt for fmt in download_formats if fmt not in archived]
+        download_mp3 = download_mp3 and "mp3-128" not in archived
+        tracks, artist, album, title, year = self._get_release_info(music_data)
+        release_str = f"{artist} - {album if title is None else title}"
+        if music_data.get("freeDownloadPage"):
+            source, found = "free", "Free download found!"
+        elif music_data["current"].get("require_email"):
+            source, found = "email", "Email download found!"
         elif self.fallback or download_mp3:
-            self.screamer.success(f"MP3-128 download found! {downloading_str}")
-            file_paths = self.download_fallback_mp3(
-                music_data["trackinfo"], artist, album, title, destination
-            )
-            download_mp3 = False
-        elif not self.fallback:
-            return
+            source, found = None, "MP3-128 download found!"
+            download_formats = []
+            download_mp3 = "mp3-128" not in archived
         else:
-            raise ValueError(
-                f"No free download found for {url}. Try setting fallback to True."
-            )
+            return None
+        if not download_formats and not download_mp3:
+            self.screamer.info(f"{release_str} is already in the download archive")
+        else:
+            self.screamer.success(f"{found} Downloading {release_str}")
+        return source, download_formats, download_mp3
 
-        if download_mp3:
-            file_paths.extend(
-                self.download_fallback_mp3(
-                    music_data["trackinfo"], artist, album, title, destination
-                )
-            )
+    def _move_and_tag(
+        self, url, music_data, downloads, destination, output, output_extra, cover_art
+    ):
+        """Move the `downloads` of a release into `destination`, tag them and archive them.
 
+        Returns
+        -------
+        list of pathlib.Path
+            The new paths of the files.
+        """
+        tracks, artist, album, title, year = self._get_release_info(music_data)
         context = {
             "artist": artist,
             "album": album,
             "year": year,
         }
-        for file_path in file_paths:
-            if file_path.is_dir():
-                for track_path in file_path.iterdir():
-                    new_path = self.move_file(
-                        track_path, destination, output, output_extra, tracks, context
-                    )
-                    self.screamer.success(
-                        f"New file: {new_path}", verbose=True, short_symbol=True
-                    )
-                self.screamer.success(
-                    f"New directory: {new_path.parent}", short_symbol=True
-                )
-                file_path.rmdir()
-            else:
-                new_path = self.move_file(
-                    file_path, destination, output, output_extra, tracks, context
-                )
-                self.screamer.success(f"New file: {new_path}", short_symbol=True)
+        track_numbers = {}
+        new_paths = self._move_downloaded_files(
+            [path for paths in downloads.values() for path in paths],
+            destination,
+            output,
+            output_extra,
+            tracks,
+            context,
+            track_numbers,
+        )
+        if self.tag:
+            self._tag_files(track_numbers, music_data, cover_art)
+        self._add_to_archive(url, music_data, downloads)
+        return new_paths
 
-    def download_all(self, destination, output, output_extra, *download_formats):
-        for url in self.urls:
-            self.download_from_url(
-                url, destination, output, output_extra, *download_formats
+    def _download_release(
+        self, url, music_data, destination, output, output_extra, *download_formats
+    ):
+        selection = self._select_downloads(music_data, download_formats)
+        if selection is None:
+            return None
+        source, download_formats, download_mp3 = selection
+        if not download_formats and not download_mp3:
+            return []
+        destination = Path(destination)
+        downloads = {}
+        if source == "free":
+            downloads = self._free_download(
+                music_data["freeDownloadPage"],
+                destination,
+                music_data["item_type"],
+                *download_formats,
+            )
+        elif source == "email":
+            download_url = self._get_download_url_from_email(
+                url,
+                music_data["id"],
+                music_data["item_type"],
+                title=music_data["current"].get("title"),
             )
+            downloads = self._free_download(
+                download_url,
+                destination,
+                music_data["item_type"],
+                *download_formats,
+            )
+        if download_mp3:
+            tracks, artist, album, title, year = self._get_release_info(music_data)
+            downloads["mp3-128"] = self.download_fallback_mp3(
+                music_data["trackinfo"], artist, album, title, destination
+            )
+        cover_art = self._get_cover_art(music_data) if self.tag else None
+        return self._move_and_tag(
+            url, music_data, downloads, destination, output, output_extra, cover_art
+        )
+
+    def download_all(self, destination, output, output_extra, *download_formats):
+        """Download every release in `urls`, using up to `jobs` releases at a time.
+
+        Releases are processed in URL order and their output is printed in that same
+        order, regardless of which download finishes first. Release pages are fetched up
+        to `2 * page_jobs` releases ahead of the downloads, `page_jobs` at a time, so the
+        download emails of email-gated releases are all requested and awaited together.
+
+        Returns
+        -------
+        dict
+            Mapping of each URL to the result of `download_from_url`, or to the exception
+            that made its download fail. A failed release doesn't stop the others.
+        """
+        urls = sorted(self.urls)
+        prepared = run_ordered(
+            lambda url: self._prepare_download(url, download_formats),
+            urls,
+            self.page_jobs,
+        )
+        results = run_ordered(
+            lambda item: self._download_prepared(
+                item, destination, output, output_extra, *download_formats
+            ),
+            prepared,
+            self.jobs,
+            self.screamer,
+        )
+        return dict(zip(urls, results))
@@ -0,0 +1,86 @@
+import atexit
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from time import time
+
+
+class CustomDomainCache:
+    """Remembers which hostnames are Bandcamp custom domains.
+
+    Every hostname is checked at most once per run, no matter how many URLs point to it or
+    how many threads ask for it at the same time. When `path` is given, the verdicts are
+    also saved to that JSON file by `close`, or at exit, and reused by later runs until
+    they're older than `ttl`.
+
+    Parameters
+    ----------
+    path : str or path-like object, optional
+        JSON file where the verdicts are persisted.
+    ttl : int or float
+        Seconds during which a persisted verdict is trusted. Defaults to one week.
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 60 * 60):
+        self.path = None if path is None else Path(path)
+        self.ttl = ttl
+        self._verdicts = {}
+        self._lock = Lock()
+        self._hostname_locks = {}
+        self._dirty = False
+        if self.path is not None:
+            atexit.register(self.close)
+        if self.path is not None and self.path.is_file():
+            try:
+                with self.path.open(encoding="utf8") as domains_file:
+                    saved = json.load(domains_file)
+            except (OSError, ValueError):
+                saved = {}
+            self._verdicts = {
+                hostname: (verdict, checked_at)
+                for hostname, (verdict, checked_at) in saved.items()
+                if time() - checked_at < self.ttl
+            }
+
+    def get(self, hostname):
+        """The cached verdict for `hostname`, or None if it wasn't checked yet."""
+        verdict = self._verdicts.get(hostname.lower())
+        return None if verdict is None else verdict[0]
+
+    def set(self, hostname, verdict):
+        with self._lock:
+            self._verdicts[hostname.lower()] = (verdict, time())
+            self._dirty = True
+
+    def get_or_check(self, hostname, check):
+        """The verdict for `hostname`, calling `check()` to get it if it's not cached.
+
+        Concurrent calls for the same hostname wait for the first one instead of checking again.
+        If `check` raises an exception, nothing is cached.
+        """
+        verdict = self.get(hostname)
+        if verdict is not None:
+            return verdict
+        with self._lock:
+            hostname_lock = self._hostname_locks.setdefault(hostname.lower(), Lock())
+        with hostname_lock:
+            verdict = self.get(hostname)
+            if verdict is None:
+                verdict = check()
+                self.set(hostname, verdict)
+        return verdict
+
+    def close(self):
+        """Save the verdicts added since the last save to `path`."""
+        with self._lock:
+            if self._dirty and self.path is not None:
+                self._save()
+            self._dirty = False
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w", encoding="utf8") as domains_file:
+            json.dump(self._verdicts, domains_file)
+        os.replace(tmp_path, self.path)
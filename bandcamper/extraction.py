@@ -0,0 +1,194 @@
+"""Fast extraction of zip members.
+
+Bandcamp zips mostly hold already compressed audio, stored without compression (`ZIP_STORED`). The data
+of those members is copied straight from the zip to the extracted file by the kernel, with
+`os.copy_file_range` or `os.sendfile`, instead of going through `zipfile` and Python buffers. When their
+CRC-32 must be checked, they're read and written in a single pass instead. Compressed or encrypted
+members, and every member on platforms without `os.pread` like Windows, are extracted with `zipfile`
+as usual.
+"""
+import io
+import os
+import struct
+from shutil import copyfileobj
+from zipfile import BadZipFile
+from zipfile import ZIP_STORED
+from zlib import crc32
+
+# Local file header, as in zipfile: signature, versions, flags, compression, times, CRC, sizes,
+# and the lengths of the filename and extra field, which come right before the data
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+BUFFER_SIZE = 1024 * 1024
+# Stored members are only read directly from the zip where positional reads are available
+HAS_PREAD = hasattr(os, "pread")
+
+
+def is_stored(member):
+    """Whether the data of `member` is stored as is in the zip, neither compressed nor encrypted."""
+    return member.compress_type == ZIP_STORED and not member.flag_bits & 0x1
+
+
+def can_copy_directly(member):
+    """Whether the data of `member` can be read straight from the zip file."""
+    return HAS_PREAD and is_stored(member)
+
+
+def get_data_offset(raw_zip, member):
+    """Offset of the data of `member` in the zip file `raw_zip`."""
+    raw_zip.seek(member.header_offset)
+    header = raw_zip.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size:
+        raise BadZipFile(f"Truncated local header of {member.filename}")
+    fields = LOCAL_HEADER.unpack(header)
+    if fields[0] != LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile(f"Bad local header signature of {member.filename}")
+    filename_length, extra_length = fields[-2:]
+    return member.header_offset + LOCAL_HEADER.size + filename_length + extra_length
+
+
+class FileRange(io.RawIOBase):
+    """Read-only file object over `length` bytes of `file`, starting at `offset`.
+
+    Used to read the tags of a stored member without going through `zipfile`, which
+    decompresses everything before the position it seeks to.
+    """
+
+    def __init__(self, file, offset, length, name=None):
+        super().__init__()
+        self._fd = file.fileno()
+        self._offset = offset
+        self._length = length
+        self._position = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._length - self._position)
+        if size <= 0:
+            return 0
+        data = os.pread(self._fd, size, self._offset + self._position)
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _copy_with_python(src_fd, dst_fd, offset, length, crc=None):
+    while length > 0:
+        data = os.pread(src_fd, min(BUFFER_SIZE, length), offset)
+        if not data:
+            break
+        if crc is not None:
+            crc = crc32(data, crc)
+        written = 0
+        while written < len(data):
+            written += os.write(dst_fd, data[written:])
+        offset += len(data)
+        length -= len(data)
+    return length, crc
+
+
+def copy_range(src_fd, dst_fd, offset, length):
+    """Copy `length` bytes of `src_fd`, starting at `offset`, to the current position of `dst_fd`.
+
+    `os.copy_file_range` is used where available, which lets file systems like Btrfs or XFS
+    share the data instead of copying it. Otherwise, `os.sendfile` is tried, and finally a
+    regular read and write loop.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while length > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, length, offset)
+                if not copied:
+                    break
+                offset += copied
+                length -= copied
+        except OSError:
+            pass
+    if length > 0 and hasattr(os, "sendfile"):
+        try:
+            while length > 0:
+                copied = os.sendfile(dst_fd, src_fd, offset, length)
+                if not copied:
+                    break
+                offset += copied
+                length -= copied
+        except OSError:
+            pass
+    if length > 0:
+        length, _ = _copy_with_python(src_fd, dst_fd, offset, length)
+    if length > 0:
+        raise BadZipFile("Unexpected end of zip file")
+
+
+def open_member(zip_file, raw_zip, member):
+    """Read-only file object with the data of `member`."""
+    if can_copy_directly(member):
+        return FileRange(
+            raw_zip,
+            get_data_offset(raw_zip, member),
+            member.file_size,
+            member.filename,
+        )
+    return zip_file.open(member)
+
+
+def extract_member(zip_file, raw_zip, member, path, check_crc=False):
+    """Extract `member` of `zip_file` to `path`.
+
+    Parameters
+    ----------
+    zip_file : zipfile.ZipFile
+        The zip file.
+    raw_zip : file object
+        The same zip file, opened in binary mode, used to copy stored members directly.
+    member : zipfile.ZipInfo
+        Member to extract.
+    path : pathlib.Path
+        Path of the extracted file.
+    check_crc : bool
+        Whether to check the CRC-32 of stored members. Checking it requires reading their
+        data, so they're only copied by the kernel without it, the default. Compressed members are always
+        checked by `zipfile`, like every member where `os.pread` isn't available.
+
+    Raises
+    ------
+    zipfile.BadZipFile
+        If the zip file is corrupted.
+    """
+    with path.open("wb") as file:
+        if not can_copy_directly(member):
+            with zip_file.open(member) as member_file:
+                copyfileobj(member_file, file, BUFFER_SIZE)
+            return
+        offset = get_data_offset(raw_zip, member)
+        file.flush()
+        if not check_crc:
+            copy_range(raw_zip.fileno(), file.fileno(), offset, member.file_size)
+            return
+        # The data has to be read to check it, so it's written from the same buffer
+        length, crc = _copy_with_python(
+            raw_zip.fileno(), file.fileno(), offset, member.file_size, 0
+        )
+        if length > 0:
+            raise BadZipFile("Unexpected end of zip file")
+        if crc != member.CRC:
+            raise BadZipFile(f"Bad CRC-32 for file {member.filename}")
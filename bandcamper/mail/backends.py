@@ -0,0 +1,265 @@
+"""Mail backends receiving the download emails of email-gated releases.
+
+A backend creates mailboxes, which have an ``address`` and a ``get_messages(validators)`` method
+returning the messages received at that address that pass every validator, like
+`onesecmail.OneSecMail`. Messages have an ``id``, unique in their mailbox, a ``from_address``, a
+``subject``, a ``body`` and an ``html_body``.
+
+- `OneSecMailBackend`: random mailboxes of the public 1secmail service.
+- `MaildirBackend`: random addresses of a catch-all domain whose mail is delivered to a maildir.
+- `IMAPBackend`: random addresses of a catch-all domain whose mail is read over IMAP.
+- `bandcamper.mail.local.LocalMailBackend`: an in-process SMTP server, for tests and benchmarks.
+
+Backends that know when mail arrives set `notifies`, and their `wait` returns as soon as it does.
+The others are polled by `EmailPoller`, less often while nothing arrives.
+"""
+import email
+import imaplib
+import mailbox
+import re
+import sys
+import time
+from email import policy
+from email.errors import MessageError
+from email.utils import getaddresses
+from email.utils import parseaddr
+from threading import Lock
+from uuid import uuid4
+
+from onesecmail import OneSecMail
+
+IMAP_UID_REGEX = re.compile(rb"UID (\d+)")
+
+
+class MailMessage:
+    """An email parsed from its raw bytes.
+
+    Parameters
+    ----------
+    message_id : str or int
+        ID of the message, unique in its backend.
+    data : bytes
+        The message, as received.
+    recipients : iterable of str, optional
+        Addresses the message was delivered to. Defaults to the addresses of its ``To``,
+        ``Delivered-To`` and ``X-Original-To`` headers.
+    """
+
+    def __init__(self, message_id, data, recipients=None):
+        message = email.message_from_bytes(data, policy=policy.default)
+        if recipients is None:
+            headers = ("To", "Delivered-To", "X-Original-To")
+            values = [
+                str(value) for name in headers for value in message.get_all(name, [])
+            ]
+            recipients = [address for _, address in getaddresses(values)]
+        self.id = message_id
+        self.recipients = {address.lower() for address in recipients}
+        self.from_address = parseaddr(str(message.get("From", "")))[1]
+        self.subject = str(message.get("Subject", ""))
+        html_part = message.get_body(("html",))
+        text_part = message.get_body(("plain",))
+        self.html_body = "" if html_part is None else html_part.get_content()
+        self.text_body = "" if text_part is None else text_part.get_content()
+        self.body = self.html_body or self.text_body
+
+    def __repr__(self):
+        return f"<MailMessage {self.id}; from='{self.from_address}', subject='{self.subject}'>"
+
+
+class MailBackend:
+    """Base class of the mail backends.
+
+    Attributes
+    ----------
+    notifies : bool
+        Whether `wait` returns as soon as new mail arrives. Otherwise it just sleeps.
+    """
+
+    notifies = False
+
+    def create_mailbox(self):
+        """New mailbox, with an `address` and a `get_messages(validators)` method."""
+        raise NotImplementedError
+
+    def wait(self, timeout):
+        """Wait up to `timeout` seconds for new mail."""
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+class OneSecMailBackend(MailBackend):
+    """Random mailboxes of 1secmail.
+
+    Parameters
+    ----------
+    **requests_kwargs
+        Arguments of the requests made to the 1secmail API, like `proxies` and `headers`.
+    """
+
+    def __init__(self, **requests_kwargs):
+        self.requests_kwargs = requests_kwargs
+
+    def create_mailbox(self):
+        return OneSecMail.generate_random_mailbox(**self.requests_kwargs)
+
+
+class CatchAllMailbox:
+    """Random address of a catch-all domain, whose messages are fetched by `backend`."""
+
+    def __init__(self, backend, address):
+        self.backend = backend
+        self.address = address
+
+    def __repr__(self):
+        return f"<CatchAllMailbox [{self.address}]>"
+
+    def get_messages(self, validators=()):
+        return [
+            message
+            for message in self.backend.get_messages(self.address)
+            if all(validator(message) for validator in validators)
+        ]
+
+
+class CatchAllBackend(MailBackend):
+    """Base class of the backends receiving every address of `domain` in the same inbox.
+
+    Messages are parsed once, and kept until the backend is closed. Those that can't be
+    parsed are skipped, and never read again.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self._messages = {}
+        self._seen_ids = set()
+        self._lock = Lock()
+
+    def create_mailbox(self):
+        return CatchAllMailbox(self, f"{uuid4().hex}@{self.domain}")
+
+    def fetch_new_messages(self, address):
+        """Fetch the messages to `address` whose ID isn't in `_seen_ids` yet."""
+        raise NotImplementedError
+
+    def _add_message(self, message_id, data):
+        self._seen_ids.add(message_id)
+        try:
+            self._messages[message_id] = MailMessage(message_id, data)
+        except (MessageError, LookupError, ValueError):
+            pass
+
+    def get_messages(self, address):
+        """Messages received at `address`."""
+        address = address.lower()
+        with self._lock:
+            self.fetch_new_messages(address)
+            return [
+                message
+                for message in self._messages.values()
+                if address in message.recipients
+            ]
+
+
+class MaildirBackend(CatchAllBackend):
+    """Catch-all domain delivered to a local maildir, by a mail server like Postfix.
+
+    Parameters
+    ----------
+    path : str or path-like object
+        The maildir.
+    domain : str
+        Domain whose every address is delivered to the maildir.
+    """
+
+    def __init__(self, path, domain):
+        super().__init__(domain)
+        self._maildir = mailbox.Maildir(path, factory=None, create=False)
+
+    def fetch_new_messages(self, address):
+        # The whole maildir is read at once, for every mailbox
+        for key in self._maildir.iterkeys():
+            if key in self._seen_ids:
+                continue
+            try:
+                data = self._maildir.get_bytes(key)
+            except KeyError:
+                # Deleted since it was listed
+                continue
+            self._add_message(key, data)
+
+
+class IMAPBackend(CatchAllBackend):
+    """Catch-all domain whose mail is read from an IMAP server, over TLS.
+
+    Parameters
+    ----------
+    host : str
+        The IMAP server.
+    domain : str
+        Domain whose every address is delivered to `folder`.
+    user, password : str
+        Credentials of the IMAP account.
+    port : int
+        Port of the IMAP server.
+    folder : str
+        Folder receiving the emails.
+    timeout : int or float
+        Seconds after which a connection to the server that doesn't respond is dropped.
+    """
+
+    def __init__(
+        self, host, domain, user, password, port=993, folder="INBOX", timeout=60
+    ):
+        super().__init__(domain)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.folder = folder
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if sys.version_info >= (3, 9):
+            connection = imaplib.IMAP4_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = imaplib.IMAP4_SSL(self.host, self.port)
+            connection.sock.settimeout(self.timeout)
+        connection.login(self.user, self.password)
+        connection.select(self.folder, readonly=True)
+        return connection
+
+    def _fetch(self, address):
+        if self._connection is None:
+            self._connection = self._connect()
+        _, data = self._connection.uid("SEARCH", None, "TO", f'"{address}"')
+        uids = [uid for uid in data[0].split() if uid.decode() not in self._seen_ids]
+        if not uids:
+            return
+        _, data = self._connection.uid("FETCH", b",".join(uids), "(BODY.PEEK[])")
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            match = IMAP_UID_REGEX.search(item[0])
+            if match is not None:
+                self._add_message(match.group(1).decode(), item[1])
+
+    def fetch_new_messages(self, address):
+        try:
+            self._fetch(address)
+        except (imaplib.IMAP4.error, OSError) as exc:
+            # Connects again on the next poll
+            self._connection = None
+            raise ValueError(f"Error reading {self.folder} on {self.host}: {exc}")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.logout()
+                except (imaplib.IMAP4.error, OSError):
+                    pass
+                self._connection = None
@@ -0,0 +1,136 @@
+"""In-process mail server, standing in for a real mail backend in tests and benchmarks.
+
+`LocalMailBackend` accepts every address of its domain. Messages are delivered to it either
+directly with `deliver`, or over SMTP, so that a server in another process, like the Bandcamp
+stand-in of the benchmarks, can send download emails with `smtplib`. The SMTP server only speaks
+the commands `smtplib.SMTP.sendmail` needs, without authentication or TLS.
+"""
+import itertools
+from email.utils import parseaddr
+from socketserver import StreamRequestHandler
+from socketserver import ThreadingTCPServer
+from threading import Condition
+from threading import Thread
+
+from bandcamper.mail.backends import CatchAllBackend
+from bandcamper.mail.backends import MailMessage
+
+
+class SMTPHandler(StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def read_data(self):
+        lines = []
+        for line in self.rfile:
+            if line.rstrip(b"\r\n") == b".":
+                break
+            # Lines starting with a dot have it doubled
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    def handle(self):
+        backend = self.server.backend
+        recipients = []
+        self.reply("220 bandcamper local mail")
+        for line in self.rfile:
+            command = line.decode("ascii", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO", "NOOP"):
+                self.reply("250 OK")
+            elif verb in ("MAIL", "RSET"):
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = parseaddr(command.partition(":")[2])[1]
+                if not backend.accepts(address):
+                    self.reply("550 No such user")
+                    continue
+                recipients.append(address)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                if not recipients:
+                    self.reply("503 No recipients")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                backend.deliver(recipients, self.read_data())
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, backend):
+        super().__init__(address, SMTPHandler)
+        self.backend = backend
+
+
+class LocalMailBackend(CatchAllBackend):
+    """Mail backend keeping the messages to any address of `domain` in memory.
+
+    Parameters
+    ----------
+    domain : str
+        Domain of the addresses of the mailboxes.
+    smtp_port : int, optional
+        Port of 127.0.0.1 to receive messages on over SMTP, 0 for any free port. Without it,
+        messages can only be delivered with `deliver`.
+
+    Attributes
+    ----------
+    smtp_address : tuple or None
+        Host and port of the SMTP server.
+    delivered : int
+        Messages delivered so far.
+    polls : int
+        Times the messages of a mailbox were fetched.
+    """
+
+    notifies = True
+
+    def __init__(self, domain="bandcamper.test", smtp_port=None):
+        super().__init__(domain)
+        self.delivered = 0
+        self.polls = 0
+        self._ids = itertools.count(1)
+        self._new_mail = Condition(self._lock)
+        self._waited = 0
+        self._smtp_server = None
+        self.smtp_address = None
+        if smtp_port is not None:
+            self._smtp_server = SMTPServer(("127.0.0.1", smtp_port), self)
+            self.smtp_address = self._smtp_server.server_address
+            Thread(target=self._smtp_server.serve_forever, daemon=True).start()
+
+    def accepts(self, address):
+        return address.lower().endswith(f"@{self.domain}".lower())
+
+    def deliver(self, recipients, data):
+        """Deliver the raw message `data` to `recipients`."""
+        with self._new_mail:
+            message_id = next(self._ids)
+            self._messages[message_id] = MailMessage(message_id, data, recipients)
+            self.delivered += 1
+            self._new_mail.notify_all()
+
+    def fetch_new_messages(self, address):
+        # Messages are delivered straight to `_messages`
+        self.polls += 1
+
+    def wait(self, timeout):
+        with self._new_mail:
+            self._new_mail.wait_for(lambda: self.delivered != self._waited, timeout)
+            self._waited = self.delivered
+
+    def close(self):
+        if self._smtp_server is not None:
+            self._smtp_server.shutdown()
+            self._smtp_server.server_close()
+            self._smtp_server = None
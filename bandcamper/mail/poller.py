@@ -0,0 +1,240 @@
+"""Shared mailboxes receiving the download emails of email-gated releases.
+
+Instead of a new mailbox polled by each release, every email-gated release of a run has its
+download email sent to one of a few shared mailboxes, and a single background thread polls them
+all, handing each email to the release it's for. Releases waiting for their email therefore wait
+together, for about one email round trip in total.
+
+Emails are matched to releases by the ``id`` parameter of their links, and otherwise by the title
+of the release in their subject. An email matching neither goes to the release waiting on its
+mailbox only if there's a single one, and is dropped otherwise, as it may be a late or duplicate
+email of another release.
+
+Mailboxes are polled every `min_interval` seconds after a release starts waiting or an email
+arrives, and the interval doubles up to `max_interval` while nothing arrives. Backends that notify
+new mail are polled as soon as it arrives instead.
+"""
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from threading import Thread
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+from requests import RequestException
+
+EMAIL_TIMEOUT_MESSAGE = "Bandcamp email not received. Try increasing the timeout."
+# Seconds to wait for the poller after the deadline of a request, before giving up on it
+DEADLINE_GRACE = 5
+
+
+class EmailRequest:
+    """A release waiting for its download email.
+
+    Attributes
+    ----------
+    address : str
+        Address the email must be sent to.
+    future : concurrent.futures.Future
+        Resolved with the email once it's received.
+    """
+
+    def __init__(self, mailbox, item_id, title, deadline):
+        self.mailbox = mailbox
+        self.address = mailbox.address
+        self.item_id = str(item_id)
+        self.title = title
+        self.deadline = deadline
+        self.future = Future()
+
+    def get_timeout(self):
+        """Seconds to wait for the future, until a bit after the deadline."""
+        return max(self.deadline - time.monotonic(), 0) + DEADLINE_GRACE
+
+    def result(self):
+        """The email, once it's received.
+
+        Raises
+        ------
+        ValueError
+            If it isn't received in time.
+        """
+        try:
+            return self.future.result(self.get_timeout())
+        except FutureTimeoutError:
+            raise ValueError(EMAIL_TIMEOUT_MESSAGE)
+
+    def matches_links(self, links):
+        return any(
+            parse_qs(urlsplit(link).query).get("id") == [self.item_id] for link in links
+        )
+
+    def matches_subject(self, subject):
+        return bool(self.title) and self.title.lower() in (subject or "").lower()
+
+
+class EmailPoller:
+    """Polls shared mailboxes for download emails, and matches them to their releases.
+
+    Parameters
+    ----------
+    backend : bandcamper.mail.backends.MailBackend
+        Backend creating the mailboxes.
+    validators : iterable of callable
+        Validators of the emails to consider, passed to `get_messages`.
+    mailboxes : int
+        Maximum number of mailboxes. A new one is only created when every mailbox already
+        has a release waiting on it.
+    min_interval, max_interval : float
+        Minimum and maximum seconds between polls of the mailboxes.
+    """
+
+    def __init__(
+        self, backend, validators=(), mailboxes=1, min_interval=0.5, max_interval=4.0
+    ):
+        self.backend = backend
+        self.validators = list(validators)
+        self.max_mailboxes = mailboxes
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._interval = min_interval
+        self._mailboxes = []
+        self._pending = []
+        self._seen = set()
+        self._lock = Lock()
+        self._mailbox_lock = Lock()
+        self._thread = None
+
+    def _get_mailbox(self):
+        with self._mailbox_lock:
+            with self._lock:
+                waiting = {id(request.mailbox) for request in self._pending}
+                idle = [box for box in self._mailboxes if id(box) not in waiting]
+                if idle or len(self._mailboxes) >= self.max_mailboxes:
+                    return (idle or self._mailboxes)[0]
+            mailbox = self.backend.create_mailbox()
+            with self._lock:
+                self._mailboxes.append(mailbox)
+            return mailbox
+
+    def expect(self, item_id, title=None, timeout=60):
+        """Register a release waiting for its download email.
+
+        Parameters
+        ----------
+        item_id : int or str
+            Bandcamp ID of the release.
+        title : str, optional
+            Title of the release, to match emails without its ID.
+        timeout : float
+            Seconds after which the request fails if no email was received.
+
+        Returns
+        -------
+        EmailRequest
+            The request. Its `future` fails with ValueError if no email is received in time.
+        """
+        mailbox = self._get_mailbox()
+        request = EmailRequest(mailbox, item_id, title, time.monotonic() + timeout)
+        with self._lock:
+            self._pending.append(request)
+            # Its email is expected soon
+            self._interval = self.min_interval
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return request
+
+    def cancel(self, request, exc):
+        """Stop waiting for the email of `request`, failing it with `exc`."""
+        with self._lock:
+            if request in self._pending:
+                self._pending.remove(request)
+        if not request.future.done():
+            request.future.set_exception(exc)
+
+    def _is_new(self, mailbox):
+        return lambda message: (mailbox.address, message.id) not in self._seen
+
+    def _match(self, mailbox, message):
+        """Pending request that `message`, received by `mailbox`, is for."""
+        soup = BeautifulSoup(message.html_body or message.body or "", "lxml")
+        links = [a["href"] for a in soup.find_all("a", href=True)]
+        requests = [request for request in self._pending if request.mailbox is mailbox]
+        for matches in (
+            lambda request: request.matches_links(links),
+            lambda request: request.matches_subject(message.subject),
+        ):
+            for request in requests:
+                if matches(request):
+                    return request
+        return requests[0] if len(requests) == 1 else None
+
+    def _poll(self, mailbox):
+        try:
+            messages = mailbox.get_messages(
+                validators=[*self.validators, self._is_new(mailbox)]
+            )
+        except (RequestException, ValueError, OSError):
+            # The mailbox is polled again on the next round
+            return 0
+        received = 0
+        for message in messages:
+            with self._lock:
+                self._seen.add((mailbox.address, message.id))
+                request = self._match(mailbox, message)
+                if request is not None:
+                    self._pending.remove(request)
+            if request is not None and not request.future.done():
+                request.future.set_result(message)
+                received += 1
+        return received
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [request for request in self._pending if request.deadline < now]
+        for request in expired:
+            self.cancel(request, ValueError(EMAIL_TIMEOUT_MESSAGE))
+
+    def _get_timeout(self):
+        """Seconds until the next poll."""
+        with self._lock:
+            interval = self.max_interval if self.backend.notifies else self._interval
+            deadlines = [request.deadline for request in self._pending]
+        if not deadlines:
+            return 0
+        return max(min(interval, min(deadlines) - time.monotonic()), 0)
+
+    def _run(self):
+        try:
+            self._poll_until_done()
+        except BaseException as exc:
+            # Releases waiting for their email fail instead of waiting forever
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._thread = None
+            for request in pending:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+
+    def _poll_until_done(self):
+        while True:
+            self.backend.wait(self._get_timeout())
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                mailboxes = {
+                    id(request.mailbox): request.mailbox for request in self._pending
+                }
+            received = sum(self._poll(mailbox) for mailbox in mailboxes.values())
+            self._expire()
+            with self._lock:
+                if received:
+                    # The emails of releases requested together arrive together
+                    self._interval = self.min_interval
+                else:
+                    self._interval = min(self._interval * 2, self.max_interval)
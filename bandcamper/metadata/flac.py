@@ -1,7 +1,6 @@
-from mimetypes import guess_type
-
 from mutagen.flac import FLAC
 from mutagen.flac import Picture
+from mutagen.id3 import PictureType
 
 from bandcamper.metadata.mp4 import MP4Metadata
 
@@ -41,11 +40,15 @@ class FLACMetadata(MP4Metadata):
             return self.file.pictures[0].data
         return None
 
-    def set_cover_art_from_file(self, file_path):
+    @staticmethod
+    def _make_picture(data, mime):
         picture = Picture()
-        picture.mime = guess_type(file_path)[0]
+        picture.type = PictureType.COVER_FRONT
+        picture.mime = mime
         picture.desc = "cover"
-        with open(file_path, "rb") as file:
-            picture.data = file.read()
+        picture.data = data
+        return picture
+
+    def set_cover_art(self, data, mime):
         self.file.clear_pictures()
-        self.file.add_picture(picture)
+        self.file.add_picture(self._make_picture(data, mime))
@@ -1,5 +1,3 @@
-from mimetypes import guess_type
-
 from mutagen.id3 import APIC
 from mutagen.id3 import TALB
 from mutagen.id3 import TIT2
@@ -64,11 +62,8 @@ class MP3Metadata(TrackMetadata):
             self.file[self.TRACK_NUMBER_TAG] = TRCK()
             self.file[self.TRACK_NUMBER_TAG].text = f"0/{val}"
         else:
-            track_numbers = self.file[self.TRACK_NUMBER_TAG][0].split("/")
-            if len(track_numbers) < 2:
-                self.file[self.TRACK_NUMBER_TAG].text = f"0/{val}"
-            else:
-                self.file[self.TRACK_NUMBER_TAG].text = f"{track_numbers[0]}/{val}"
+            track_number = self.file[self.TRACK_NUMBER_TAG][0].split("/")[0]
+            self.file[self.TRACK_NUMBER_TAG].text = f"{track_number or 0}/{val}"
 
     @property
     def album(self):
@@ -122,10 +117,9 @@ class MP3Metadata(TrackMetadata):
             return self.file[self.COVER_ART_TAG].data
         return None
 
-    def set_cover_art_from_file(self, file_path):
+    def set_cover_art(self, data, mime):
         apic = APIC()
-        apic.mime = guess_type(file_path)[0]
+        apic.mime = mime
         apic.desc = "cover"
-        with open(file_path, "rb") as file:
-            apic.data = file.read()
+        apic.data = data
         self.file[self.COVER_ART_TAG] = apic
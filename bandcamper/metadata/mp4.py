@@ -1,5 +1,3 @@
-from mimetypes import guess_type
-
 from mutagen.mp4 import AtomDataType
 from mutagen.mp4 import MP4
 from mutagen.mp4 import MP4Cover
@@ -91,14 +89,11 @@ class MP4Metadata(TrackMetadata):
             return self.file[self.COVER_ART_TAG][0]
         return None
 
-    def set_cover_art_from_file(self, file_path):
-        mime = guess_type(file_path)[0]
+    def set_cover_art(self, data, mime):
         if mime == "image/jpeg":
             image_format = AtomDataType.JPEG
         elif mime == "image/png":
             image_format = AtomDataType.PNG
         else:
-            raise ValueError(f"{file_path} must be either a JPEG or a PNG image.")
-        with open(file_path, "rb") as file:
-            cover = MP4Cover(data=file.read(), imageformat=image_format)
-        self.file[self.COVER_ART_TAG] = [cover]
+            raise ValueError("Cover art must be either a JPEG or a PNG image.")
+        self.file[self.COVER_ART_TAG] = [MP4Cover(data, imageformat=image_format)]
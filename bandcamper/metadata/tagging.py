@@ -0,0 +1,99 @@
+"""Tagging of downloaded tracks with the data of their release page.
+
+Bandcamp doesn't tag the mp3-128 files of the fallback, and the tags of its downloads don't always
+match the release page. `tag_tracks` sets the title, number, album, artists and lyrics of every
+track from the `trackinfo` of its release, which was already parsed to download it, and can embed
+the same in-memory cover art into all of them. Each file is opened and saved once, and files are
+tagged on a pool of threads.
+"""
+from mutagen import MutagenError
+
+from bandcamper.metadata.utils import get_track_metadata
+from bandcamper.scheduler import run_ordered
+
+
+def get_track_tags(music_data, track_num):
+    """Tags of the track number `track_num` of a release.
+
+    Parameters
+    ----------
+    music_data : dict
+        Data of the release page.
+    track_num : int or None
+        Number of the track, as found in its file.
+
+    Returns
+    -------
+    dict
+        Mapping of `TrackMetadata` properties to their value. Properties with a None value
+        are left as they are.
+    """
+    trackinfo = music_data["trackinfo"]
+    track = next((track for track in trackinfo if track["track_num"] == track_num), {})
+    if not track and len(trackinfo) == 1:
+        track = trackinfo[0]
+    artist = music_data["artist"]
+    if music_data["item_type"] == "album":
+        album = music_data["current"]["title"]
+        track_total = len(trackinfo)
+    else:
+        album = music_data.get("album_title")
+        track_total = None
+    # The number is set before the total, which MP3 files keep in the same frame
+    return {
+        "title": track.get("title"),
+        "track_number": track.get("track_num") or track_num or None,
+        "track_total": track_total,
+        "album": album or None,
+        "artist": track.get("artist") or artist,
+        "album_artist": artist,
+        "lyrics": track.get("lyrics"),
+    }
+
+
+def tag_track(file_path, tags, cover_art=None):
+    """Set the `tags` and the `cover_art` of the track at `file_path`, saving it once."""
+    metadata = get_track_metadata(file_path)
+    for name, value in tags.items():
+        if value is not None:
+            setattr(metadata, name, value)
+    if cover_art is not None:
+        metadata.set_cover_art(*cover_art)
+    metadata.save()
+
+
+def tag_tracks(track_numbers, music_data, jobs=1, cover_art=None):
+    """Tag the tracks of a release with the data of its page.
+
+    Parameters
+    ----------
+    track_numbers : dict
+        Mapping of the path of each track to its number.
+    music_data : dict
+        Data of the release page.
+    jobs : int
+        Number of files tagged at the same time.
+    cover_art : tuple, optional
+        Image and MIME type of the cover art to embed into every track.
+
+    Returns
+    -------
+    dict
+        Mapping of the path of each track that couldn't be tagged to the error.
+    """
+
+    def tag(item):
+        file_path, track_num = item
+        try:
+            tag_track(file_path, get_track_tags(music_data, track_num), cover_art)
+        except (MutagenError, ValueError) as exc:
+            return exc
+        return None
+
+    items = list(track_numbers.items())
+    errors = run_ordered(tag, items, jobs)
+    return {
+        file_path: error
+        for (file_path, _), error in zip(items, errors)
+        if error is not None
+    }
@@ -1,5 +1,6 @@
 from abc import ABC
 from abc import abstractmethod
+from mimetypes import guess_type
 
 from mutagen import File
 
@@ -9,8 +10,9 @@ class TrackMetadata(ABC):
 
     Parameters
     ----------
-    filename : str or path-like object.
-        The filename or file-path of the respective file to read/write metadata.
+    filename : str, path-like object or file object.
+        The filename or file-path of the respective file to read/write metadata. A file object,
+        like a member of a zip file, can be given to read the metadata without saving the file first.
 
     Attributes
     ----------
@@ -140,3 +142,19 @@ class TrackMetadata(ABC):
         -------
         bytes or None
         """
+
+    @abstractmethod
+    def set_cover_art(self, data, mime):
+        """Set the cover art from an image in memory.
+
+        Parameters
+        ----------
+        data : bytes
+            The image. It's embedded as is, so the same object can be shared by many tracks.
+        mime : str
+            MIME type of the image.
+        """
+
+    def set_cover_art_from_file(self, file_path):
+        with open(file_path, "rb") as file:
+            self.set_cover_art(file.read(), guess_type(file_path)[0])
@@ -23,12 +23,12 @@ suffix_to_metadata = {
 }
 
 
-def get_track_metadata(file_path):
+def get_track_metadata(file_path, fileobj=None):
     file_path = Path(file_path)
     ext = file_path.suffix
     if ext not in suffix_to_metadata:
         raise ValueError(f"Extension {file_path} not recognized")
-    return suffix_to_metadata[ext](file_path)
+    return suffix_to_metadata[ext](file_path if fileobj is None else fileobj)
 
 
 def parse_filename(filename):
@@ -38,9 +38,9 @@ def parse_filename(filename):
     return match.groupdict()
 
 
-def get_track_output_context(track_path, tracks):
-    track_metadata = get_track_metadata(track_path)
-    file_path = Path(track_metadata.file.filename)
+def get_track_output_context(track_path, tracks, fileobj=None):
+    track_metadata = get_track_metadata(track_path, fileobj)
+    file_path = Path(track_path)
     filename_data = parse_filename(file_path.name)
     track_number = track_metadata.track_number or int(
         filename_data.get("track_number", 0)
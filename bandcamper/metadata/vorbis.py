@@ -1,3 +1,6 @@
+import base64
+
+from mutagen.flac import Picture
 from mutagen.oggvorbis import OggVorbis
 
 from bandcamper.metadata.flac import FLACMetadata
@@ -6,9 +9,17 @@ from bandcamper.metadata.flac import FLACMetadata
 class VorbisMetadata(FLACMetadata):
     FILE_CLASS = OggVorbis
 
+    COVER_ART_TAG = "metadata_block_picture"
+
     @property
     def cover_art(self):
+        pictures = self.file.get(self.COVER_ART_TAG)
+        if pictures:
+            return Picture(base64.b64decode(pictures[0])).data
         return None
 
-    def set_cover_art_from_file(self, file_path):
-        raise ValueError("Can't set cover art for Vorbis file")
+    def set_cover_art(self, data, mime):
+        picture = self._make_picture(data, mime)
+        self.file[self.COVER_ART_TAG] = [
+            base64.b64encode(picture.write()).decode("ascii")
+        ]
@@ -0,0 +1,182 @@
+"""Fast extraction of the few fields bandcamper reads from Bandcamp pages.
+
+Release and download pages are large, but only a handful of their tags are used: the
+`data-tralbum` script, the `#tralbumArt` popup link and the `span.fromAlbum` of the
+`#name-section` of release pages, and the `#pagedata` blob of download pages. Instead of
+building a tree of the whole document, each of those tags is located by a marker in its
+attributes and only that tag is parsed.
+
+The functions return None when a page doesn't look like expected, so callers can fall back
+to BeautifulSoup.
+"""
+import json
+import re
+from html import unescape
+
+# A start tag and its attributes, allowing ">" inside quoted attribute values
+START_TAG_REGEX = re.compile(r"<([a-zA-Z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>")
+ATTRIBUTE_REGEX = re.compile(
+    r"([^\s\"'>/=]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?"
+)
+TAG_REGEX = re.compile(r"<[^>]*>")
+
+
+def _parse_attributes(attributes):
+    parsed = {}
+    for match in ATTRIBUTE_REGEX.finditer(attributes):
+        name = match.group(1).lower()
+        if name not in parsed:
+            value = next((group for group in match.groups()[1:] if group), "")
+            parsed[name] = unescape(value)
+    return parsed
+
+
+def find_start_tag(text, tag, marker, start=0, predicate=None):
+    """Find the first `tag` start tag with `marker` in its attributes.
+
+    Parameters
+    ----------
+    text : str
+        HTML to search.
+    tag : str
+        Lowercase name of the tag.
+    marker : str
+        Text that must appear in the attributes of the tag, like an attribute name or value.
+    start : int
+        Position of `text` where the search starts.
+    predicate : callable, optional
+        Called with the attributes of each candidate tag, which is skipped if it returns
+        False.
+
+    Returns
+    -------
+    tuple
+        The attributes of the tag as a dict and the position right after the tag, or
+        `(None, -1)` if there's no such tag.
+    """
+    position = text.find(marker, start)
+    while position != -1:
+        tag_start = text.rfind("<", start, position)
+        match = START_TAG_REGEX.match(text, tag_start) if tag_start != -1 else None
+        # The marker must be inside the tag, not in the text or another tag after it
+        if match and match.end() > position and match.group(1).lower() == tag:
+            attributes = _parse_attributes(match.group(2))
+            if predicate is None or predicate(attributes):
+                return attributes, match.end()
+        position = text.find(marker, position + len(marker))
+    return None, -1
+
+
+def _has_class(name):
+    return lambda attributes: name in attributes.get("class", "").split()
+
+
+def _has_id(name):
+    return lambda attributes: attributes.get("id") == name
+
+
+def extract_music_data(text):
+    """Data of a release page: its `data-tralbum`, with `art_url` and `album_title` added.
+
+    `text` can be the beginning of the page only, so a page without a `span.fromAlbum` only
+    counts as complete once its `#name-section`, where the span would be, has been read.
+
+    Returns
+    -------
+    dict or None
+        The data, or None if the page doesn't have the expected tags.
+    """
+    script, _ = find_start_tag(text, "script", "data-tralbum")
+    art_div, art_div_end = find_start_tag(
+        text, "div", "tralbumArt", predicate=_has_id("tralbumArt")
+    )
+    if script is None or art_div is None:
+        return None
+    popup_link, popup_link_end = find_start_tag(
+        text, "a", "popupImage", art_div_end, _has_class("popupImage")
+    )
+    if popup_link is None or "href" not in popup_link:
+        return None
+    # The link must be inside the art div
+    if text.find("</div>", art_div_end, popup_link_end) != -1:
+        return None
+    try:
+        data = json.loads(script.get("data-tralbum", ""))
+    except ValueError:
+        return None
+    data["art_url"] = popup_link["href"]
+    _, from_album_end = find_start_tag(
+        text, "span", "fromAlbum", predicate=_has_class("fromAlbum")
+    )
+    if from_album_end != -1:
+        end = text.find("</span>", from_album_end)
+        if end == -1:
+            return None
+        data["album_title"] = unescape(TAG_REGEX.sub("", text[from_album_end:end]))
+    else:
+        _, name_section_end = find_start_tag(
+            text, "div", "name-section", predicate=_has_id("name-section")
+        )
+        if name_section_end == -1 or text.find("</div>", name_section_end) == -1:
+            return None
+    return data
+
+
+class UntilMarkers:
+    """Stop condition of a streamed page, calling `extract` once every marker is read.
+
+    Meant as the `until` of `Requester.get_page_or_error`, which calls it with the text
+    read so far after every chunk. Only the text added since the previous call is searched
+    for the missing markers, starting a marker's length before it in case one was split
+    between chunks, so the beginning of the page isn't scanned again for every chunk. A new
+    instance is needed for each page.
+
+    Parameters
+    ----------
+    extract : callable
+        Called with the text read so far, once it has every marker. The page is read until
+        it returns a truthy value.
+    *markers : str
+        Text that must have been read before calling `extract`.
+    """
+
+    def __init__(self, extract, *markers):
+        self.extract = extract
+        self._missing = list(markers)
+        self._searched = 0
+
+    def __call__(self, text):
+        if self._missing:
+            overlap = max(len(marker) for marker in self._missing) - 1
+            start = max(self._searched - overlap, 0)
+            self._missing = [
+                marker for marker in self._missing if text.find(marker, start) == -1
+            ]
+            self._searched = len(text)
+            if self._missing:
+                return None
+        return self.extract(text)
+
+
+def music_data_until():
+    """`until` reading a release page only up to the data `extract_music_data` needs."""
+    return UntilMarkers(extract_music_data, "data-tralbum", "tralbumArt", "popupImage")
+
+
+def extract_download_data(text):
+    """Data of a download page, from the `data-blob` of its `#pagedata`.
+
+    Returns
+    -------
+    dict or None
+        The data, or None if the page doesn't have the expected tags.
+    """
+    page_data, _ = find_start_tag(
+        text, "div", "pagedata", predicate=_has_id("pagedata")
+    )
+    if page_data is None:
+        return None
+    try:
+        return json.loads(page_data.get("data-blob", ""))
+    except ValueError:
+        return None
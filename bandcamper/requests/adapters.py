@@ -0,0 +1,105 @@
+"""Transport adapter and retry policy of the `requests.Session` of `Requester`.
+
+Requests that fail to connect, or that are answered with 500, 502 or 504, are retried by urllib3
+when their method is idempotent, after an exponential backoff with full jitter: each wait is a
+random time up to the exponential one, so workers that failed together don't retry together.
+429 and 503 responses are left to the rate limiter of `Requester`, which slows down the whole
+host instead of a single request.
+"""
+import random
+from threading import Lock
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+RETRY_STATUSES = (500, 502, 504)
+
+
+def get_backoff(backoff_factor, retries):
+    """Seconds to wait before retrying a request for the `retries`-th time, with full jitter."""
+    backoff = min(backoff_factor * 2 ** (retries - 1), Retry.DEFAULT_BACKOFF_MAX)
+    return random.uniform(0, backoff)
+
+
+class JitteredRetry(Retry):
+    """`urllib3.util.retry.Retry` waiting a random time up to its exponential backoff."""
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+def make_retry(retries, backoff_factor):
+    """Retry policy of idempotent requests, for the `max_retries` of an `HTTPAdapter`.
+
+    Parameters
+    ----------
+    retries : int
+        Maximum number of retries of a request.
+    backoff_factor : float
+        Seconds of the first backoff, doubled for every retry.
+
+    Returns
+    -------
+    JitteredRetry
+        The policy. The last response is returned when retries run out, instead of raising.
+    """
+    return JitteredRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+
+
+class PoolStatsAdapter(HTTPAdapter):
+    """`HTTPAdapter` counting the connections it opens and the ones it reuses."""
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = Lock()
+        # Connections and requests of the pools already discarded
+        self._disposed_stats = [0, 0]
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._dispose_pool
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        is_new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if is_new:
+            manager.pools.dispose_func = self._dispose_pool
+        return manager
+
+    def _dispose_pool(self, pool):
+        with self._stats_lock:
+            self._disposed_stats[0] += pool.num_connections
+            self._disposed_stats[1] += pool.num_requests
+        pool.close()
+
+    def get_pool_stats(self):
+        """Connections opened and reused by the adapter, directly or through proxies.
+
+        Returns
+        -------
+        dict
+            ``connections`` (new connections), ``requests`` (requests sent, including
+            retries) and ``reused`` (requests sent on a connection kept alive).
+        """
+        live_pools = []
+        for manager in [self.poolmanager, *list(self.proxy_manager.values())]:
+            with manager.pools.lock:
+                live_pools.extend(manager.pools._container.values())
+        with self._stats_lock:
+            connections, requests = self._disposed_stats
+        for pool in live_pools:
+            connections += pool.num_connections
+            requests += pool.num_requests
+        return {
+            "connections": connections,
+            "requests": requests,
+            "reused": max(requests - connections, 0),
+        }
@@ -0,0 +1,458 @@
+import asyncio
+import codecs
+import socket
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from requests import ConnectionError
+from requests import HTTPError
+from requests import Response
+from requests.utils import get_encoding_from_headers
+
+from bandcamper.requests.adapters import get_backoff
+from bandcamper.requests.adapters import IDEMPOTENT_METHODS
+from bandcamper.requests.adapters import RETRY_STATUSES
+from bandcamper.requests.partial import PartialDownload
+from bandcamper.requests.progress import ThrottledProgressBar
+from bandcamper.requests.ratelimit import RateLimiter
+from bandcamper.requests.ratelimit import THROTTLE_STATUSES
+from bandcamper.requests.requester import Requester
+from bandcamper.requests.utils import get_default_user_agent
+from bandcamper.requests.utils import get_host_key
+from bandcamper.requests.watchdog import SpeedWatchdog
+from bandcamper.requests.watchdog import StallError
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncRequester:
+    """asyncio counterpart of `Requester`, built on aiohttp.
+
+    The methods have the same names and arguments as the ones from `Requester`, but are coroutines.
+    Request errors are raised as `requests.HTTPError`, so both requesters can be handled the same way.
+
+    Notes
+    -----
+    aiohttp is an optional dependency, installed with the `async` extra: `pip install bandcamper[async]`.
+    """
+
+    def __init__(
+        self,
+        user_agent=None,
+        http_proxy=None,
+        https_proxy=None,
+        host_limits=None,
+        default_host_limit=4,
+        cache=None,
+        download_retries=3,
+        segments=1,
+        segment_threshold=64 * 1024 * 1024,
+        max_rate=None,
+        throttle_retries=5,
+        retries=3,
+        retry_backoff=0.5,
+        connect_timeout=10,
+        read_timeout=60,
+        min_speed=1024,
+        stall_time=30,
+    ):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncRequester requires aiohttp. Install it with: pip install bandcamper[async]"
+            )
+        self.headers = {"User-Agent": user_agent or get_default_user_agent()}
+        self.proxies = {
+            "http": http_proxy,
+            "https": https_proxy,
+        }
+        self.host_limits = dict(Requester.DEFAULT_HOST_LIMITS)
+        self.host_limits.update(host_limits or {})
+        self.default_host_limit = default_host_limit
+        # Created in the running loop, which on Python < 3.10 they're bound to
+        self._host_semaphores = {}
+        self.cache = cache
+        self.download_retries = download_retries
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.rate_limiter = RateLimiter(self.host_limits, max_rate=max_rate)
+        self.throttle_retries = throttle_retries
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.min_speed = min_speed
+        self.stall_time = stall_time
+        self._pool_stats = {"connections": 0, "reused": 0}
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=0),
+                timeout=self.timeout,
+                trace_configs=[self._get_trace_config()],
+            )
+        return self._session
+
+    def _get_trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self._pool_stats["connections"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._pool_stats["reused"] += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def get_pool_stats(self):
+        """Same as `Requester.get_pool_stats`."""
+        stats = dict(self._pool_stats)
+        stats["requests"] = stats["connections"] + stats["reused"]
+        return stats
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @asynccontextmanager
+    async def host_slot(self, url):
+        """Wait until a new connection to the host of `url` is allowed by the host limits."""
+        host = get_host_key(url, self.host_limits)
+        if host not in self.host_limits and not self.default_host_limit:
+            yield
+            return
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(
+                self.host_limits.get(host, self.default_host_limit)
+            )
+        async with self._host_semaphores[host]:
+            yield
+
+    def _can_segment(self, partial, headers):
+        return (
+            self.segments > 1
+            and partial.content_length is not None
+            and partial.content_length >= self.segment_threshold
+            and headers.get("Accept-Ranges", "").lower() == "bytes"
+        )
+
+    def _get_proxy(self, url):
+        return self.proxies.get(url.split(":", 1)[0].lower())
+
+    @asynccontextmanager
+    async def _translate_errors(self):
+        try:
+            yield
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            raise ConnectionError(str(exc)) from exc
+
+    @staticmethod
+    def _raise_for_status(response):
+        if response.status < 400:
+            return
+        error_response = Response()
+        error_response.status_code = response.status
+        error_response.reason = response.reason
+        error_response.url = str(response.url)
+        error_response.headers.update(response.headers)
+        raise HTTPError(
+            f"{response.status} Error: {response.reason} for url: {response.url}",
+            response=error_response,
+        )
+
+    async def send(self, method, url, **kwargs):
+        """Same as `Requester.send`.
+
+        Returns
+        -------
+        aiohttp.ClientResponse
+            The last response, with its body still to be read.
+        """
+        retries = errors = 0
+        while True:
+            delay = self.rate_limiter.reserve(url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent_at = time.monotonic()
+            # Failed idempotent requests are retried like `make_retry` does for Requester
+            can_retry = method in IDEMPOTENT_METHODS and errors < self.retries
+            try:
+                response = await self.session.request(
+                    method, url, proxy=self._get_proxy(url), **kwargs
+                )
+            except aiohttp.ClientConnectionError:
+                if not can_retry:
+                    raise
+                errors += 1
+                await asyncio.sleep(get_backoff(self.retry_backoff, errors))
+                continue
+            if response.status in RETRY_STATUSES and can_retry:
+                response.release()
+                errors += 1
+                await asyncio.sleep(get_backoff(self.retry_backoff, errors))
+                continue
+            if response.status not in THROTTLE_STATUSES:
+                self.rate_limiter.on_success(url)
+                return response
+            retry_after = self.rate_limiter.on_throttle(
+                url, sent_at, response.headers.get("Retry-After")
+            )
+            if (
+                retries >= self.throttle_retries
+                or retry_after > Requester.MAX_RETRY_AFTER
+            ):
+                return response
+            response.release()
+            retries += 1
+
+    async def _request_or_error(self, method, url, **kwargs):
+        async with self.host_slot(url), self._translate_errors():
+            response = await self.send(method, url, **kwargs)
+            await response.read()
+        self._raise_for_status(response)
+        return response
+
+    async def get_request_or_error(self, url, **kwargs):
+        return await self._request_or_error("GET", url, **kwargs)
+
+    async def post_request_or_error(self, url, **kwargs):
+        return await self._request_or_error("POST", url, **kwargs)
+
+    @staticmethod
+    async def _to_requests_response(response, content=None):
+        converted = Response()
+        converted.status_code = response.status
+        converted.reason = response.reason
+        converted.url = str(response.url)
+        converted.headers.update(response.headers)
+        converted.encoding = get_encoding_from_headers(converted.headers)
+        converted._content = await response.read() if content is None else content
+        return converted
+
+    @staticmethod
+    async def _read_until(response, until):
+        encoding = get_encoding_from_headers(response.headers) or "utf8"
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        body = bytearray()
+        text = ""
+        async for chunk in response.content.iter_chunked(Requester.PAGE_CHUNK_SIZE):
+            body += chunk
+            text += decoder.decode(chunk)
+            if until is not None and until(text):
+                break
+        return bytes(body)
+
+    async def get_page_or_error(self, url, until, **kwargs):
+        """Same as `Requester.get_page_or_error`.
+
+        Returns
+        -------
+        requests.Response
+            The response, with the part of the body that was read as its content.
+        """
+        async with self.host_slot(url), self._translate_errors():
+            response = await self.send("GET", url, **kwargs)
+            try:
+                # Error pages are read whole
+                content = await self._read_until(
+                    response, until if response.status == 200 else None
+                )
+            finally:
+                response.close()
+        self._raise_for_status(response)
+        return await self._to_requests_response(response, content)
+
+    async def _get_or_error(self, url, until, **kwargs):
+        if until is None:
+            return await self._to_requests_response(
+                await self.get_request_or_error(url, **kwargs)
+            )
+        return await self.get_page_or_error(url, until, **kwargs)
+
+    async def get_cached_request_or_error(self, url, until=None, **kwargs):
+        """Same as `Requester.get_cached_request_or_error`.
+
+        Returns
+        -------
+        requests.Response
+            The response, already read, as a `requests.Response` so that cached and fresh
+            responses can be used the same way.
+        """
+        if self.cache is None:
+            return await self._get_or_error(url, until, **kwargs)
+        entry = self.cache.get(url)
+        if entry is not None and entry.is_fresh(self.cache.ttl):
+            return entry.to_response()
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry is not None:
+            headers.update(entry.get_validators())
+        response = await self._get_or_error(url, until, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            return self.cache.refresh(entry, response.headers).to_response()
+        if self.cache.is_cacheable(response):
+            self.cache.store(url, response.headers, response.content)
+        return response
+
+    async def _download_attempt(self, partial, filename, label, progress, segmented):
+        headers = {"Accept-Encoding": "identity"}
+        headers.update(partial.get_resume_headers())
+        async with self.host_slot(partial.url), self._translate_errors():
+            response = await self.send("GET", partial.url, headers=headers)
+            async with response:
+                if partial.is_complete(response.status, response.headers):
+                    return partial.finish(filename)
+                if response.status == 416 and "Range" in headers:
+                    # The `.part` file doesn't match the file on the server anymore
+                    partial.discard()
+                    return None
+                self._raise_for_status(response)
+                offset = partial.start(response.status, response.headers)
+                if offset is None:
+                    return None
+                if (
+                    segmented
+                    and not offset
+                    and self._can_segment(partial, response.headers)
+                ):
+                    partial.start_segmented(self.segments)
+                    return None
+                with partial.open() as file, ThrottledProgressBar(
+                    partial.content_length,
+                    partial.get_label(filename, label),
+                    offset,
+                    progress,
+                ) as bar:
+                    watchdog = SpeedWatchdog(
+                        partial.url, self.min_speed, self.stall_time
+                    )
+                    # Chunks are written as they arrive, without being split or joined
+                    async for chunk in response.content.iter_any():
+                        watchdog.update(len(chunk))
+                        file.write(chunk)
+                        bar.update(len(chunk))
+        file_path = partial.finish(filename)
+        if file_path is None:
+            raise ConnectionError(f"Incomplete download from {partial.url}")
+        return file_path
+
+    async def _download_segment(self, partial, segment, bar):
+        headers = {"Accept-Encoding": "identity"}
+        headers.update(partial.get_segment_headers(segment))
+        async with self.host_slot(partial.url), self._translate_errors():
+            response = await self.send("GET", partial.url, headers=headers)
+            async with response:
+                # The file on the server is shorter than the `.part` file
+                if response.status == 416:
+                    return False
+                self._raise_for_status(response)
+                if not partial.is_segment_response(
+                    segment, response.status, response.headers
+                ):
+                    return False
+                unsaved = 0
+                watchdog = SpeedWatchdog(partial.url, self.min_speed, self.stall_time)
+                with partial.open_segment(segment) as file:
+                    try:
+                        async for chunk in response.content.iter_any():
+                            watchdog.update(len(chunk))
+                            chunk = chunk[: segment[1] + 1 - segment[0] - segment[2]]
+                            file.write(chunk)
+                            segment[2] += len(chunk)
+                            bar.update(len(chunk))
+                            unsaved += len(chunk)
+                            if unsaved >= Requester.SEGMENT_SAVE_INTERVAL:
+                                file.flush()
+                                partial.save_progress()
+                                unsaved = 0
+                    finally:
+                        file.flush()
+                        partial.save_progress()
+        return True
+
+    async def _download_segments(self, partial, filename, label, progress):
+        """Same as `Requester._download_segments`."""
+        with ThrottledProgressBar(
+            partial.content_length,
+            partial.get_label(filename, label),
+            partial.offset,
+            progress,
+        ) as bar:
+            tasks = [
+                asyncio.ensure_future(self._download_segment(partial, segment, bar))
+                for segment in partial.get_pending_segments()
+            ]
+            try:
+                honoured = all(await asyncio.gather(*tasks))
+            finally:
+                for task in tasks:
+                    task.cancel()
+        if not honoured:
+            partial.discard()
+            return None
+        file_path = partial.finish(filename)
+        if file_path is None:
+            raise ConnectionError(f"Incomplete download from {partial.url}")
+        return file_path
+
+    async def download_to_file(
+        self, url, save_path, filename, label=None, progress=True
+    ):
+        """Same as `Requester.download_to_file`."""
+        partial = PartialDownload(url, save_path)
+        segmented = True
+        retries = 0
+        while True:
+            try:
+                if partial.segments:
+                    file_path = await self._download_segments(
+                        partial, filename, label, progress
+                    )
+                    segmented = file_path is not None
+                else:
+                    file_path = await self._download_attempt(
+                        partial, filename, label, progress, segmented
+                    )
+            except (ConnectionError, StallError):
+                if retries >= self.download_retries:
+                    raise
+                retries += 1
+                continue
+            if file_path is not None:
+                return file_path
+
+    async def get_ips_from_url(self, url):
+        """Same as `Requester.get_ips_from_url`."""
+        if self._get_proxy(url):
+            return {await self.get_ip_from_url(url)}
+        hostname = urlparse(url).hostname
+        try:
+            addresses = await asyncio.get_event_loop().getaddrinfo(
+                hostname, None, proto=socket.IPPROTO_TCP
+            )
+        except (socket.gaierror, UnicodeError) as exc:
+            raise ConnectionError(f"Failed to resolve {hostname}: {exc}") from exc
+        return {address[4][0] for address in addresses}
+
+    async def get_ip_from_url(self, url):
+        async with self.host_slot(url), self._translate_errors(), self.session.get(
+            url, proxy=self._get_proxy(url)
+        ) as response:
+            self._raise_for_status(response)
+            return response.connection.transport.get_extra_info("peername")[0]
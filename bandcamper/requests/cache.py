@@ -0,0 +1,183 @@
+"""On-disk cache for Bandcamp pages.
+
+Each response is stored as two files named after the SHA-256 of its URL: ``<key>.body`` with the
+response body and ``<key>.json`` with the URL, headers and the time it was stored. The modification
+time of the ``.json`` file is the last time the entry was used, which is what the LRU eviction is
+based on, so the cache can be shared by several processes.
+"""
+import json
+import os
+from hashlib import sha256
+from pathlib import Path
+from threading import Lock
+from time import time
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+CACHEABLE_CONTENT_TYPES = ("text/html", "application/json")
+# Headers describing how the body was transferred, which don't apply to the stored (decoded) body
+UNCACHED_HEADERS = (
+    "connection",
+    "content-encoding",
+    "content-length",
+    "set-cookie",
+    "transfer-encoding",
+)
+
+
+class CacheEntry:
+    def __init__(self, url, headers, body, stored_at):
+        self.url = url
+        self.headers = CaseInsensitiveDict(headers)
+        self.body = body
+        self.stored_at = stored_at
+
+    def is_fresh(self, ttl):
+        return time() - self.stored_at < ttl
+
+    def get_validators(self):
+        """Conditional request headers to revalidate the entry.
+
+        Returns
+        -------
+        dict
+            `If-None-Match` and/or `If-Modified-Since` headers, empty if the server sent no validators.
+        """
+        validators = {}
+        if "ETag" in self.headers:
+            validators["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+    def to_response(self):
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """Size-bounded on-disk cache of HTML and JSON responses.
+
+    Parameters
+    ----------
+    cache_dir : str or path-like object
+        Directory where responses are stored. It's created if it doesn't exist.
+    ttl : int or float
+        Seconds during which a stored response is used without contacting the server.
+        After that, it's revalidated with `ETag`/`Last-Modified` before being used again.
+    max_size : int
+        Maximum size of the stored bodies, in bytes. The least recently used entries are
+        evicted when the limit is exceeded.
+    """
+
+    def __init__(self, cache_dir, ttl=3600, max_size=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = Lock()
+        self._size = sum(path.stat().st_size for path in self.cache_dir.glob("*.body"))
+
+    def _get_paths(self, url):
+        key = sha256(url.encode()).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    @staticmethod
+    def is_cacheable(response):
+        content_type = response.headers.get("Content-Type", "")
+        return response.status_code == 200 and content_type.startswith(
+            CACHEABLE_CONTENT_TYPES
+        )
+
+    def get(self, url):
+        meta_path, body_path = self._get_paths(url)
+        try:
+            with meta_path.open(encoding="utf8") as meta_file:
+                meta = json.load(meta_file)
+            body = body_path.read_bytes()
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(url, meta["headers"], body, meta["stored_at"])
+
+    @staticmethod
+    def _write_atomically(path, data):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, meta_path, url, headers, stored_at):
+        headers = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in UNCACHED_HEADERS
+        }
+        meta = {"url": url, "headers": headers, "stored_at": stored_at}
+        self._write_atomically(meta_path, json.dumps(meta).encode("utf8"))
+
+    def store(self, url, headers, body):
+        meta_path, body_path = self._get_paths(url)
+        stored_at = time()
+        with self._lock:
+            old_size = body_path.stat().st_size if body_path.exists() else 0
+            self._write_atomically(body_path, body)
+            self._write_meta(meta_path, url, headers, stored_at)
+            self._size += len(body) - old_size
+            if self._size > self.max_size:
+                self._evict()
+        return CacheEntry(url, headers, body, stored_at)
+
+    def refresh(self, entry, headers):
+        """Mark `entry` as fresh again after the server answered 304 Not Modified."""
+        entry.headers.update(
+            {
+                name: value
+                for name, value in headers.items()
+                if name.lower() in ("etag", "last-modified", "date", "cache-control")
+            }
+        )
+        entry.stored_at = time()
+        meta_path, _ = self._get_paths(entry.url)
+        with self._lock:
+            self._write_meta(meta_path, entry.url, entry.headers, entry.stored_at)
+        return entry
+
+    def _evict(self):
+        entries = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((meta_path.stat().st_mtime, meta_path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, meta_path in entries:
+            if self._size <= self.max_size:
+                break
+            body_path = meta_path.with_suffix(".body")
+            try:
+                size = body_path.stat().st_size
+                body_path.unlink()
+                meta_path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        # Only the files of entries, as other caches can share the directory
+        with self._lock:
+            for body_path in self.cache_dir.glob("*.body"):
+                for path in (body_path.with_suffix(".json"), body_path):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+            self._size = 0
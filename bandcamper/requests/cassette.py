@@ -0,0 +1,282 @@
+"""Recording of HTTP traffic, to replay bandcamper runs without network access.
+
+A cassette is a gzip-compressed file with one JSON object per line: either a response, with the
+method, URL and ``Range`` of its request, or the addresses a hostname resolved to. Responses are
+recorded and replayed by transport adapters mounted on the `requests.Session` of a `Requester`,
+so pages, JSON and downloads all go through them.
+
+Page and JSON bodies are always recorded whole. Other bodies, like audio files and zips, can be
+truncated to their first `max_body` bytes to keep cassettes small. Truncated bodies, like bodies
+that were only partly read while recording, are padded with zeros up to their original length
+when replayed. That's enough to measure transfers, but not to extract or tag the files.
+"""
+import base64
+import gzip
+import io
+import json
+import re
+from collections import defaultdict
+from http import HTTPStatus
+from threading import Lock
+
+from requests import ConnectionError
+from requests.structures import CaseInsensitiveDict
+from urllib3 import HTTPResponse
+
+from bandcamper.requests.adapters import PoolStatsAdapter
+
+PAGE_CONTENT_TYPES = ("text/", "application/json")
+# Headers describing how the body was transferred, which are set again when it's replayed
+TRANSFER_HEADERS = ("content-length", "transfer-encoding")
+RANGE_REGEX = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class Cassette:
+    """Recorded HTTP responses and DNS lookups.
+
+    Parameters
+    ----------
+    path : str or path-like object
+        Cassette file.
+    mode : {"record", "replay"}
+        Whether to record to `path`, overwriting it, or to replay it.
+    max_body : int, optional
+        When recording, maximum number of bytes stored for bodies other than pages and JSON.
+    """
+
+    def __init__(self, path, mode, max_body=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_body = max_body
+        self._lock = Lock()
+        self._responses = defaultdict(list)
+        self._dns = {}
+        self._file = None
+        if mode == "record":
+            self._file = gzip.open(path, "wt", encoding="utf8")
+        else:
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf8") as cassette_file:
+            for line in cassette_file:
+                entry = json.loads(line)
+                if entry["type"] == "dns":
+                    self._dns[entry["host"]] = entry["addresses"]
+                else:
+                    key = (entry["method"], entry["url"], entry.get("range"))
+                    self._responses[key].append(entry)
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def record_response(self, request, response, body, size):
+        """Record `response` to `request`, with the first bytes of its body and its length.
+
+        The body is recorded as it was sent, so its `Content-Encoding` is kept. Unencoded bodies
+        that weren't read whole keep the length given by their `Content-Length`.
+        """
+        length = response.headers.get("Content-Length")
+        if length is not None and "Content-Encoding" not in response.headers:
+            size = max(size, int(length))
+        entry = {
+            "type": "response",
+            "method": request.method,
+            "url": request.url,
+            "range": request.headers.get("Range"),
+            "status": response.status,
+            "reason": response.reason,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in TRANSFER_HEADERS
+            },
+            "size": size,
+        }
+        try:
+            entry["text"] = body.decode("utf8")
+        except UnicodeDecodeError:
+            entry["base64"] = base64.b64encode(body).decode("ascii")
+        self._write(entry)
+
+    def record_dns(self, host, addresses):
+        self._write({"type": "dns", "host": host, "addresses": sorted(addresses)})
+
+    def get_dns(self, host):
+        """Recorded addresses of `host`.
+
+        Raises
+        ------
+        requests.ConnectionError
+            If `host` wasn't resolved while recording.
+        """
+        if host not in self._dns:
+            raise ConnectionError(f"No recorded DNS lookup of {host}")
+        return set(self._dns[host])
+
+    @staticmethod
+    def _get_body(entry):
+        if "text" in entry:
+            body = entry["text"].encode("utf8")
+        else:
+            body = base64.b64decode(entry["base64"])
+        return body + bytes(entry["size"] - len(body))
+
+    def get_response(self, method, url, range_header=None):
+        """Status, reason, headers and body of the recorded response to a request.
+
+        Responses recorded more than once for the same request are replayed in order, the
+        last one being repeated. A `range_header` that wasn't recorded is served from the
+        whole body, if that was recorded.
+
+        Raises
+        ------
+        requests.ConnectionError
+            If no response was recorded for the request.
+        """
+        entry = None
+        with self._lock:
+            for key in ((method, url, range_header), (method, url, None)):
+                entries = self._responses.get(key)
+                if entries:
+                    entry = entries.pop(0) if len(entries) > 1 else entries[0]
+                    break
+        if entry is None:
+            raise ConnectionError(f"No recorded response for {method} {url}")
+        headers = CaseInsensitiveDict(entry["headers"])
+        body = self._get_body(entry)
+        status, reason = entry["status"], entry["reason"]
+        if range_header is not None and key[2] is None and status == 200:
+            status, body = self._get_range(range_header, body, headers)
+            reason = HTTPStatus(status).phrase
+        headers["Content-Length"] = str(len(body))
+        return status, reason, headers, body
+
+    @staticmethod
+    def _get_range(range_header, body, headers):
+        match = RANGE_REGEX.fullmatch(range_header)
+        if match is None or int(match.group(1)) >= len(body):
+            headers["Content-Range"] = f"bytes */{len(body)}"
+            return 416, b""
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        stop = end + 1
+        return 206, body[start:stop]
+
+    def get_adapter(self, **kwargs):
+        """Transport adapter recording to or replaying from the cassette, depending on `mode`.
+
+        Keyword arguments are passed to `requests.adapters.HTTPAdapter`.
+        """
+        if self.mode == "record":
+            return RecordingAdapter(self, **kwargs)
+        return ReplayAdapter(self, **kwargs)
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+
+
+class RecordingReader(io.RawIOBase):
+    """Body of a response, recorded to a cassette as it's read.
+
+    Bodies that aren't read to the end, like pages read only until their data was found or
+    downloads continued in segments, are recorded as far as they were read.
+    """
+
+    def __init__(self, raw, on_finish, max_body=None):
+        super().__init__()
+        self._raw = raw
+        self._on_finish = on_finish
+        self._max_body = max_body
+        self._head = bytearray()
+        self._size = 0
+        self._finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        read = self._raw.readinto(buffer)
+        if not read:
+            self._finish()
+            return read
+        kept = read
+        if self._max_body is not None:
+            kept = max(min(read, self._max_body - len(self._head)), 0)
+        self._head += memoryview(buffer)[:kept]
+        self._size += read
+        return read
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self._on_finish(bytes(self._head), self._size)
+
+    def close(self):
+        if not self.closed:
+            self._finish()
+            self._raw.close()
+            self._raw.release_conn()
+        super().close()
+
+
+class RecordingAdapter(PoolStatsAdapter):
+    """Adapter recording every response it gets to `cassette`."""
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        raw = response.raw
+        max_body = self.cassette.max_body
+        if response.headers.get("Content-Type", "").startswith(PAGE_CONTENT_TYPES):
+            max_body = None
+        reader = RecordingReader(
+            raw,
+            lambda body, size: self.cassette.record_response(request, raw, body, size),
+            max_body,
+        )
+        headers = {
+            name: value
+            for name, value in raw.headers.items()
+            if name.lower() != "transfer-encoding"
+        }
+        response.raw = HTTPResponse(
+            body=reader,
+            headers=headers,
+            status=raw.status,
+            reason=raw.reason,
+            preload_content=False,
+            decode_content=False,
+        )
+        return response
+
+
+class ReplayAdapter(PoolStatsAdapter):
+    """Adapter answering every request with the response recorded in `cassette`."""
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        status, reason, headers, body = self.cassette.get_response(
+            request.method, request.url, request.headers.get("Range")
+        )
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=status,
+            reason=reason,
+            preload_content=False,
+            decode_content=False,
+        )
+        return self.build_response(request, raw)
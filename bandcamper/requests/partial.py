@@ -0,0 +1,250 @@
+"""Downloads that can be resumed after a dropped connection or a restart.
+
+While a file is being downloaded, it's written to ``<key>.part`` in the download directory, where ``key``
+is the SHA-256 of its URL without the query string, as Bandcamp signs download URLs with parameters that
+change on every request. Next to it, ``<key>.part.json`` stores the validators of the file (ETag,
+Last-Modified and Content-Length), so a later attempt can ask for the remaining bytes with a ``Range``
+request and only start over if the file changed on the server.
+
+Large files can also be downloaded in segments, each fetched with its own ``Range`` request into a
+preallocated ``.part`` file. The sidecar then also stores the ``[start, end, downloaded]`` bytes of
+every segment, so each one can be resumed on its own.
+"""
+import json
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+from threading import Lock
+from urllib.parse import urlsplit
+
+from bandcamper.requests.utils import get_download_file_extension
+from bandcamper.requests.utils import humanize_bytes
+from bandcamper.utils import preallocate
+
+CONTENT_RANGE_REGEX = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+UNSATISFIED_RANGE_REGEX = re.compile(r"bytes \*/(\d+)")
+
+
+class PartialDownload:
+    """Download of `url` into `save_path`, possibly resuming a previous one.
+
+    Parameters
+    ----------
+    url : str
+        URL of the file.
+    save_path : str or path-like object
+        Directory where the file is downloaded.
+    """
+
+    def __init__(self, url, save_path):
+        self.url = url
+        self.save_path = Path(save_path)
+        scheme, netloc, path, _, _ = urlsplit(url)
+        key = sha256(f"{scheme}://{netloc}{path}".encode()).hexdigest()
+        self.part_path = self.save_path / f"{key}.part"
+        self.meta_path = self.save_path / f"{key}.part.json"
+        self.meta = self._load_meta()
+        self._lock = Lock()
+
+    def _load_meta(self):
+        try:
+            with self.meta_path.open(encoding="utf8") as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self):
+        tmp_path = self.meta_path.with_name(f"{self.meta_path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w", encoding="utf8") as meta_file:
+            json.dump(self.meta, meta_file)
+        os.replace(tmp_path, self.meta_path)
+
+    @property
+    def content_length(self):
+        return None if self.meta is None else self.meta["content_length"]
+
+    @property
+    def segments(self):
+        """`[start, end, downloaded]` of each segment, or None if the file isn't segmented."""
+        return None if self.meta is None else self.meta.get("segments")
+
+    @property
+    def offset(self):
+        """Number of bytes already downloaded."""
+        if self.meta is None:
+            return 0
+        if self.segments:
+            return sum(downloaded for _, _, downloaded in self.segments)
+        try:
+            return self.part_path.stat().st_size
+        except OSError:
+            return 0
+
+    def _get_if_range(self):
+        # Weak ETags can't be used with If-Range, so Last-Modified is used instead
+        etag = self.meta.get("etag")
+        if etag and not etag.startswith("W/"):
+            return {"If-Range": etag}
+        if self.meta.get("last_modified"):
+            return {"If-Range": self.meta["last_modified"]}
+        return {}
+
+    def get_resume_headers(self):
+        """Headers asking only for the bytes that weren't downloaded yet.
+
+        `If-Range` makes the server send the whole file instead if it changed since the
+        previous attempt.
+        """
+        offset = self.offset
+        if not offset or self.content_length is None:
+            return {}
+        headers = {"Range": f"bytes={offset}-"}
+        headers.update(self._get_if_range())
+        return headers
+
+    def is_complete(self, status_code, headers):
+        """Whether a response means the file was already fully downloaded.
+
+        That's a 416 response to the range after the last byte of the `.part` file, whose
+        `Content-Range`, if any, has the same length as the file.
+        """
+        if status_code != 416 or self.offset != self.content_length:
+            return False
+        match = UNSATISFIED_RANGE_REGEX.fullmatch(headers.get("Content-Range", ""))
+        return match is None or int(match.group(1)) == self.content_length
+
+    def _is_same_file(self, headers, offset):
+        match = CONTENT_RANGE_REGEX.fullmatch(headers.get("Content-Range", ""))
+        if match is None or int(match.group(1)) != offset:
+            return False
+        if match.group(3) != str(self.content_length):
+            return False
+        etag = headers.get("ETag")
+        return not (etag and self.meta.get("etag") and etag != self.meta["etag"])
+
+    def start(self, status_code, headers):
+        """Prepare the `.part` file for the body of a response.
+
+        Parameters
+        ----------
+        status_code : int
+            Status code of the response.
+        headers : mapping
+            Headers of the response.
+
+        Returns
+        -------
+        int or None
+            Offset at which the body of the response must be written, or None if the server sent
+            part of a different file, in which case the download must be requested again from scratch.
+        """
+        if status_code == 206:
+            if self.meta is not None and self._is_same_file(headers, self.offset):
+                return self.offset
+            self.discard()
+            return None
+        content_length = headers.get("Content-Length")
+        self.meta = {
+            "url": self.url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_length": None if content_length is None else int(content_length),
+            "content_type": headers.get("Content-Type"),
+        }
+        self.save_path.mkdir(parents=True, exist_ok=True)
+        with self.part_path.open("wb") as file:
+            if self.content_length:
+                preallocate(file.fileno(), self.content_length)
+        self._save_meta()
+        return 0
+
+    def open(self):
+        return self.part_path.open("ab")
+
+    def start_segmented(self, count):
+        """Split the file in `count` segments and preallocate the `.part` file for them.
+
+        Must be called after `start`, once the length of the file is known.
+        """
+        size = -(-self.content_length // count)
+        self.meta["segments"] = [
+            [start, min(start + size, self.content_length) - 1, 0]
+            for start in range(0, self.content_length, size)
+        ]
+        with self.part_path.open("r+b") as file:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(file.fileno(), 0, self.content_length)
+            else:
+                file.truncate(self.content_length)
+        self._save_meta()
+
+    def get_pending_segments(self):
+        return [
+            segment
+            for segment in self.segments
+            if segment[0] + segment[2] <= segment[1]
+        ]
+
+    def get_segment_headers(self, segment):
+        start, end, downloaded = segment
+        headers = {"Range": f"bytes={start + downloaded}-{end}"}
+        headers.update(self._get_if_range())
+        return headers
+
+    def is_segment_response(self, segment, status_code, headers):
+        """Whether a response is the requested part of the same file, and not the whole file."""
+        return status_code == 206 and self._is_same_file(
+            headers, segment[0] + segment[2]
+        )
+
+    def open_segment(self, segment):
+        file = self.part_path.open("r+b")
+        file.seek(segment[0] + segment[2])
+        return file
+
+    def save_progress(self):
+        """Save how much of each segment was downloaded. Safe to call from several threads."""
+        with self._lock:
+            if self.meta is not None:
+                self._save_meta()
+
+    def format_filename(self, filename):
+        """`filename` with its `{ext}` field replaced by the extension of the file's Content-Type."""
+        return filename.format(
+            ext=get_download_file_extension(self.meta.get("content_type"))
+        )
+
+    def get_label(self, filename, label=None):
+        """Progress bar label of the download, with the size of the file."""
+        label = label or self.format_filename(filename)
+        return label + f" ({humanize_bytes(self.content_length)})"
+
+    def finish(self, filename):
+        """Move the downloaded file to its final path.
+
+        Parameters
+        ----------
+        filename : str
+            Filename template, with an `{ext}` field replaced by the extension of the file.
+
+        Returns
+        -------
+        pathlib.Path or None
+            The final path, or None if the file is still incomplete.
+        """
+        if self.content_length is not None and self.offset != self.content_length:
+            return None
+        file_path = self.save_path / self.format_filename(filename)
+        os.replace(self.part_path, file_path)
+        self.meta_path.unlink()
+        self.meta = None
+        return file_path
+
+    def discard(self):
+        for path in (self.part_path, self.meta_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self.meta = None
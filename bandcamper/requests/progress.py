@@ -0,0 +1,63 @@
+from threading import Lock
+from time import monotonic
+
+import click
+
+
+class ThrottledProgressBar:
+    """`click.progressbar` redrawn at most once every `interval` seconds.
+
+    Redrawing the bar for every chunk costs more than receiving the chunk on fast
+    connections, so updates are accumulated and applied together. It can be updated
+    from several threads at once.
+
+    Parameters
+    ----------
+    length : int
+        Total number of bytes.
+    label : str
+        Label of the bar.
+    offset : int
+        Bytes already downloaded when the bar is created.
+    enabled : bool
+        Whether to show the bar at all. When False, updates are ignored.
+    interval : float
+        Minimum number of seconds between redraws.
+    """
+
+    def __init__(self, length, label, offset=0, enabled=True, interval=0.2):
+        self.interval = interval
+        self._bar = click.progressbar(length=length, label=label) if enabled else None
+        self._offset = offset
+        self._pending = 0
+        self._last_update = 0
+        self._lock = Lock()
+
+    def __enter__(self):
+        if self._bar is not None:
+            self._bar.__enter__()
+            self._bar.update(self._offset)
+            self._last_update = monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._bar is not None:
+            self.flush()
+            self._bar.__exit__(*exc_info)
+
+    def update(self, length):
+        if self._bar is None:
+            return
+        with self._lock:
+            self._pending += length
+            now = monotonic()
+            if now - self._last_update >= self.interval:
+                self._bar.update(self._pending)
+                self._pending = 0
+                self._last_update = now
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._bar.update(self._pending)
+                self._pending = 0
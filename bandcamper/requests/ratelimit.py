@@ -0,0 +1,243 @@
+"""Adaptive rate limits of the requests made to each host.
+
+Requests to each group of hosts (the same groups as the connection limits of `Requester`) go
+through a token bucket. Buckets start without any limit, or at the maximum rate if one is given.
+When a host answers 429 Too Many Requests or 503 Service Unavailable, its rate is cut to
+`decrease` times the rate requests were being sent at, and every successful request raises it
+again, by about `increase` requests per second for every second of requests (additive increase,
+multiplicative decrease, like TCP congestion control). That keeps the requests close to the
+highest rate the host allows. A ``Retry-After`` header also pauses every request to the host
+until it's over.
+"""
+import time
+from collections import deque
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+from bandcamper.requests.utils import get_host_key
+
+# Statuses of responses asking to slow down, which are retried
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Seconds to wait according to a ``Retry-After`` header.
+
+    Parameters
+    ----------
+    value : str or None
+        The header, either a number of seconds or an HTTP date.
+
+    Returns
+    -------
+    float or None
+        Seconds to wait, or None if `value` is missing or invalid.
+
+    Examples
+    --------
+    >>> parse_retry_after("120")
+    120.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT")
+    0.0
+    >>> parse_retry_after("soon") is None
+    True
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """Token bucket of a single host, with a rate adapted to its throttling.
+
+    Parameters
+    ----------
+    max_rate : float, optional
+        Maximum requests per second. Without it, requests aren't limited until the host
+        throttles them.
+    min_rate : float
+        The rate is never cut below this many requests per second.
+    increase : float
+        Requests per second added to the rate for each second of successful requests.
+    decrease : float
+        Fraction of the sending rate kept when the host throttles a request.
+    burst : int
+        Requests that can be sent at once after the bucket was idle.
+    """
+
+    # Seconds over which the rate requests are sent at is measured
+    WINDOW = 5.0
+
+    def __init__(
+        self, max_rate=None, min_rate=1.0, increase=0.5, decrease=0.5, burst=1
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.rate = max_rate
+        self.tokens = burst
+        self.created = self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.backoffs = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._sent = deque()
+
+    def reserve(self, now):
+        """Take a token for a request.
+
+        Returns
+        -------
+        float
+            Seconds to wait before sending the request.
+        """
+        start = max(now, self.paused_until)
+        if self.rate is not None:
+            if start > self.updated:
+                refill = (start - self.updated) * self.rate
+                self.tokens = min(self.tokens + refill, self.burst)
+                self.updated = start
+            self.tokens -= 1
+            if self.tokens < 0:
+                start = max(start, self.updated - self.tokens / self.rate)
+        self._sent.append(start)
+        while self._sent[0] < now - self.WINDOW:
+            self._sent.popleft()
+        self.waited += start - now
+        return start - now
+
+    def get_sending_rate(self, now):
+        """Requests per second sent during the last `WINDOW` seconds."""
+        sent = sum(1 for sent_at in self._sent if now - self.WINDOW <= sent_at <= now)
+        return sent / min(max(now - self.created, 1.0), self.WINDOW)
+
+    def on_success(self):
+        if self.rate is None:
+            return
+        # Adding increase / rate for every request adds `increase` every second
+        self.rate += self.increase / self.rate
+        if self.max_rate is not None:
+            self.rate = min(self.rate, self.max_rate)
+
+    def on_throttle(self, now, sent_at, retry_after=None):
+        """Slow down after a request sent at `sent_at` was throttled.
+
+        The rate is only cut once for all the requests sent before the previous cut, as they
+        were sent too fast already, and their responses arrive all at once.
+        """
+        self.throttled += 1
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        if sent_at < self.last_decrease:
+            return
+        sending_rate = self.get_sending_rate(now)
+        if self.rate is not None:
+            sending_rate = min(sending_rate, self.rate)
+        self.rate = max(sending_rate * self.decrease, self.min_rate)
+        self.tokens = min(self.tokens, 0)
+        self.last_decrease = now
+        self.backoffs += 1
+
+
+class RateLimiter:
+    """Adaptive rate limits of the requests to each host, shared by every worker.
+
+    Parameters
+    ----------
+    hosts : iterable of str
+        Domains that group all of their subdomains under the same limit, as in `get_host_key`.
+    **bucket_kwargs
+        Arguments of the `TokenBucket` of each host.
+    """
+
+    def __init__(self, hosts=(), **bucket_kwargs):
+        self.hosts = list(hosts)
+        self.bucket_kwargs = bucket_kwargs
+        self._buckets = {}
+        self._lock = Lock()
+
+    def _get_bucket(self, url):
+        host = get_host_key(url, self.hosts)
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(**self.bucket_kwargs)
+        return self._buckets[host]
+
+    def reserve(self, url):
+        """Take a token for a request to `url`.
+
+        Returns
+        -------
+        float
+            Seconds to wait before sending the request.
+        """
+        with self._lock:
+            return self._get_bucket(url).reserve(time.monotonic())
+
+    def wait(self, url):
+        """Block until a request to `url` can be sent."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self, url):
+        with self._lock:
+            self._get_bucket(url).on_success()
+
+    def on_throttle(self, url, sent_at, retry_after=None):
+        """Slow down requests to the host of `url`, which throttled one sent at `sent_at`.
+
+        Parameters
+        ----------
+        url : str
+            URL of the throttled request.
+        sent_at : float
+            When the request was sent, from `time.monotonic`.
+        retry_after : str, optional
+            ``Retry-After`` header of the response.
+
+        Returns
+        -------
+        float
+            Seconds the host asked to wait, 0 without a valid ``Retry-After``.
+        """
+        seconds = parse_retry_after(retry_after)
+        with self._lock:
+            self._get_bucket(url).on_throttle(time.monotonic(), sent_at, seconds)
+        return seconds or 0.0
+
+    def get_stats(self):
+        """Current rate limit of each host, and how often it was throttled.
+
+        Returns
+        -------
+        dict
+            Mapping of each host to its ``rate`` (requests per second, None if unlimited),
+            ``throttled`` (throttled responses), ``backoffs`` (times the rate was cut) and
+            ``waited`` (total seconds that requests waited for the limit).
+        """
+        with self._lock:
+            return {
+                host: {
+                    "rate": bucket.rate,
+                    "throttled": bucket.throttled,
+                    "backoffs": bucket.backoffs,
+                    "waited": bucket.waited,
+                }
+                for host, bucket in self._buckets.items()
+            }
@@ -1,27 +1,179 @@
-from pathlib import Path
+import codecs
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.client import HTTPException
+from http.client import HTTPResponse
+from threading import BoundedSemaphore
+from threading import Event
+from threading import Lock
+from urllib.parse import urlparse
 
-import click
+import urllib3
+from requests import ConnectionError
 from requests import Session
+from requests import Timeout
+from requests.exceptions import ChunkedEncodingError
 
+from bandcamper.requests.adapters import make_retry
+from bandcamper.requests.adapters import PoolStatsAdapter
+from bandcamper.requests.partial import PartialDownload
+from bandcamper.requests.progress import ThrottledProgressBar
+from bandcamper.requests.ratelimit import RateLimiter
+from bandcamper.requests.ratelimit import THROTTLE_STATUSES
 from bandcamper.requests.utils import get_default_user_agent
-from bandcamper.requests.utils import get_download_file_extension
-from bandcamper.requests.utils import humanize_bytes
+from bandcamper.requests.utils import get_host_key
+from bandcamper.requests.watchdog import SpeedWatchdog
 
 
 class Requester:
-    def __init__(self, user_agent=None, http_proxy=None, https_proxy=None):
+    # Maximum number of simultaneous connections for each group of hosts. Bandcamp pages
+    # are served from *.bandcamp.com, while downloads come from the *.bcbits.com CDN.
+    DEFAULT_HOST_LIMITS = {
+        "bandcamp.com": 4,
+        "bcbits.com": 4,
+    }
+    # Bytes written by a segment between saves of the download progress
+    SEGMENT_SAVE_INTERVAL = 4 * 1024 * 1024
+    # Downloads are read in chunks starting at MIN_CHUNK_SIZE, doubled every time a read fills
+    # the whole chunk, up to MAX_CHUNK_SIZE
+    MIN_CHUNK_SIZE = 64 * 1024
+    MAX_CHUNK_SIZE = 1024 * 1024
+    # Pages read with `until` are streamed in chunks of this size
+    PAGE_CHUNK_SIZE = 16 * 1024
+    # Throttled requests asked to wait longer than this many seconds aren't retried
+    MAX_RETRY_AFTER = 300
+    # Hosts whose connections are kept alive at the same time. Each artist subdomain and
+    # custom domain is a host of its own.
+    MAX_POOLS = 32
+
+    def __init__(
+        self,
+        user_agent=None,
+        http_proxy=None,
+        https_proxy=None,
+        host_limits=None,
+        default_host_limit=4,
+        cache=None,
+        download_retries=3,
+        segments=1,
+        segment_threshold=64 * 1024 * 1024,
+        cassette=None,
+        max_rate=None,
+        throttle_retries=5,
+        retries=3,
+        retry_backoff=0.5,
+        pool_size=None,
+        connect_timeout=10,
+        read_timeout=60,
+        min_speed=1024,
+        stall_time=30,
+    ):
         self.session = Session()
+        self.cassette = cassette
         self.session.headers["User-Agent"] = user_agent or get_default_user_agent()
         self.session.proxies = {
             "http": http_proxy,
             "https": https_proxy,
         }
+        self.host_limits = dict(self.DEFAULT_HOST_LIMITS)
+        self.host_limits.update(host_limits or {})
+        self.default_host_limit = default_host_limit
+        self._host_semaphores = {
+            host: BoundedSemaphore(limit) for host, limit in self.host_limits.items()
+        }
+        self._host_semaphores_lock = Lock()
+        # Idle connections are kept for as many requests as can be sent at once to a host
+        self.pool_size = pool_size or max(
+            [default_host_limit or 0, *self.host_limits.values()]
+        )
+        adapter_kwargs = dict(
+            pool_connections=self.MAX_POOLS,
+            pool_maxsize=self.pool_size,
+            max_retries=make_retry(retries, retry_backoff),
+        )
+        if cassette is not None:
+            self.adapter = cassette.get_adapter(**adapter_kwargs)
+        else:
+            self.adapter = PoolStatsAdapter(**adapter_kwargs)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.cache = cache
+        self.download_retries = download_retries
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.rate_limiter = RateLimiter(self.host_limits, max_rate=max_rate)
+        self.throttle_retries = throttle_retries
+        self.timeout = (connect_timeout, read_timeout)
+        self.min_speed = min_speed
+        self.stall_time = stall_time
+
+    def _get_host_semaphore(self, url):
+        host = get_host_key(url, self.host_limits)
+        if host not in self.host_limits and not self.default_host_limit:
+            return None
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = BoundedSemaphore(self.default_host_limit)
+            return self._host_semaphores[host]
+
+    @contextmanager
+    def host_slot(self, url):
+        """Wait until a new connection to the host of `url` is allowed by the host limits."""
+        semaphore = self._get_host_semaphore(url)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    @property
+    def proxies(self):
+        return self.session.proxies
+
+    def get_pool_stats(self):
+        """Connections opened and reused, as returned by `PoolStatsAdapter.get_pool_stats`."""
+        return self.adapter.get_pool_stats()
 
     def close(self):
         self.session.close()
+        if self.cassette is not None:
+            self.cassette.close()
+
+    def send(self, method, url, **kwargs):
+        """Send a request once `rate_limiter` allows it, retrying it while it's throttled.
+
+        Responses with a status of `THROTTLE_STATUSES` slow down the host, and the request is
+        retried after their ``Retry-After`` up to `throttle_retries` times. The last response
+        is returned, whatever its status.
+
+        Requests time out after `timeout`, unless they're given one of their own.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        retries = 0
+        while True:
+            self.rate_limiter.wait(url)
+            sent_at = time.monotonic()
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in THROTTLE_STATUSES:
+                self.rate_limiter.on_success(url)
+                return response
+            retry_after = self.rate_limiter.on_throttle(
+                url, sent_at, response.headers.get("Retry-After")
+            )
+            if retries >= self.throttle_retries or retry_after > self.MAX_RETRY_AFTER:
+                return response
+            response.close()
+            retries += 1
 
     def _request_or_error(self, method, url, **kwargs):
-        response = self.session.request(method, url, **kwargs)
+        with self.host_slot(url):
+            response = self.send(method, url, **kwargs)
         response.raise_for_status()
         return response
 
@@ -31,26 +183,291 @@ class Requester:
     def post_request_or_error(self, url, **kwargs):
         return self._request_or_error("POST", url, **kwargs)
 
-    def download_to_file(self, url, save_path, filename, label=None):
-        with self.session.get(url, stream=True) as response:
+    @classmethod
+    def _read_until(cls, response, until):
+        encoding = response.encoding or "utf8"
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        body = bytearray()
+        text = ""
+        for chunk in response.iter_content(cls.PAGE_CHUNK_SIZE):
+            body += chunk
+            text += decoder.decode(chunk)
+            if until is not None and until(text):
+                break
+        return bytes(body)
+
+    def get_page_or_error(self, url, until, **kwargs):
+        """GET the page at `url`, reading its body only until `until` is satisfied.
+
+        `until` is called with the text read so far after every chunk. As soon as it returns
+        a truthy value, the connection is closed without downloading the rest of the page.
+
+        Returns
+        -------
+        requests.Response
+            The response, with the part of the body that was read as its content.
+        """
+        with self.host_slot(url):
+            response = self.send("GET", url, stream=True, **kwargs)
+            try:
+                # Error pages are read whole
+                response._content = self._read_until(
+                    response, until if response.status_code == 200 else None
+                )
+                response._content_consumed = True
+            finally:
+                response.close()
+        response.raise_for_status()
+        return response
+
+    def _get_or_error(self, url, until, **kwargs):
+        if until is None:
+            return self.get_request_or_error(url, **kwargs)
+        return self.get_page_or_error(url, until, **kwargs)
+
+    def get_cached_request_or_error(self, url, until=None, **kwargs):
+        """Same as `get_request_or_error`, but going through `cache` if there's one.
+
+        Fresh cached responses are returned without any request, and expired ones are
+        revalidated with a conditional request. Only meant for HTML and JSON pages.
+        With `until`, the page is read like with `get_page_or_error`, and only the part
+        that was read is cached.
+        """
+        if self.cache is None:
+            return self._get_or_error(url, until, **kwargs)
+        entry = self.cache.get(url)
+        if entry is not None and entry.is_fresh(self.cache.ttl):
+            return entry.to_response()
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry is not None:
+            headers.update(entry.get_validators())
+        response = self._get_or_error(url, until, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            return self.cache.refresh(entry, response.headers).to_response()
+        if self.cache.is_cacheable(response):
+            self.cache.store(url, response.headers, response.content)
+        return response
+
+    def _can_segment(self, partial, headers):
+        return (
+            self.segments > 1
+            and partial.content_length is not None
+            and partial.content_length >= self.segment_threshold
+            and headers.get("Accept-Ranges", "").lower() == "bytes"
+        )
+
+    def _iter_body(self, response):
+        """Read the body of a streamed download into a reused buffer.
+
+        Raises
+        ------
+        StallError
+            If the download is slower than `min_speed` for `stall_time` seconds.
+
+        Yields
+        ------
+        memoryview
+            Each chunk of the body. It's only valid until the next one is read.
+        """
+        reader = response.raw
+        fp = getattr(reader, "_fp", None)
+        if "Content-Encoding" not in response.headers and isinstance(fp, HTTPResponse):
+            # Reading from http.client directly skips a copy of every chunk in urllib3.
+            # The length of the body is checked by PartialDownload.finish instead.
+            # Other raw responses, like recorded ones, are read through their public API.
+            reader = fp
+        buffer = memoryview(bytearray(self.MAX_CHUNK_SIZE))
+        chunk_size = self.MIN_CHUNK_SIZE
+        watchdog = SpeedWatchdog(response.url, self.min_speed, self.stall_time)
+        while True:
+            try:
+                read = reader.readinto(buffer[:chunk_size])
+            except (HTTPException, OSError, urllib3.exceptions.HTTPError) as exc:
+                raise ChunkedEncodingError(exc) from exc
+            if not read:
+                return
+            watchdog.update(read)
+            yield buffer[:read]
+            if read == chunk_size:
+                chunk_size = min(chunk_size * 2, self.MAX_CHUNK_SIZE)
+
+    def _download_attempt(self, partial, filename, label, progress, segmented):
+        headers = {"Accept-Encoding": "identity"}
+        headers.update(partial.get_resume_headers())
+        with self.host_slot(partial.url), self.send(
+            "GET", partial.url, headers=headers, stream=True
+        ) as response:
+            if partial.is_complete(response.status_code, response.headers):
+                return partial.finish(filename)
+            if response.status_code == 416 and "Range" in headers:
+                # The `.part` file doesn't match the file on the server anymore
+                partial.discard()
+                return None
+            response.raise_for_status()
+            offset = partial.start(response.status_code, response.headers)
+            if offset is None:
+                return None
+            if (
+                segmented
+                and not offset
+                and self._can_segment(partial, response.headers)
+            ):
+                # The response is dropped and the segments are requested instead
+                partial.start_segmented(self.segments)
+                return None
+            with partial.open() as file, ThrottledProgressBar(
+                partial.content_length,
+                partial.get_label(filename, label),
+                offset,
+                progress,
+            ) as bar:
+                for chunk in self._iter_body(response):
+                    file.write(chunk)
+                    bar.update(len(chunk))
+        file_path = partial.finish(filename)
+        if file_path is None:
+            raise ChunkedEncodingError(f"Incomplete download from {partial.url}")
+        return file_path
+
+    def _download_segment(self, partial, segment, bar, stop):
+        with self.host_slot(partial.url), self.send(
+            "GET",
+            partial.url,
+            headers={
+                "Accept-Encoding": "identity",
+                **partial.get_segment_headers(segment),
+            },
+            stream=True,
+        ) as response:
+            # The file on the server is shorter than the `.part` file
+            if response.status_code == 416:
+                return False
             response.raise_for_status()
-            file_ext = get_download_file_extension(response.headers.get("Content-Type"))
-            file_path = Path(save_path)
-            file_path.mkdir(parents=True, exist_ok=True)
-            file_path /= filename.format(ext=file_ext)
-            content_length = int(response.headers.get("Content-Length"))
-            label = label or file_path.name
-            label += f" ({humanize_bytes(content_length)})"
-            with file_path.open("wb") as file:
-                with click.progressbar(
-                    response.iter_content(chunk_size=1024),
-                    length=content_length // 1024,
-                    label=label,
-                ) as bar:
-                    for chunk in bar:
+            if not partial.is_segment_response(
+                segment, response.status_code, response.headers
+            ):
+                return False
+            unsaved = 0
+            with partial.open_segment(segment) as file:
+                try:
+                    for chunk in self._iter_body(response):
+                        if stop.is_set():
+                            break
+                        chunk = chunk[: segment[1] + 1 - segment[0] - segment[2]]
                         file.write(chunk)
+                        segment[2] += len(chunk)
+                        bar.update(len(chunk))
+                        unsaved += len(chunk)
+                        if unsaved >= self.SEGMENT_SAVE_INTERVAL:
+                            file.flush()
+                            partial.save_progress()
+                            unsaved = 0
+                finally:
+                    file.flush()
+                    partial.save_progress()
+        return True
+
+    def _download_segments(self, partial, filename, label, progress):
+        """Download the pending segments of `partial` in parallel.
+
+        Returns
+        -------
+        pathlib.Path or None
+            Path of the downloaded file, or None if the server didn't honour the ranges,
+            in which case the `.part` file is discarded.
+        """
+        pending = partial.get_pending_segments()
+        stop = Event()
+        with ThrottledProgressBar(
+            partial.content_length,
+            partial.get_label(filename, label),
+            partial.offset,
+            progress,
+        ) as bar, ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            futures = [
+                executor.submit(self._download_segment, partial, segment, bar, stop)
+                for segment in pending
+            ]
+            try:
+                honoured = all(future.result() for future in futures)
+            finally:
+                stop.set()
+        if not honoured:
+            partial.discard()
+            return None
+        file_path = partial.finish(filename)
+        if file_path is None:
+            raise ChunkedEncodingError(f"Incomplete download from {partial.url}")
         return file_path
 
+    def download_to_file(self, url, save_path, filename, label=None, progress=True):
+        """Download `url` into the `save_path` directory.
+
+        The file is written to a `.part` file first, which is resumed if it's left over from
+        a previous attempt. If the connection drops, times out or stalls, the download is
+        resumed up to `download_retries` times before giving up.
+
+        Files of at least `segment_threshold` bytes are split in `segments` parts downloaded
+        in parallel, if the server supports range requests. Otherwise, they're downloaded
+        in a single stream.
+
+        Returns
+        -------
+        pathlib.Path
+            Path of the downloaded file, named after `filename` formatted with its extension.
+        """
+        partial = PartialDownload(url, save_path)
+        segmented = True
+        retries = 0
+        while True:
+            try:
+                if partial.segments:
+                    file_path = self._download_segments(
+                        partial, filename, label, progress
+                    )
+                    # The server doesn't honour ranges, so the file is downloaded in one go
+                    segmented = file_path is not None
+                else:
+                    file_path = self._download_attempt(
+                        partial, filename, label, progress, segmented
+                    )
+            except (ConnectionError, ChunkedEncodingError, Timeout):
+                if retries >= self.download_retries:
+                    raise
+                retries += 1
+                continue
+            # None means the download must be requested again, from scratch or in segments
+            if file_path is not None:
+                return file_path
+
+    def get_ips_from_url(self, url):
+        """IP addresses that the host of `url` resolves to, without connecting to it.
+
+        When a proxy is set for the scheme of `url`, the host is resolved by connecting
+        to it through the proxy instead, as it may not be resolvable locally.
+
+        Raises
+        ------
+        requests.ConnectionError
+            If the host can't be resolved.
+        """
+        hostname = urlparse(url).hostname
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return self.cassette.get_dns(hostname)
+        if self.cassette is None and self.proxies.get(urlparse(url).scheme):
+            return {self.get_ip_from_url(url)}
+        try:
+            addresses = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+        except (socket.gaierror, UnicodeError) as exc:
+            raise ConnectionError(f"Failed to resolve {hostname}: {exc}") from exc
+        ips = {address[4][0] for address in addresses}
+        if self.cassette is not None:
+            self.cassette.record_dns(hostname, ips)
+        return ips
+
     def get_ip_from_url(self, url):
+        if self.cassette is not None:
+            # Recorded responses have no connection to get the address from
+            return min(self.get_ips_from_url(url))
         response = self.get_request_or_error(url, stream=True)
         return response.raw._connection.sock.getpeername()[0]
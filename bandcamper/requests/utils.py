@@ -9,6 +9,7 @@ MIME_TYPES : dict
 """
 from mimetypes import guess_extension
 from random import choice as random_choice
+from urllib.parse import urlparse
 
 from bandcamper import __title__
 from bandcamper import __version__
@@ -226,3 +227,32 @@ def humanize_bytes(num):
             return f"{num:3.1f}" + unit + "B"
         num /= 1024.0
     return f"{num:.1f}YiB"
+
+
+def get_host_key(url, hosts):
+    """Group of hosts that `url` belongs to.
+
+    Parameters
+    ----------
+    url : str
+        URL to get the host from.
+    hosts : iterable of str
+        Domains that group all of their subdomains, like `"bandcamp.com"`.
+
+    Returns
+    -------
+    str
+        The first domain of `hosts` that matches the host of `url`, or the hostname of `url` itself.
+
+    Examples
+    --------
+    >>> get_host_key("https://artist.bandcamp.com/music", ["bandcamp.com", "bcbits.com"])
+    'bandcamp.com'
+    >>> get_host_key("https://music.example.com/album/x", ["bandcamp.com", "bcbits.com"])
+    'music.example.com'
+    """
+    hostname = (urlparse(url).hostname or "").lower()
+    for host in hosts:
+        if hostname == host or hostname.endswith("." + host):
+            return host
+    return hostname
@@ -0,0 +1,57 @@
+"""Detection of downloads that stalled without their connection being closed.
+
+A read timeout only fails a transfer that stopped completely. A connection trickling a few
+bytes every now and then never times out, so `SpeedWatchdog` also fails transfers that stay
+below a minimum speed for a while. Both are raised as errors that `download_to_file` retries,
+resuming the download from where it stalled.
+"""
+import time
+
+from requests.exceptions import Timeout
+
+
+class StallError(Timeout):
+    """A transfer was slower than the minimum speed for too long."""
+
+
+class SpeedWatchdog:
+    """Speed check of a single transfer, over consecutive periods of `period` seconds.
+
+    Parameters
+    ----------
+    url : str
+        URL of the transfer, for the error message.
+    min_speed : float
+        Minimum bytes per second. 0 disables the check.
+    period : float
+        Seconds over which the speed is measured.
+    """
+
+    def __init__(self, url, min_speed, period):
+        self.url = url
+        self.min_speed = min_speed
+        self.period = period
+        self._period_start = time.monotonic()
+        self._period_bytes = 0
+
+    def update(self, size):
+        """Count `size` bytes received.
+
+        Raises
+        ------
+        StallError
+            If the speed of the last period was below `min_speed`.
+        """
+        if not self.min_speed:
+            return
+        self._period_bytes += size
+        elapsed = time.monotonic() - self._period_start
+        if elapsed < self.period:
+            return
+        speed = self._period_bytes / elapsed
+        if speed < self.min_speed:
+            raise StallError(
+                f"Download from {self.url} stalled at {speed:.0f} B/s for {elapsed:.0f} s"
+            )
+        self._period_start += elapsed
+        self._period_bytes = 0
@@ -0,0 +1,120 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+
+def run_ordered(func, items, jobs=1, screamer=None):
+    """Call `func` on every item of `items` using up to `jobs` worker threads.
+
+    Results are yielded in the same order as `items`, no matter the order in which
+    the calls finish. When a `screamer` is given, the messages screamed by each call
+    are captured and replayed right before its result is yielded, so the output is
+    the same as if the calls were made one after another.
+
+    Parameters
+    ----------
+    func : callable
+        Function called with a single item.
+    items : iterable
+        Items to call `func` on. The iterable is consumed lazily.
+    jobs : int
+        Maximum number of concurrent calls. With `1` (the default), the calls are made
+        on the current thread.
+    screamer : bandcamper.screamo.Screamer, optional
+        Screamer whose output must be kept deterministic.
+
+    Yields
+    ------
+    object
+        The result of each call. An exception raised by a call is re-raised when its
+        turn comes, after which the calls not yet started are cancelled.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    def call(item):
+        if screamer is None:
+            return func(item), []
+        with screamer.capture() as messages:
+            try:
+                return func(item), messages
+            except Exception as exc:
+                exc.captured_messages = messages
+                raise
+
+    def next_result(future):
+        try:
+            result, messages = future.result()
+        except Exception as exc:
+            if screamer is not None:
+                screamer.replay(getattr(exc, "captured_messages", []))
+            raise
+        if screamer is not None:
+            screamer.replay(messages)
+        return result
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(copy_context().run, call, item))
+                if len(pending) >= 2 * jobs:
+                    yield next_result(pending.popleft())
+            while pending:
+                yield next_result(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def run_ordered_async(func, items, jobs=1, screamer=None):
+    """asyncio version of `run_ordered`, where `func` is a coroutine function.
+
+    Up to `jobs` calls of `func` run at the same time, and at most `2 * jobs` tasks are kept
+    around waiting for their turn, so memory usage is bounded no matter how many items there are.
+
+    Yields
+    ------
+    object
+        The result of each call, in the same order as `items`.
+    """
+
+    jobs = max(jobs, 1)
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def call(item):
+        async with semaphore:
+            if screamer is None:
+                return await func(item), []
+            with screamer.capture() as messages:
+                try:
+                    return await func(item), messages
+                except Exception as exc:
+                    exc.captured_messages = messages
+                    raise
+
+    async def next_result(task):
+        try:
+            result, messages = await task
+        except Exception as exc:
+            if screamer is not None:
+                screamer.replay(getattr(exc, "captured_messages", []))
+            raise
+        if screamer is not None:
+            screamer.replay(messages)
+        return result
+
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(call(item)))
+            if len(pending) >= 2 * jobs:
+                yield await next_result(pending.popleft())
+        while pending:
+            yield await next_result(pending.popleft())
+    finally:
+        for task in pending:
+            task.cancel()
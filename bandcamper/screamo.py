@@ -1,11 +1,14 @@
 from collections import namedtuple
 from contextlib import contextmanager
+from contextvars import ContextVar
 from math import ceil
 
 import click
 
 WarnType = namedtuple("WarnType", ["symbol", "attrs"])
 
+_captured_messages = ContextVar("captured_messages", default=None)
+
 
 class Screamer:
     ERROR = WarnType(("Error:", "[!]"), {"fg": "red", "bold": True})
@@ -23,9 +26,40 @@ class Screamer:
         text = self.style(text, **kwargs)
         return symbol + text
 
+    def echo(self, message):
+        messages = _captured_messages.get()
+        if messages is None:
+            click.echo(message)
+        else:
+            messages.append(message)
+
+    @contextmanager
+    def capture(self):
+        """Collect the messages screamed in the current context instead of printing them.
+
+        Yields
+        ------
+        list of str
+            The captured messages, which can later be printed with `replay`.
+        """
+        messages = []
+        token = _captured_messages.set(messages)
+        try:
+            yield messages
+        finally:
+            _captured_messages.reset(token)
+
+    @property
+    def capturing(self):
+        return _captured_messages.get() is not None
+
+    def replay(self, messages):
+        for message in messages:
+            self.echo(message)
+
     def scream(self, text, warn_type, verbose, short_symbol, **kwargs):
         if self.verbosity >= verbose:
-            click.echo(self.get_message(text, warn_type, short_symbol, **kwargs))
+            self.echo(self.get_message(text, warn_type, short_symbol, **kwargs))
 
     def style(self, text, **kwargs):
         if kwargs and self.colored:
@@ -64,9 +98,9 @@ class Screamer:
             success_message = self.get_message(
                 success_text, self.SUCCESS, success_short_symbol
             )
-            click.echo("\033[A\033[A" * ceil(len(text) / terminal_width))
+            self.echo("\033[A\033[A" * ceil(len(text) / terminal_width))
             success_message += " " * (len(text) % terminal_width - len(success_message))
-            click.echo(success_message)
+            self.echo(success_message)
 
     def info(self, text, verbose=False, short_symbol=True):
         self.scream(text, self.INFO, verbose, short_symbol)
@@ -1,11 +1,74 @@
+import ctypes.util
+import sys
 from string import Formatter
 from uuid import uuid4
 
+# fallocate(2) flags, from linux/falloc.h
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+_fallocate = None
+
 
 def get_random_filename_template():
     return uuid4().hex[:16] + "{ext}"
 
 
+def _get_fallocate():
+    global _fallocate
+    if _fallocate is None:
+        _fallocate = False
+        libc_name = ctypes.util.find_library("c")
+        if sys.platform.startswith("linux") and libc_name:
+            try:
+                fallocate = ctypes.CDLL(libc_name, use_errno=True).fallocate
+            except (OSError, AttributeError):
+                return _fallocate
+            fallocate.argtypes = [
+                ctypes.c_int,
+                ctypes.c_int,
+                ctypes.c_longlong,
+                ctypes.c_longlong,
+            ]
+            _fallocate = fallocate
+    return _fallocate
+
+
+def preallocate(fd, length):
+    """Reserve disk space for `length` bytes of a file, without changing its size.
+
+    Reserving the whole file upfront avoids fragmentation and fails early if the disk is
+    full. This is done with `fallocate(2)` on Linux, and silently skipped elsewhere.
+
+    Returns
+    -------
+    bool
+        Whether the space was reserved.
+    """
+    fallocate = _get_fallocate()
+    if not fallocate or length <= 0:
+        return False
+    return fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, length) == 0
+
+
+def punch_hole(fd, offset, length):
+    """Free the disk space used by part of a file, without changing its size.
+
+    The region reads back as zeros afterwards. This is done with `fallocate(2)` on Linux,
+    and silently skipped on other platforms or file systems that don't support it.
+
+    Returns
+    -------
+    bool
+        Whether the space was freed.
+    """
+    fallocate = _get_fallocate()
+    if not fallocate or length <= 0:
+        return False
+    flags = FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE
+    return fallocate(fd, flags, offset, length) == 0
+
+
 class FilenameFormatter(Formatter):
     """
     Custom formatter for modifying user-defined output.
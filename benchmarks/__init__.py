@@ -0,0 +1,6 @@
+"""Benchmarks of bandcamper.
+
+`python -m benchmarks` runs the offline suite and compares it against the `baseline.json` saved
+by its first run on the machine. The `bench_*.py` scripts measure a single change in more detail,
+and run on their own.
+"""
@@ -0,0 +1,311 @@
+"""Offline benchmark suite of bandcamper's parsing and file pipeline.
+
+Every stage runs on the recorded pages of `benchmarks/fixtures` or on synthetic audio files,
+without any network access:
+
+- artist: release URLs of an artist page, as `_get_urls_from_artist` parses them;
+- music_data: data of album and track pages, as `_get_music_data` parses them;
+- downloadable: downloads of a free download page, as `_free_download` parses them;
+- output_path: output paths of tracks, through `FilenameFormatter` and `_sanitize_file_path`;
+- track_context: `get_track_output_context` of tagged MP3, FLAC and WAV files;
+- extract_zip: `Bandcamper.extract_zip` of a release zip with stored WAV tracks.
+
+Each stage is repeated for at least `--min-time` seconds, and its best run is reported as a
+throughput. The throughputs are compared against a baseline, `benchmarks/baseline.json` by
+default, and the command fails if any stage is slower than its baseline by more than
+`--tolerance`. Baselines only make sense on the machine they were saved on, so they aren't
+committed: the first run saves its results as the baseline, and `--save-baseline` replaces it,
+before changing anything.
+
+Fixtures can be replaced by pages recorded from Bandcamp, with the same names, in a directory
+given with `--fixtures`.
+
+Usage: python -m benchmarks [--stages NAME...] [--min-time SECONDS] [--tolerance FRACTION]
+                            [--baseline PATH] [--save-baseline] [--fixtures DIR]
+"""
+import argparse
+import gzip
+import json
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3
+from mutagen.id3 import TIT2
+from mutagen.id3 import TRCK
+from mutagen.wave import WAVE
+
+from bandcamper import Bandcamper
+from bandcamper.metadata.utils import get_track_output_context
+from bandcamper.screamo import Screamer
+from benchmarks.bench_extract import make_zip
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+OUTPUT = "{artist}/{album}/{track_num:02d} - {track}.{ext}"
+ARTIST_URL = "https://artist.bandcamp.com/music"
+CONTEXT = {"artist": "Artist: The Band", "album": "Album / Live?", "year": "2021"}
+TRACKS = 12
+ZIP_SIZE = 64 * 1024 * 1024
+
+
+class Stage:
+    """A benchmarked step of the pipeline.
+
+    Parameters
+    ----------
+    run : callable
+        Runs the step once.
+    units : int or float
+        Units processed by each run, like pages or bytes.
+    unit : str
+        Name of the throughput unit.
+    prepare : callable, optional
+        Called before each run, outside of the measured time.
+    """
+
+    def __init__(self, run, units, unit, prepare=None):
+        self.run = run
+        self.units = units
+        self.unit = unit
+        self.prepare = prepare
+
+    def _time_runs(self, count):
+        duration = 0
+        for _ in range(count):
+            if self.prepare is not None:
+                self.prepare()
+            start = time.perf_counter()
+            self.run()
+            duration += time.perf_counter() - start
+        return duration
+
+    def measure(self, min_time, min_runs=3, sample_time=0.05):
+        """Best throughput of the runs made in `min_time` seconds.
+
+        Fast steps are timed in batches of at least `sample_time` seconds, so each sample is
+        long enough not to be dominated by timer resolution and scheduling noise.
+        """
+        batch = 1
+        while self._time_runs(batch) < sample_time:
+            batch *= 2
+        durations = []
+        start = time.perf_counter()
+        while len(durations) < min_runs or time.perf_counter() - start < min_time:
+            durations.append(self._time_runs(batch) / batch)
+        return self.units / min(durations)
+
+
+def read_fixture(fixtures_dir, name):
+    path = fixtures_dir / name
+    if not path.exists():
+        path = fixtures_dir / f"{name}.gz"
+        return gzip.decompress(path.read_bytes())
+    return path.read_bytes()
+
+
+def write_flac(path, track):
+    # STREAMINFO of 10 s of 16-bit stereo audio at 44.1 kHz, without any audio frames
+    stream_info = struct.pack(">HH", 4096, 4096) + bytes(6)
+    stream_info += ((44100 << 44) | (1 << 41) | (15 << 36) | 441000).to_bytes(8, "big")
+    path.write_bytes(b"fLaC" + bytes([0x80, 0, 0, 34]) + stream_info + bytes(16))
+    flac = FLAC(path)
+    flac["title"] = f"Song {track}"
+    flac["tracknumber"] = str(track)
+    flac.save()
+
+
+def write_mp3(path, track):
+    # Silent 128 kbps frames, enough for mutagen to find the MPEG stream
+    path.write_bytes((b"\xff\xfb\x90\x64" + bytes(413)) * 50)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=f"Song {track}"))
+    tags.add(TRCK(encoding=3, text=str(track)))
+    tags.save(path)
+
+
+def write_wav(path, track):
+    data = bytes(44100)
+    fmt = struct.pack("<LHHLLHH", 16, 1, 2, 44100, 44100 * 4, 4, 16)
+    path.write_bytes(
+        b"RIFF"
+        + struct.pack("<L", 36 + len(data))
+        + b"WAVEfmt "
+        + fmt
+        + b"data"
+        + struct.pack("<L", len(data))
+        + data
+    )
+    wave = WAVE(path)
+    wave.add_tags()
+    wave.tags.add(TIT2(encoding=3, text=f"Song {track}"))
+    wave.tags.add(TRCK(encoding=3, text=str(track)))
+    wave.save()
+
+
+def artist_stage(bandcamper, fixtures_dir, work_dir):
+    content = read_fixture(fixtures_dir, "artist.html")
+    releases = len(bandcamper._parse_artist_urls(content, ARTIST_URL))
+    return Stage(
+        lambda: bandcamper._parse_artist_urls(content, ARTIST_URL),
+        releases,
+        "releases/s",
+    )
+
+
+def music_data_stage(bandcamper, fixtures_dir, work_dir):
+    pages = [
+        read_fixture(fixtures_dir, name).decode("utf8")
+        for name in ("album.html", "track.html")
+    ]
+
+    def run():
+        for page in pages:
+            bandcamper._parse_music_data(page)
+
+    return Stage(run, len(pages), "pages/s")
+
+
+def downloadable_stage(bandcamper, fixtures_dir, work_dir):
+    content = read_fixture(fixtures_dir, "download.html")
+    stat_download = json.loads(read_fixture(fixtures_dir, "statdownload.json"))
+
+    def run():
+        bandcamper._parse_downloadable(content)
+        bandcamper._parse_stat_download(stat_download)
+
+    return Stage(run, 1, "pages/s")
+
+
+def output_path_stage(bandcamper, fixtures_dir, work_dir):
+    contexts = [
+        dict(CONTEXT, track=f"Song {track}: <Remix>", track_num=track, ext="flac")
+        for track in range(1, TRACKS + 1)
+    ]
+
+    def run():
+        for context in contexts:
+            bandcamper._sanitize_file_path(
+                work_dir / bandcamper.formatter.format(OUTPUT, **context)
+            )
+
+    return Stage(run, len(contexts), "paths/s")
+
+
+def track_context_stage(bandcamper, fixtures_dir, work_dir):
+    tracks_dir = work_dir / "tracks"
+    tracks_dir.mkdir()
+    paths = []
+    for write, ext in ((write_mp3, "mp3"), (write_flac, "flac"), (write_wav, "wav")):
+        for track in range(1, TRACKS + 1):
+            path = tracks_dir / f"Artist - Album - {track:02d} Song {track}.{ext}"
+            write(path, track)
+            paths.append(path)
+    tracks = {track: f"Song {track}" for track in range(1, TRACKS + 1)}
+
+    def run():
+        for path in paths:
+            get_track_output_context(path, tracks)
+
+    return Stage(run, len(paths), "files/s")
+
+
+def extract_zip_stage(bandcamper, fixtures_dir, work_dir):
+    source_zip = work_dir / "source.zip"
+    zip_path = work_dir / "release.zip"
+    destination = work_dir / "library"
+    make_zip(source_zip, ZIP_SIZE, TRACKS)
+    tracks = {track: f"Song {track}" for track in range(1, TRACKS + 1)}
+
+    def prepare():
+        shutil.rmtree(destination, ignore_errors=True)
+        shutil.copyfile(source_zip, zip_path)
+
+    return Stage(
+        lambda: bandcamper.extract_zip(
+            zip_path,
+            destination,
+            OUTPUT,
+            "{artist}/{album}/{filename}",
+            tracks,
+            # extract_zip fills the context in, which would leak into the next runs
+            dict(CONTEXT),
+        ),
+        ZIP_SIZE / 2**20,
+        "MiB/s",
+        prepare,
+    )
+
+
+STAGES = {
+    "artist": artist_stage,
+    "music_data": music_data_stage,
+    "downloadable": downloadable_stage,
+    "output_path": output_path_stage,
+    "track_context": track_context_stage,
+    "extract_zip": extract_zip_stage,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=list(STAGES), metavar="NAME"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=1.0, help="seconds each stage is run for"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="fraction of the baseline throughput a stage can lose before failing",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BENCHMARKS_DIR / "baseline.json"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="save the results as the baseline"
+    )
+    parser.add_argument("--fixtures", type=Path, default=BENCHMARKS_DIR / "fixtures")
+    args = parser.parse_args()
+
+    try:
+        baseline = json.loads(args.baseline.read_text(encoding="utf8"))
+    except FileNotFoundError:
+        # First run on this machine
+        baseline = {}
+        args.save_baseline = True
+    bandcamper = Bandcamper(screamer=Screamer(-1, False))
+    results = {}
+    regressions = []
+    print(f"{'stage':<14} {'throughput':>22} {'baseline':>12} {'change':>8}")
+    for name in args.stages:
+        with tempfile.TemporaryDirectory() as work_dir:
+            stage = STAGES[name](bandcamper, args.fixtures, Path(work_dir))
+            throughput = stage.measure(args.min_time)
+        results[name] = {"throughput": round(throughput, 2), "unit": stage.unit}
+        line = f"{name:<14} {throughput:11.1f} {stage.unit:<10}"
+        if name in baseline:
+            change = throughput / baseline[name]["throughput"] - 1
+            line += f" {baseline[name]['throughput']:12.1f} {change:+8.0%}"
+            if change < -args.tolerance:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.write_text(
+            json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf8"
+        )
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        sys.exit(f"Slower than the baseline: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
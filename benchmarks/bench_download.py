@@ -0,0 +1,127 @@
+"""Measure the throughput and CPU cost of `Requester.download_to_file` against a local server.
+
+A stand-in HTTP server runs in a separate process and serves a file of the given size from memory,
+so only the client is measured. Each method downloads it a few times:
+
+- legacy: the previous write path, with `iter_content(chunk_size=1024)` and a progress bar update
+  per chunk;
+- download_to_file: the current write path, with and without the progress bar.
+
+CPU usage is the user and system time of the client process, per GiB downloaded.
+
+Usage: python benchmarks/bench_download.py [--size MiB] [--runs N] [--dir PATH]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bandcamper.requests.requester import Requester  # noqa: E402
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        view = memoryview(body)
+        chunk_size = 1024 * 1024
+        for start in range(0, len(body), chunk_size):
+            end = start + chunk_size
+            self.wfile.write(view[start:end])
+
+
+def serve(size, port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.body = os.urandom(size)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def download_legacy(requester, url, save_path, progress):
+    with requester.session.get(url, stream=True) as response:
+        response.raise_for_status()
+        content_length = int(response.headers["Content-Length"])
+        file_path = Path(save_path) / "legacy.zip"
+        with file_path.open("wb") as file:
+            chunks = response.iter_content(chunk_size=1024)
+            if progress:
+                with click.progressbar(
+                    chunks, length=content_length // 1024, label="legacy"
+                ) as bar:
+                    for chunk in bar:
+                        file.write(chunk)
+            else:
+                for chunk in chunks:
+                    file.write(chunk)
+    return file_path
+
+
+def download_current(requester, url, save_path, progress):
+    return requester.download_to_file(url, save_path, "current{ext}", progress=progress)
+
+
+def run(name, download, url, work_dir, size, runs, progress):
+    requester = Requester()
+    durations = []
+    cpu_times = []
+    for _ in range(runs):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        file_path = download(requester, url, work_dir, progress)
+        durations.append(time.perf_counter() - start)
+        cpu_times.append(time.process_time() - start_cpu)
+        assert file_path.stat().st_size == size
+        file_path.unlink()
+    best = min(durations)
+    print(
+        f"{name:<32} {size / best / 10 ** 6:10.1f} MB/s "
+        f"{min(cpu_times) / (size / 2 ** 30):8.3f} CPU s/GiB",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024, help="file size in MiB")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each method")
+    parser.add_argument("--dir", help="directory for the files, on the disk to test")
+    args = parser.parse_args()
+
+    size = args.size * 2**20
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(size, port_queue), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/release.zip"
+    print(f"{args.size} MiB download, best of {args.runs}", file=sys.stderr)
+    methods = [
+        ("legacy", download_legacy, False),
+        ("legacy (progress bar)", download_legacy, True),
+        ("download_to_file", download_current, False),
+        ("download_to_file (progress bar)", download_current, True),
+    ]
+    try:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp_dir:
+            for name, download, progress in methods:
+                run(name, download, url, Path(tmp_dir), size, args.runs, progress)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
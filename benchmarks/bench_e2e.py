@@ -0,0 +1,207 @@
+"""Download every release of an artist from the local Bandcamp stand-in with `Bandcamper.download_all`.
+
+The stand-in of `standin.py` runs in a separate process, so only bandcamper is measured, and
+bandcamper is told that 127.0.0.1 is a valid custom domain. The artist is discovered with
+`add_urls`, and all its releases are downloaded and extracted into a temporary directory,
+as the command line would. The harness reports:
+
+- releases/min: releases downloaded per minute, from discovery to the last extracted file;
+- MB/s: bytes sent by the stand-in per second, including retried requests;
+- the responses of the stand-in by status code, and the releases that failed;
+- the connections bandcamper opened and reused;
+- the rate limit of the stand-in, if it throttled any request;
+- the download emails of email-gated releases (``--email-rate``), received by an in-process
+  `LocalMailBackend`, and how many times its mailboxes were polled.
+
+Usage: python benchmarks/bench_e2e.py [--jobs N] [--download-jobs N] [--segments N] [--asyncio]
+                                      [--formats FORMAT...] [--mailboxes N] [stand-in options]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.request import urlopen
+
+from requests import RequestException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bandcamper import AsyncBandcamper  # noqa: E402
+from bandcamper import Bandcamper  # noqa: E402
+from bandcamper.domains import CustomDomainCache  # noqa: E402
+from bandcamper.mail.local import LocalMailBackend  # noqa: E402
+from bandcamper.requests.async_requester import AsyncRequester  # noqa: E402
+from bandcamper.requests.requester import Requester  # noqa: E402
+from bandcamper.screamo import Screamer  # noqa: E402
+from benchmarks import standin  # noqa: E402
+
+OUTPUT = "{artist}/{album}/{track_num:02d} - {track}.{ext}"
+OUTPUT_EXTRA = "{artist}/{album}/{filename}"
+
+
+def serve(options, port_queue):
+    server = standin.StandInServer(("127.0.0.1", 0), **options)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def get_stats(base_url):
+    with urlopen(f"{base_url}/_stats") as response:
+        return json.load(response)
+
+
+def get_downloader_kwargs(args, requester, mail_backend):
+    custom_domains = CustomDomainCache()
+    custom_domains.set("127.0.0.1", True)
+    kwargs = dict(
+        fallback=False,
+        force_https=False,
+        screamer=Screamer(-1, False),
+        requester=requester,
+        jobs=args.jobs,
+        download_jobs=args.download_jobs,
+        custom_domains=custom_domains,
+        mailboxes=args.mailboxes,
+        mail_backend=mail_backend,
+    )
+    if args.page_jobs is not None:
+        kwargs["page_jobs"] = args.page_jobs
+    return kwargs
+
+
+def get_requester_kwargs(args):
+    return dict(
+        default_host_limit=args.connections,
+        download_retries=args.download_retries,
+        retries=args.retries,
+        read_timeout=args.read_timeout,
+        segments=args.segments,
+        segment_threshold=args.segment_threshold * 2**20,
+    )
+
+
+def run_sync(args, artist_url, destination, mail_backend):
+    requester = Requester(**get_requester_kwargs(args))
+    bandcamper = Bandcamper(**get_downloader_kwargs(args, requester, mail_backend))
+    errors = bandcamper.add_urls([artist_url])
+    if errors:
+        sys.exit(f"Discovery failed: {errors}")
+    results = bandcamper.download_all(destination, OUTPUT, OUTPUT_EXTRA, *args.formats)
+    return results, requester
+
+
+async def run_async(args, artist_url, destination, mail_backend):
+    requester = AsyncRequester(**get_requester_kwargs(args))
+    downloader_kwargs = get_downloader_kwargs(args, requester, mail_backend)
+    async with AsyncBandcamper(**downloader_kwargs) as bandcamper:
+        errors = await bandcamper.add_urls([artist_url])
+        if errors:
+            sys.exit(f"Discovery failed: {errors}")
+        results = await bandcamper.download_all(
+            destination, OUTPUT, OUTPUT_EXTRA, *args.formats
+        )
+    return results, requester
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=4, help="releases at the same time")
+    parser.add_argument(
+        "--download-jobs", type=int, default=1, help="formats at the same time"
+    )
+    parser.add_argument(
+        "--page-jobs",
+        type=int,
+        help="pages at the same time, by default 8, or 100 with --asyncio",
+    )
+    parser.add_argument(
+        "--connections", type=int, default=8, help="connections to the stand-in"
+    )
+    parser.add_argument(
+        "--mailboxes", type=int, default=1, help="mailboxes for download emails"
+    )
+    parser.add_argument("--segments", type=int, default=1, help="segments per file")
+    parser.add_argument(
+        "--segment-threshold", type=int, default=64, help="MiB to split files"
+    )
+    parser.add_argument("--download-retries", type=int, default=3)
+    parser.add_argument("--retries", type=int, default=3, help="retries of requests")
+    parser.add_argument(
+        "--read-timeout", type=float, default=60, help="seconds before a read fails"
+    )
+    parser.add_argument("--formats", nargs="+", default=["flac"])
+    parser.add_argument("--asyncio", action="store_true", help="use AsyncBandcamper")
+    parser.add_argument("--dir", help="directory for the files, on the disk to test")
+    standin.add_arguments(parser)
+    args = parser.parse_args()
+
+    mail_backend = LocalMailBackend(smtp_port=0)
+    options = standin.get_server_options(args)
+    options["smtp"] = "{}:{}".format(*mail_backend.smtp_address)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(options, port_queue), daemon=True
+    )
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get()}"
+    error = None
+    results = {}
+    requester = None
+    try:
+        with tempfile.TemporaryDirectory(dir=args.dir) as destination:
+            start = time.perf_counter()
+            try:
+                if args.asyncio:
+                    results, requester = asyncio.run(
+                        run_async(args, f"{base_url}/music", destination, mail_backend)
+                    )
+                else:
+                    results, requester = run_sync(
+                        args, f"{base_url}/music", destination, mail_backend
+                    )
+            except RequestException as exc:
+                error = exc
+            duration = time.perf_counter() - start
+        stats = get_stats(base_url)
+    finally:
+        server.terminate()
+        mail_backend.close()
+
+    failed = [url for url, paths in results.items() if not paths]
+    downloaded = len(results) - len(failed)
+    bytes_sent = stats.pop("bytes_sent")
+    print(
+        f"{downloaded}/{len(results)} releases in {duration:.2f} s: "
+        f"{downloaded / duration * 60:.1f} releases/min, "
+        f"{bytes_sent / duration / 10**6:.1f} MB/s"
+    )
+    print("Responses:", ", ".join(f"{key}: {stats[key]}" for key in sorted(stats)))
+    if requester is None:
+        sys.exit(f"download_all stopped after {duration:.2f} s: {error!r}")
+    pool_stats = requester.get_pool_stats()
+    print(
+        f"Connections: {pool_stats['connections']} opened, "
+        f"{pool_stats['reused']} of {pool_stats['requests']} requests reused one"
+    )
+    for host, host_stats in requester.rate_limiter.get_stats().items():
+        if host_stats["throttled"]:
+            print(
+                f"Rate limit of {host}: {host_stats['rate']:.1f} requests/s after "
+                f"{host_stats['throttled']} throttled requests and "
+                f"{host_stats['backoffs']} back-offs, {host_stats['waited']:.1f} s waited"
+            )
+    if mail_backend.delivered:
+        print(
+            f"Emails: {mail_backend.delivered} received, "
+            f"{mail_backend.polls} mailbox polls"
+        )
+    for url in failed:
+        print(f"Failed: {url}")
+
+
+if __name__ == "__main__":
+    main()
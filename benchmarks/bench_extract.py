@@ -0,0 +1,124 @@
+"""Compare the extraction of release zips with `ZipFile.extractall` against `Bandcamper.extract_zip`.
+
+A zip with WAV tracks stored without compression, like the ones Bandcamp serves for lossless
+formats, is generated and extracted with:
+
+- extractall: `ZipFile.extractall` into a temporary directory, then every file moved to its final
+  path, which is what Bandcamper did before extracting straight to the library;
+- extract_zip: `Bandcamper.extract_zip`, with and without checking the CRC-32 of the tracks.
+
+Every run works on a fresh copy of the zip. The page cache isn't dropped between runs, so the
+numbers measure the CPU and copy overhead rather than the speed of the disk.
+
+Usage: python benchmarks/bench_extract.py [--size MiB] [--tracks N] [--runs N] [--dir PATH]
+"""
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from zipfile import ZIP_STORED
+from zipfile import ZipFile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bandcamper import Bandcamper  # noqa: E402
+from bandcamper.screamo import Screamer  # noqa: E402
+
+OUTPUT = "{artist}/{album}/{track_num:02d} - {track}.{ext}"
+OUTPUT_EXTRA = "{artist}/{album}/{filename}"
+BLOCK = os.urandom(1024 * 1024)
+
+
+def write_wav(file, size):
+    data_size = size - 44
+    file.write(b"RIFF" + struct.pack("<L", size - 8) + b"WAVE")
+    file.write(b"fmt " + struct.pack("<LHHLLHH", 16, 1, 2, 44100, 44100 * 4, 4, 16))
+    file.write(b"data" + struct.pack("<L", data_size))
+    while data_size > 0:
+        chunk = BLOCK[:data_size]
+        file.write(chunk)
+        data_size -= len(chunk)
+
+
+def make_zip(path, size, tracks):
+    with ZipFile(path, "w", ZIP_STORED, allowZip64=True) as zip_file:
+        for track in range(1, tracks + 1):
+            name = f"Artist - Album - {track:02d} Song {track}.wav"
+            with zip_file.open(name, "w", force_zip64=True) as member:
+                write_wav(member, size // tracks)
+        zip_file.writestr("cover.jpg", b"\xff\xd8\xff" + BLOCK[:100_000])
+
+
+def extract_with_extractall(bandcamper, zip_path, destination, tracks):
+    extract_to = zip_path.parent / zip_path.stem
+    with ZipFile(zip_path) as zip_file:
+        zip_file.extractall(extract_to)
+    zip_path.unlink()
+    context = {"artist": "Artist", "album": "Album", "year": "2021"}
+    for file_path in list(extract_to.iterdir()):
+        bandcamper.move_file(
+            file_path, destination, OUTPUT, OUTPUT_EXTRA, tracks, context
+        )
+    extract_to.rmdir()
+
+
+def extract_with_extract_zip(bandcamper, zip_path, destination, tracks):
+    context = {"artist": "Artist", "album": "Album", "year": "2021"}
+    bandcamper.extract_zip(zip_path, destination, OUTPUT, OUTPUT_EXTRA, tracks, context)
+
+
+def run(name, extract, bandcamper, source_zip, work_dir, size, tracks, runs):
+    durations = []
+    cpu_times = []
+    for _ in range(runs):
+        zip_path = work_dir / "release.zip"
+        shutil.copyfile(source_zip, zip_path)
+        destination = work_dir / "library"
+        start, start_cpu = time.perf_counter(), time.process_time()
+        extract(bandcamper, zip_path, destination, tracks)
+        durations.append(time.perf_counter() - start)
+        cpu_times.append(time.process_time() - start_cpu)
+        shutil.rmtree(destination)
+    best = min(durations)
+    print(
+        f"{name:<24} {best:8.3f} s {size / best / 2 ** 20:10.1f} MiB/s "
+        f"{min(cpu_times) / (size / 2 ** 30):8.3f} CPU s/GiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048, help="zip size in MiB")
+    parser.add_argument("--tracks", type=int, default=10, help="number of tracks")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each method")
+    parser.add_argument("--dir", help="directory for the files, on the disk to test")
+    args = parser.parse_args()
+
+    size = args.size * 2**20
+    tracks = {track: f"Song {track}" for track in range(1, args.tracks + 1)}
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp_dir:
+        work_dir = Path(tmp_dir)
+        source_zip = work_dir / "source.zip"
+        make_zip(source_zip, size, args.tracks)
+        print(
+            f"{args.size} MiB zip with {args.tracks} stored WAV tracks, best of {args.runs}"
+        )
+        screamer = Screamer(-1, False)
+        methods = [
+            ("extractall + move", extract_with_extractall, True),
+            ("extract_zip", extract_with_extract_zip, False),
+            ("extract_zip (with CRC)", extract_with_extract_zip, True),
+        ]
+        for name, extract, check_crc in methods:
+            bandcamper = Bandcamper(screamer=screamer, check_zip_crc=check_crc)
+            run(
+                name, extract, bandcamper, source_zip, work_dir, size, tracks, args.runs
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Compare parsing Bandcamp pages with BeautifulSoup against the extraction of `bandcamper.pages`.
+
+Release and download pages are parsed with:
+
+- soup: a BeautifulSoup tree of the whole page, which is what Bandcamper did before;
+- fast: `extract_music_data` and `extract_download_data`, which only parse the tags they need.
+
+Both must return the same data for every page. The pages are recorded HTML files from `--pages`,
+or generated pages with the layout and size of Bandcamp's. The peak memory allocated while
+parsing a page is measured with `tracemalloc`, in a separate pass from the timings.
+
+Usage: python benchmarks/bench_parse.py [--pages DIR] [--tracks N] [--runs N]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from html import escape
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bandcamper import Bandcamper  # noqa: E402
+from bandcamper.pages import extract_download_data  # noqa: E402
+from bandcamper.pages import extract_music_data  # noqa: E402
+
+
+def make_release_page(tracks, from_album=False):
+    trackinfo = [
+        {
+            "id": 1000 + track,
+            "track_num": track,
+            "title": f'Song {track} & "Friends" <live>',
+            "duration": 200.5 + track,
+            "file": {"mp3-128": f"https://t4.bcbits.com/stream/{track:032x}/mp3-128/1"},
+            "lyrics": "La la la\n" * 20,
+        }
+        for track in range(1, tracks + 1)
+    ]
+    tralbum = {
+        "id": 123456789,
+        "item_type": "track" if from_album else "album",
+        "artist": "Artist",
+        "current": {
+            "title": "Album",
+            "release_date": "01 Jan 2021 00:00:00 GMT",
+            "about": "About this album. " * 100,
+            "credits": "Credits. " * 50,
+        },
+        "freeDownloadPage": "https://bandcamp.com/download?id=123456789&ts=1&tsig=x",
+        "trackinfo": trackinfo,
+    }
+    head = "".join(
+        f'<script type="text/javascript" src="https://s4.bcbits.com/bundle/{n}.js"></script>'
+        f'<meta property="og:tag{n}" content="Content {n}">'
+        for n in range(40)
+    )
+    inline_script = (
+        "<script>var x = $('script[data-tralbum]').data('tralbum');</script>"
+    )
+    from_album_html = (
+        '<h3>from <a href="/album/album"><span class="fromAlbum">Album &amp; More</span></a></h3>'
+        if from_album
+        else ""
+    )
+    track_rows = "".join(
+        f'<tr class="track_row_view linked" rel="tracknum={track}"><td class="play-col">'
+        f'<a role="button"><div class="play_status"></div></a></td>'
+        f'<td class="track-number-col"><div class="track_number secondaryText">{track}.</div></td>'
+        f'<td class="title-col"><div class="title"><a href="/track/song-{track}">'
+        f'<span class="track-title">Song {track}</span></a><span class="time secondaryText">3:20</span>'
+        f"</div></td></tr>"
+        for track in range(1, tracks + 1)
+    )
+    recommendations = "".join(
+        f'<li class="recommended-album"><a href="https://artist{n}.bandcamp.com/album/x">'
+        f'<img src="https://f4.bcbits.com/img/a{n}_9.jpg" alt=""><div class="release-title">'
+        f'Release {n}</div><div class="by-artist">by Artist {n}</div></a></li>'
+        for n in range(400)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8">{head}'
+        f'<script type="text/javascript" data-tralbum="{escape(json.dumps(tralbum))}"></script>'
+        f'{inline_script}</head><body><div id="pgBd"><div id="name-section">'
+        f'<h2 class="trackTitle">Album</h2>{from_album_html}</div>'
+        f'<div id="tralbumArt"><a class="popupImage" href="https://f4.bcbits.com/img/a123_10.jpg">'
+        f'<img src="https://f4.bcbits.com/img/a123_16.jpg" alt="cover art"></a></div>'
+        f'<table class="track_list track_table" id="track_table">{track_rows}</table>'
+        f'<ul class="recommendations">{recommendations}</ul></div></body></html>'
+    )
+
+
+def make_download_page(formats):
+    downloads = {
+        fmt: {"url": f"https://bandcamp.com/download/album?enc={fmt}&id=1&sig=x"}
+        for fmt in formats
+    }
+    blob = {
+        "download_items": [{"downloads": downloads, "title": "Album & More"}],
+        "digital_items": [{"about": "About this album. " * 100}],
+    }
+    body = "".join(
+        f'<div class="filler"><p>Paragraph {n}</p></div>' for n in range(500)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+        f'<div id="pagedata" data-blob="{escape(json.dumps(blob))}"></div>{body}</body></html>'
+    )
+
+
+def soup_music_data(text):
+    return Bandcamper._parse_music_data_with_soup(text)
+
+
+def soup_download_data(text):
+    soup = BeautifulSoup(text, "lxml")
+    return json.loads(soup.find("div", id="pagedata")["data-blob"])
+
+
+def load_pages(args):
+    if args.pages is None:
+        return [
+            ("album", make_release_page(args.tracks)),
+            ("track", make_release_page(args.tracks, from_album=True)),
+            ("download", make_download_page(Bandcamper.DOWNLOAD_FORMATS)),
+        ]
+    pages = []
+    for path in sorted(Path(args.pages).glob("*.htm*")):
+        text = path.read_text(encoding="utf8")
+        kind = "download" if 'id="pagedata"' in text else "release"
+        pages.append((f"{kind} {path.name}", text))
+    return pages
+
+
+def measure(parse, text, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse(text)
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    parse(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(durations), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", help="directory with recorded pages (*.html)")
+    parser.add_argument(
+        "--tracks", type=int, default=12, help="tracks of generated pages"
+    )
+    parser.add_argument("--runs", type=int, default=20, help="runs of each parser")
+    args = parser.parse_args()
+
+    print(
+        f"{'page':<28} {'KiB':>6} {'soup ms':>9} {'fast ms':>9} {'speed-up':>9} "
+        f"{'soup peak KiB':>14} {'fast peak KiB':>14}"
+    )
+    for name, text in load_pages(args):
+        if name.startswith("download"):
+            parsers = (soup_download_data, extract_download_data)
+        else:
+            parsers = (soup_music_data, extract_music_data)
+        if parsers[0](text) != parsers[1](text):
+            sys.exit(f"{name}: the parsers returned different data")
+        (soup_time, soup_peak), (fast_time, fast_peak) = (
+            measure(parse, text, args.runs) for parse in parsers
+        )
+        print(
+            f"{name:<28} {len(text.encode()) / 1024:6.0f} {soup_time * 1000:9.2f} "
+            f"{fast_time * 1000:9.2f} {soup_time / fast_time:8.0f}x "
+            f"{soup_peak / 1024:14.0f} {fast_peak / 1024:14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
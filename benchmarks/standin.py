@@ -0,0 +1,480 @@
+"""Local stand-in for Bandcamp, to load test bandcamper end to end without touching bandcamp.com.
+
+The server answers every request bandcamper makes to download the free releases of an artist:
+
+- ``/music``: the artist page, with a music grid of ``--releases`` albums;
+- ``/album/release-<id>``: release pages, with their ``data-tralbum`` data and art link;
+- ``/download/album?id=<id>``: free download pages, with the ``#pagedata`` blob;
+- ``/statdownload/album?enc=<format>&id=<id>``: the JSON with the URL of each download;
+- ``/files/<id>/<format>.zip``: release zips with ``--tracks`` MP3 tracks, ``--zip-size`` MiB in total;
+- ``/stream/<id>/<track>``: MP3 tracks, for the mp3-128 fallback;
+- ``/email_download``: the form of email-gated releases, which emails their download page link;
+- ``/_stats``: JSON with the number of responses by status code and the bytes sent.
+
+Files support ``Range`` requests. Every response can be delayed by ``--latency`` seconds and sent at
+up to ``--bandwidth`` bytes per second per connection. A fraction ``--error-rate`` of requests fails,
+either with a 500 or by dropping the connection in the middle of a file, and a fraction
+``--throttle-rate`` is answered with 429 Too Many Requests and a ``Retry-After`` header. Requests
+beyond ``--rate-limit`` per second are answered with 429 as well, like Bandcamp does under load.
+A fraction ``--stall-rate`` of files stops in the middle, keeping the connection open without
+sending anything for ``STALL_SECONDS``.
+
+A fraction ``--email-rate`` of releases is email-gated: their download page link is sent by email
+``--email-delay`` seconds after it's requested, from ``noreply@email.bandcamp.com`` to the SMTP
+server at ``--smtp``, like the in-process one of `bandcamper.mail.local.LocalMailBackend`.
+
+The stand-in can be started on its own, as ``python benchmarks/standin.py [--port PORT] ...``, or
+from Python with `start_server`. It's served on 127.0.0.1, which bandcamper must be told is a
+valid custom domain, like `bench_e2e.py` does.
+"""
+import argparse
+import json
+import random
+import re
+import smtplib
+import sys
+import threading
+import time
+from email.message import EmailMessage
+from html import escape
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+from zipfile import ZIP_STORED
+from zipfile import ZipFile
+
+# A silent MPEG-1 Layer III frame at 128 kbps and 44.1 kHz
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+RANGE_REGEX = re.compile(r"bytes=(\d*)-(\d*)")
+FORMATS = ["mp3-320", "flac", "vorbis"]
+WRITE_SIZE = 64 * 1024
+STALL_SECONDS = 120
+
+
+def make_mp3(size):
+    return MP3_FRAME * max(size // len(MP3_FRAME), 1)
+
+
+def make_zip(size, tracks):
+    """A release zip with `tracks` MP3 files stored without compression, of about `size` bytes."""
+    buffer = BytesIO()
+    track = make_mp3(size // tracks)
+    with ZipFile(buffer, "w", ZIP_STORED) as zip_file:
+        for track_num in range(1, tracks + 1):
+            name = f"Artist - Album - {track_num:02d} Song {track_num}.mp3"
+            zip_file.writestr(name, track)
+        zip_file.writestr("cover.jpg", b"\xff\xd8\xff" + bytes(100_000))
+    return buffer.getvalue()
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        releases=100,
+        tracks=10,
+        zip_size=20 * 1024 * 1024,
+        formats=FORMATS,
+        page_size=100 * 1024,
+        latency=0,
+        bandwidth=0,
+        error_rate=0,
+        throttle_rate=0,
+        retry_after=1,
+        rate_limit=0,
+        stall_rate=0,
+        email_rate=0,
+        email_delay=2,
+        smtp=None,
+        seed=None,
+    ):
+        super().__init__(address, StandInHandler)
+        self.releases = releases
+        self.tracks = tracks
+        self.formats = formats
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.stall_rate = stall_rate
+        self.email_rate = email_rate
+        self.email_delay = email_delay
+        self.smtp = smtp
+        self.tokens = rate_limit
+        self.updated = time.monotonic()
+        self.zip = make_zip(zip_size, tracks)
+        self.track = make_mp3(zip_size // tracks)
+        self.filler = "<p>Filler paragraph of the release page.</p>" * (page_size // 48)
+        self.random = random.Random(seed)
+        self.stats = {"bytes_sent": 0}
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients close connections in the middle of pages and files on purpose
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, key, value=1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def over_rate_limit(self):
+        """Whether a request goes over `rate_limit`, with a token bucket of one second of requests."""
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self.updated) * self.rate_limit
+            self.tokens = min(self.tokens + refill, self.rate_limit)
+            self.updated = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+            return False
+
+    def requires_email(self, release):
+        """Whether `release` is email-gated, spreading them evenly among the releases."""
+        return int((release + 1) * self.email_rate) > int(release * self.email_rate)
+
+    def send_email(self, address, subject, html):
+        message = EmailMessage()
+        message["From"] = "Bandcamp <noreply@email.bandcamp.com>"
+        message["To"] = address
+        message["Subject"] = subject
+        message.set_content(html, subtype="html")
+        host, port = self.smtp.rsplit(":", 1)
+        try:
+            with smtplib.SMTP(host, int(port)) as smtp:
+                smtp.send_message(message)
+        except (OSError, smtplib.SMTPException):
+            self.count("emails_failed")
+        else:
+            self.count("emails_sent")
+
+    def draw(self, rate):
+        with self._lock:
+            return self.random.random() < rate
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def base_url(self):
+        return f"http://{self.headers['Host']}"
+
+    def _send_headers(self, status, content_type, length, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.server.count(str(status))
+
+    def _write(self, data, drop_at=None, stall=False):
+        view = memoryview(data)
+        length = len(view) if drop_at is None else drop_at
+        start_time = time.monotonic()
+        for start in range(0, length, WRITE_SIZE):
+            end = min(start + WRITE_SIZE, length)
+            self.wfile.write(view[start:end])
+            self.server.count("bytes_sent", end - start)
+            if self.server.bandwidth:
+                delay = end / self.server.bandwidth - (time.monotonic() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+        if drop_at is not None:
+            # The rest of the body is never sent, as if the connection dropped
+            self.close_connection = True
+            self.server.count("stalled" if stall else "dropped")
+            if stall:
+                time.sleep(STALL_SECONDS)
+
+    def send_body(self, body, content_type="text/html; charset=utf-8", status=200):
+        if isinstance(body, str):
+            body = body.encode("utf8")
+        self._send_headers(status, content_type, len(body))
+        self._write(body)
+
+    def send_file(self, data, content_type):
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{len(data)}"'}
+        start, end = 0, len(data) - 1
+        status = 200
+        match = RANGE_REGEX.fullmatch(self.headers.get("Range", ""))
+        if match and any(match.groups()):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else end
+            else:
+                start = len(data) - int(match.group(2))
+            if start >= len(data):
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                self._send_headers(416, content_type, 0, headers)
+                return
+            end = min(end, len(data) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            status = 206
+        stop = end + 1
+        body = memoryview(data)[start:stop]
+        drop_at = None
+        stall = self.server.draw(self.server.stall_rate)
+        if stall or self.server.draw(self.server.error_rate):
+            drop_at = len(body) // 2
+        self._send_headers(status, content_type, len(body), headers)
+        self._write(body, drop_at, stall)
+
+    def _fail_randomly(self):
+        if self.server.over_rate_limit() or self.server.draw(self.server.throttle_rate):
+            headers = {"Retry-After": str(self.server.retry_after)}
+            self._send_headers(429, "text/plain", 0, headers)
+            return True
+        if not self.path.startswith("/files/") and self.server.draw(
+            self.server.error_rate
+        ):
+            self.send_body("Internal Server Error", "text/plain", 500)
+            return True
+        return False
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        path, query = urlsplit(self.path)[2:4]
+        query = {name: values[0] for name, values in parse_qs(query).items()}
+        if path == "/_stats":
+            stats = json.dumps(self.server.get_stats())
+            return self.send_body(stats, "application/json")
+        if self._fail_randomly():
+            return
+        parts = path.strip("/").split("/")
+        try:
+            if path == "/music":
+                return self.send_body(self.artist_page())
+            if parts[0] == "album" and parts[1].startswith("release-"):
+                return self.send_body(self.release_page(int(parts[1][8:])))
+            if path == "/download/album":
+                return self.send_body(self.download_page(int(query["id"])))
+            if path == "/statdownload/album":
+                return self.send_body(
+                    self.stat_download(int(query["id"]), query["enc"]),
+                    "application/json",
+                )
+            if parts[0] == "files":
+                return self.send_file(self.server.zip, "application/zip")
+            if parts[0] == "stream":
+                return self.send_file(self.server.track, "audio/mpeg")
+            if parts[0] == "img":
+                return self.send_file(b"\xff\xd8\xff" + bytes(100_000), "image/jpeg")
+        except (IndexError, KeyError, ValueError):
+            pass
+        self.send_body("Not Found", "text/plain", 404)
+
+    def do_POST(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf8"))
+        if self._fail_randomly():
+            return
+        if urlsplit(self.path).path != "/email_download":
+            return self.send_body("Not Found", "text/plain", 404)
+        try:
+            release = int(form["item_id"][0])
+            address = form["address"][0]
+        except (KeyError, ValueError):
+            return self.send_body('{"ok": false}', "application/json", 400)
+        if not self.server.smtp or not self.server.requires_email(release):
+            return self.send_body('{"ok": false}', "application/json")
+        html = (
+            f'<p>Your download of Release {release} is ready.</p><a href="'
+            f'{self.base_url}/download/album?id={release}&amp;from=email">Download</a>'
+        )
+        threading.Timer(
+            self.server.email_delay,
+            self.server.send_email,
+            (address, f"Your download of Release {release}", html),
+        ).start()
+        self.send_body('{"ok": true}', "application/json")
+
+    def artist_page(self):
+        base_url = self.base_url
+        items = "".join(
+            f'<li data-item-id="album-{release}" class="music-grid-item square">'
+            f'<a href="{base_url}/album/release-{release}"><p class="title">'
+            f"Release {release}</p></a></li>"
+            for release in range(self.server.releases)
+        )
+        return f'<html><body><ol id="music-grid">{items}</ol></body></html>'
+
+    def release_page(self, release):
+        base_url = self.base_url
+        email = self.server.requires_email(release)
+        tralbum = {
+            "id": release,
+            "item_type": "album",
+            "artist": "Artist",
+            "current": {
+                "title": f"Release {release}",
+                "release_date": "01 Jan 2021 00:00:00 GMT",
+                "require_email": email,
+            },
+            "freeDownloadPage": None
+            if email
+            else f"{base_url}/download/album?id={release}",
+            "trackinfo": [
+                {
+                    "track_num": track,
+                    "title": f"Song {track}",
+                    "file": {"mp3-128": f"{base_url}/stream/{release}/{track}"},
+                }
+                for track in range(1, self.server.tracks + 1)
+            ],
+        }
+        return (
+            f'<html><head><script data-tralbum="{escape(json.dumps(tralbum))}"></script>'
+            f'</head><body><div id="tralbumArt"><a class="popupImage" '
+            f'href="{base_url}/img/a{release}_10.jpg"></a></div>{self.server.filler}'
+            f"</body></html>"
+        )
+
+    def download_page(self, release):
+        downloads = {
+            fmt: {"url": f"{self.base_url}/download/album?enc={fmt}&id={release}"}
+            for fmt in self.server.formats
+        }
+        blob = {"download_items": [{"downloads": downloads}]}
+        return (
+            f'<html><body><div id="pagedata" data-blob="{escape(json.dumps(blob))}">'
+            f"</div></body></html>"
+        )
+
+    def stat_download(self, release, fmt):
+        return json.dumps(
+            {
+                "result": "ok",
+                "download_url": f"{self.base_url}/files/{release}/{fmt}.zip",
+            }
+        )
+
+
+def start_server(port=0, **options):
+    """Start a `StandInServer` on a background thread.
+
+    Returns
+    -------
+    tuple
+        The server, and its base URL.
+    """
+    server = StandInServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def add_arguments(parser):
+    """Add the options of the stand-in server to an `argparse.ArgumentParser`."""
+    group = parser.add_argument_group("stand-in server")
+    group.add_argument(
+        "--releases", type=int, default=100, help="releases of the artist"
+    )
+    group.add_argument("--tracks", type=int, default=10, help="tracks per release")
+    group.add_argument(
+        "--zip-size", type=float, default=20, help="size of each release zip, in MiB"
+    )
+    group.add_argument(
+        "--latency", type=float, default=0, help="seconds before each response"
+    )
+    group.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0,
+        help="maximum MiB/s of each connection, 0 for no limit",
+    )
+    group.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of failed requests"
+    )
+    group.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0,
+        help="fraction of requests answered with 429",
+    )
+    group.add_argument(
+        "--retry-after", type=int, default=1, help="Retry-After of 429 responses"
+    )
+    group.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="requests per second before answering 429, 0 for no limit",
+    )
+    group.add_argument(
+        "--stall-rate",
+        type=float,
+        default=0,
+        help="fraction of files that stop sending data halfway",
+    )
+    group.add_argument(
+        "--email-rate",
+        type=float,
+        default=0,
+        help="fraction of releases whose download link is sent by email",
+    )
+    group.add_argument(
+        "--email-delay",
+        type=float,
+        default=2,
+        help="seconds before a download email is sent",
+    )
+    group.add_argument(
+        "--smtp", metavar="HOST:PORT", help="SMTP server receiving the download emails"
+    )
+    group.add_argument("--seed", type=int, help="seed of the random failures")
+
+
+def get_server_options(args):
+    return {
+        "releases": args.releases,
+        "tracks": args.tracks,
+        "zip_size": int(args.zip_size * 2**20),
+        "latency": args.latency,
+        "bandwidth": args.bandwidth * 2**20,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "retry_after": args.retry_after,
+        "rate_limit": args.rate_limit,
+        "stall_rate": args.stall_rate,
+        "email_rate": args.email_rate,
+        "email_delay": args.email_delay,
+        "smtp": args.smtp,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = StandInServer(("127.0.0.1", args.port), **get_server_options(args))
+    print(f"Serving an artist on http://127.0.0.1:{server.server_address[1]}/music")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()